@@ -0,0 +1,70 @@
+"""连接数统计压测
+
+对比 ``len(psutil.net_connections())`` 与解析 /proc/net 的 ``count_connections()``
+的耗时和内存峰值。可用 --sockets 在本机先建立指定数量的 TCP 连接::
+
+    python benchmarks/bench_connections.py --sockets 20000 --repeat 5
+
+建立大量连接时请先调大文件描述符上限（ulimit -n）。
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from probe_collectors import count_connections
+
+
+def open_sockets(count):
+    """在回环地址上建立 count 条 TCP 连接，返回需要保持引用的套接字"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1024)
+    address = listener.getsockname()
+    sockets = [listener]
+    for _ in range(count):
+        client = socket.create_connection(address)
+        server, _ = listener.accept()
+        sockets.extend((client, server))
+    return sockets
+
+
+def measure(name, func, repeat):
+    timings = []
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    timings.sort()
+    print(f"{name:<24} 最快 {timings[0] * 1000:8.1f}ms  中位 {timings[len(timings) // 2] * 1000:8.1f}ms"
+          f"  内存峰值 {peak / 1024 / 1024:7.2f}MB  连接数 {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='连接数统计压测')
+    parser.add_argument('--sockets', type=int, default=0, help='额外建立的回环TCP连接数')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sockets = open_sockets(args.sockets) if args.sockets else []
+    try:
+        measure('psutil.net_connections', lambda: len(psutil.net_connections()), args.repeat)
+        measure('count_connections', lambda: count_connections()[0], args.repeat)
+    finally:
+        for s in sockets:
+            s.close()
+
+
+if __name__ == '__main__':
+    main()
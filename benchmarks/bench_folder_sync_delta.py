@@ -0,0 +1,100 @@
+"""文件夹同步块级增量更新压测
+
+生成若干个大文件作为目标，再生成修改过的源文件（随机改写若干区域，可选在中间
+插入一段数据），分别用整体复制、增量更新（临时文件替换）和原地增量更新同步，
+比较用时和实际写入的字节数::
+
+    python benchmarks/bench_folder_sync_delta.py --files 4 --size 256 --edits 8 --insert
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from folder_sync import sync_folders  # noqa: E402
+
+CHUNK = 4 * 1024 * 1024
+
+
+def write_random(path, size, rng):
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining:
+            n = min(CHUNK, remaining)
+            f.write(rng.randbytes(n))
+            remaining -= n
+
+
+def mutate(source, basis, edits, edit_size, insert, rng):
+    """复制 basis 为 source，随机改写 edits 处，insert 为 True 时在中间插入一段数据"""
+    shutil.copyfile(basis, source)
+    size = os.path.getsize(source)
+    with open(source, 'r+b') as f:
+        for _ in range(edits):
+            f.seek(rng.randrange(0, size - edit_size))
+            f.write(rng.randbytes(edit_size))
+    if insert:
+        middle = size // 2
+        tmp = source + '.tmp'
+        with open(source, 'rb') as src, open(tmp, 'wb') as out:
+            out.write(src.read(middle))
+            out.write(rng.randbytes(rng.randrange(1, 4096)))
+            shutil.copyfileobj(src, out, CHUNK)
+        os.replace(tmp, source)
+
+
+def prepare(workdir, files, size, edits, edit_size, insert, seed):
+    rng = random.Random(seed)
+    basis_dir = os.path.join(workdir, 'basis')
+    source_dir = os.path.join(workdir, 'source')
+    os.makedirs(basis_dir, exist_ok=True)
+    os.makedirs(source_dir, exist_ok=True)
+    for i in range(files):
+        basis = os.path.join(basis_dir, f'data_{i}.bin')
+        write_random(basis, size, rng)
+        mutate(os.path.join(source_dir, f'data_{i}.bin'), basis, edits, edit_size, insert, rng)
+    return basis_dir, source_dir
+
+
+def run(mode, workdir, basis_dir, source_dir):
+    target_dir = os.path.join(workdir, 'target_' + mode)
+    shutil.rmtree(target_dir, ignore_errors=True)
+    shutil.copytree(basis_dir, target_dir)
+    log_dir = os.path.join(workdir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    start = time.perf_counter()
+    stats = sync_folders(source_dir, target_dir, delta=mode != 'full', inplace=mode == 'inplace',
+                         state_db=os.path.join(workdir, f'{mode}.db'), log_dir=log_dir)
+    elapsed = time.perf_counter() - start
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文件夹同步块级增量更新压测')
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--size', type=int, default=128, help='每个文件的大小（MB）')
+    parser.add_argument('--edits', type=int, default=8, help='每个文件随机改写的区域数')
+    parser.add_argument('--edit-size', type=int, default=4096, help='每处改写的字节数')
+    parser.add_argument('--insert', action='store_true', help='在文件中间插入一段数据')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', default='/tmp/folder_sync_bench')
+    args = parser.parse_args()
+
+    shutil.rmtree(args.workdir, ignore_errors=True)
+    basis_dir, source_dir = prepare(args.workdir, args.files, args.size * 1024 * 1024,
+                                    args.edits, args.edit_size, args.insert, args.seed)
+    results = []
+    for mode in ('full', 'delta', 'inplace'):
+        results.append((mode,) + run(mode, args.workdir, basis_dir, source_dir))
+    print()
+    for mode, elapsed, stats in results:
+        print(f"{mode:<8} 用时 {elapsed:7.2f}秒  写入 {stats['bytes_copied'] / 1024 / 1024:9.2f}MB  "
+              f"复用 {stats['bytes_reused'] / 1024 / 1024:9.2f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""上报接口压测
+
+对 /report 发起固定数量的长连接并发请求，统计吞吐量和延迟分位数。
+同一组参数可分别压测 Flask 模式和异步接入模式::
+
+    python probe_server.py                       # 或 python probe_ingest.py --console-port 0
+    python benchmarks/bench_ingest.py --url http://127.0.0.1:5000 --connections 500 --duration 30
+
+需要安装 aiohttp。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+
+
+def make_report(rng, ip):
+    """生成一条与 ProbeClient.collect_metrics() 结构相同的上报数据"""
+    return {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'hostname': f"bench-{ip}",
+        'ip': ip,
+        'system': 'Linux',
+        'cpu': {
+            'cpu_percent': [round(rng.uniform(0, 100), 1) for _ in range(8)],
+            'cpu_count': 8,
+            'cpu_freq_current': 2400.0,
+            'cpu_freq_max': 3600.0,
+        },
+        'memory': {
+            'memory_total': 31.2, 'memory_used': round(rng.uniform(1, 31), 2),
+            'memory_percent': round(rng.uniform(0, 100), 1),
+            'swap_total': 2.0, 'swap_used': 0.1, 'swap_percent': 5.0,
+        },
+        'disk': [{
+            'device': '/dev/sda1', 'mountpoint': '/', 'total_size': 100.0,
+            'used': 40.0, 'free': 60.0, 'percent': round(rng.uniform(0, 100), 1),
+        }],
+        'network': {
+            'bytes_sent': 1024.5, 'bytes_recv': 2048.25,
+            'packets_sent': 10000, 'packets_recv': 20000, 'connections': 120,
+        },
+    }
+
+
+async def worker(session, url, bodies, deadline, latencies, errors):
+    i = 0
+    while time.monotonic() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            async with session.post(url, data=body,
+                                    headers={'Content-Type': 'application/json'}) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors[0] += 1
+                    continue
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors[0] += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    bodies = [json.dumps(make_report(rng, f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"))
+              for i in range(args.hosts)]
+    latencies = []
+    errors = [0]
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        deadline = time.monotonic() + args.duration
+        started = time.monotonic()
+        await asyncio.gather(*(
+            worker(session, args.url.rstrip('/') + '/report',
+                   bodies[i::args.connections] or bodies, deadline, latencies, errors)
+            for i in range(args.connections)
+        ))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"连接数: {args.connections}  时长: {elapsed:.1f}s  主机数: {args.hosts}")
+    print(f"成功: {len(latencies)}  失败: {errors[0]}  吞吐: {len(latencies) / elapsed:.0f} req/s")
+    print(f"延迟 p50: {percentile(0.50):.1f}ms  p95: {percentile(0.95):.1f}ms  "
+          f"p99: {percentile(0.99):.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/report 接口压测')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--hosts', type=int, default=1000, help='模拟的客户端数量')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
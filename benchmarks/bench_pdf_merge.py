@@ -0,0 +1,100 @@
+"""PDF合并内存压测
+
+生成一批模拟扫描件的PDF（每页一张图片，每个文件共用同一张封面图），分别用
+PyPDF2 的 ``PdfMerger`` 和流式的 ``merge_pdfs`` 合并，在子进程中运行以统计各自的
+峰值常驻内存（RSS）::
+
+    python benchmarks/bench_pdf_merge.py --files 40 --pages 20 --workdir /tmp/pdfbench
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate(workdir, files, pages, size):
+    """生成 files 个PDF，每个 pages 页"""
+    from PIL import Image
+
+    os.makedirs(workdir, exist_ok=True)
+    cover = Image.effect_noise((size, size), 40).convert('RGB')
+    for i in range(files):
+        path = os.path.join(workdir, f'scan_{i + 1}.pdf')
+        if os.path.exists(path):
+            continue
+        images = [Image.effect_noise((size, size), 60 + j % 30).convert('RGB')
+                  for j in range(pages - 1)]
+        cover.save(path, save_all=True, append_images=images, resolution=150, quality=85)
+
+
+def run(mode, workdir, output):
+    """在当前进程中执行一次合并（由子进程调用）"""
+    if mode == 'streaming':
+        from pdf_merger import merge_pdfs
+        merge_pdfs(workdir, output)
+    else:
+        from PyPDF2 import PdfMerger
+        from pdf_merger import collect_inputs
+        merger = PdfMerger()
+        for path in collect_inputs(workdir):
+            merger.append(path)
+        merger.write(output)
+        merger.close()
+    print(peak_rss())
+
+
+def peak_rss():
+    """当前进程的峰值RSS（KB）
+
+    不用 getrusage：其 ru_maxrss 跨 exec 保留，会带上生成测试文件的父进程的峰值。
+    """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(mode, workdir):
+    output = os.path.join(workdir + '_out', f'merged_{mode}.pdf')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', mode,
+                             '--workdir', workdir, '--output', output],
+                            stdout=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        print(f"{mode:<10} 失败（退出码 {result.returncode}）")
+        return
+    rss = int(result.stdout.split()[-1])
+    print(f"{mode:<10} 用时 {elapsed:7.2f}秒  峰值RSS {rss / 1024:8.1f}MB  "
+          f"输出 {os.path.getsize(output) / 1024 / 1024:8.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF合并内存压测')
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--size', type=int, default=1200, help='页面图片边长（像素）')
+    parser.add_argument('--workdir', default='/tmp/pdf_merge_bench')
+    parser.add_argument('--run', choices=('streaming', 'pypdf2'), help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.workdir, args.output)
+        return
+
+    generate(args.workdir, args.files, args.pages, args.size)
+    total = sum(os.path.getsize(os.path.join(args.workdir, name))
+                for name in os.listdir(args.workdir))
+    print(f"输入 {args.files} 个文件，共 {total / 1024 / 1024:.1f}MB")
+    for mode in ('pypdf2', 'streaming'):
+        measure(mode, args.workdir)
+
+
+if __name__ == '__main__':
+    main()
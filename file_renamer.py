@@ -1,14 +1,355 @@
 import os
+import re
+import json
+import argparse
+import secrets
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# 撤销日志的文件名前缀（默认保存在根目录中）
+JOURNAL_PREFIX = '.rename_journal_'
+
+
+def natural_key(name):
+    """自然排序键：file2 排在 file10 之前"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def default_journal_path(root):
+    """根目录中带时间戳的撤销日志路径"""
+    return os.path.join(root, f"{JOURNAL_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
+                              f"{secrets.token_hex(2)}.jsonl")
+
+
+class RenamePlan:
+    """重命名计划
+
+    ops 按目录分组：{目录: [(原名, 新名), ...]}，重命名只在同一目录内进行。
+    conflicts 为 [(路径, 原因)]，有冲突的条目不会出现在 ops 中。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.ops = {}
+        self.conflicts = []
+        self.scanned = 0
+        self.chained = 0  # 目标名正被另一条目占用、需要经临时名中转的数量
+        self.cycles = 0
+
+    def __len__(self):
+        return sum(len(moves) for moves in self.ops.values())
+
+    def __iter__(self):
+        for directory, moves in self.ops.items():
+            for old, new in moves:
+                yield os.path.join(directory, old), os.path.join(directory, new)
+
+
+def make_renamer(pattern, replacement=None, template=None, literal=False, ignore_case=False):
+    """生成新名称的函数 rename(名称, 字段) -> 新名称，名称不匹配时返回 None
+
+    replacement 为 re.sub 的替换串（可用 \\1、\\g<name>）；template 为 str.format 模板，
+    可用字段 {name} {stem} {ext} {parent} {n} {mtime}，以及正则分组 {g[1]}、命名分组
+    {year} 等，如 '{mtime:%Y%m%d}_{n:04d}{ext}'。
+    """
+    if literal:
+        pattern = re.escape(pattern)
+        if replacement is not None:
+            replacement = replacement.replace('\\', '\\\\')
+    regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+    def rename(name, fields):
+        match = regex.search(name)
+        if match is None:
+            return None
+        if template is None:
+            return regex.sub(replacement or '', name)
+        stem, ext = os.path.splitext(name)
+        values = dict(fields, name=name, stem=stem, ext=ext,
+                      g=(match.group(0),) + match.groups())
+        values.update((k, v) for k, v in match.groupdict().items() if v is not None)
+        return template.format(**values)
+    return rename
+
+
+def _check_name(name):
+    if not name or name in ('.', '..') or os.sep in name or (os.altsep and os.altsep in name):
+        return '新名称无效'
+    return None
+
+
+def _resolve(names, renames, directory, conflicts):
+    """去掉有冲突的重命名（重名、目标已存在），直到剩下的都可以执行"""
+    while True:
+        bad = {}
+        by_target = defaultdict(list)
+        for old, new in renames.items():
+            by_target[new].append(old)
+        for new, olds in by_target.items():
+            if len(olds) > 1:
+                for old in olds:
+                    bad[old] = f'与 {len(olds) - 1} 个条目重命名为同一名称 {new}'
+            elif new in names and new not in renames:
+                bad[olds[0]] = f'目标已存在: {new}'
+        if not bad:
+            return
+        for old, reason in bad.items():
+            del renames[old]
+            conflicts.append((os.path.join(directory, old), reason))
+
+
+def _count_cycles(renames):
+    """统计重命名中的环（a->b, b->a），环必须经临时名才能完成"""
+    cycles = 0
+    state = {}
+    for start in renames:
+        node = start
+        while node in renames and node not in state:
+            state[node] = start
+            node = renames[node]
+        if node in renames and state.get(node) == start:
+            cycles += 1
+    return cycles
+
+
+def plan_renames(root, pattern, replacement=None, template=None, recursive=False,
+                 literal=False, ignore_case=False, include_dirs=False, start=1):
+    """扫描目录，生成完整的重命名计划（不修改任何文件）
+
+    每个目录只列出一次（os.scandir），匹配的条目按自然顺序编号（{n} 从 start 开始），
+    同一目录内检查重名和目标已存在的冲突，并统计链式重命名和环。
+    """
+    rename = make_renamer(pattern, replacement, template, literal, ignore_case)
+    plan = RenamePlan(os.path.abspath(root))
+    stack = [plan.root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError as e:
+            plan.conflicts.append((directory, f'无法读取: {e.strerror}'))
+            continue
+        plan.scanned += len(entries)
+        names = set()
+        candidates = []
+        for entry in entries:
+            names.add(entry.name)
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and recursive:
+                stack.append(entry.path)
+            if is_dir and not include_dirs:
+                continue
+            if not entry.name.startswith(JOURNAL_PREFIX):
+                candidates.append(entry)
+        if not candidates:
+            continue
+
+        candidates.sort(key=lambda entry: natural_key(entry.name))
+        parent = os.path.basename(directory)
+        renames = {}
+        n = start
+        for entry in candidates:
+            fields = {'parent': parent, 'n': n}
+            if template is not None and 'mtime' in template:
+                fields['mtime'] = datetime.fromtimestamp(entry.stat(follow_symlinks=False).st_mtime)
+            try:
+                new = rename(entry.name, fields)
+            except (KeyError, IndexError, ValueError) as e:
+                plan.conflicts.append((entry.path, f'模板错误: {e}'))
+                continue
+            if new is None:
+                continue
+            n += 1
+            if new == entry.name:
+                continue
+            error = _check_name(new)
+            if error:
+                plan.conflicts.append((entry.path, f'{error}: {new!r}'))
+                continue
+            renames[entry.name] = new
+
+        _resolve(names, renames, directory, plan.conflicts)
+        if renames:
+            plan.ops[directory] = list(renames.items())
+            plan.chained += sum(1 for new in renames.values() if new in renames)
+            plan.cycles += _count_cycles(renames)
+    return plan
+
+
+def _stage(moves, token):
+    """为目标名正被占用的重命名分配临时名，返回 [(原名, 新名, 临时名或 None)]"""
+    sources = {old for old, _ in moves}
+    return [(old, new, f'.rename-{token}-{i}' if new in sources else None)
+            for i, (old, new) in enumerate(moves)]
+
+
+def _apply_directory(directory, steps):
+    """两阶段执行一个目录中的重命名：先把链式/成环的条目改为临时名，再改为最终名称"""
+    done = 0
+    for old, _, tmp in steps:
+        if tmp is not None:
+            os.rename(os.path.join(directory, old), os.path.join(directory, tmp))
+    for old, new, tmp in steps:
+        if tmp is None:
+            target = os.path.join(directory, new)
+            if os.path.lexists(target):
+                raise FileExistsError(f'{target} 已存在（计划生成后被创建）')
+            os.rename(os.path.join(directory, old), target)
+            done += 1
+    for _, new, tmp in steps:
+        if tmp is not None:
+            os.rename(os.path.join(directory, tmp), os.path.join(directory, new))
+            done += 1
+    return done
+
+
+def _run_groups(groups, workers, journal=None, deepest_first=True):
+    """按目录深度从深到浅执行（先改子条目再改父目录），同一深度的目录并行执行
+
+    撤销时 deepest_first 为 False：先恢复父目录的名称，子条目的原路径才有效。
+    """
+    by_depth = defaultdict(list)
+    for directory, steps in groups:
+        by_depth[directory.count(os.sep)].append((directory, steps))
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for depth in sorted(by_depth, reverse=deepest_first):
+            batch = by_depth[depth]
+            for (directory, _), count in zip(batch, executor.map(
+                    lambda group: _apply_directory(*group), batch)):
+                done += count
+                if journal is not None:
+                    journal.write(json.dumps({'done': directory}, ensure_ascii=False) + '\n')
+            if journal is not None:
+                journal.flush()
+    return done
+
+
+def apply_plan(plan, journal_path=None, workers=8, force=False):
+    """执行重命名计划，返回重命名的条目数
+
+    执行前把完整计划（含临时名）写入撤销日志并 fsync，中途中断时也可以用
+    undo_renames() 恢复。计划中有冲突时需要 force=True 才执行（跳过冲突条目）。
+    """
+    if plan.conflicts and not force:
+        raise ValueError(f'重命名计划中有 {len(plan.conflicts)} 个冲突')
+    if journal_path is None:
+        journal_path = default_journal_path(plan.root)
+    token = secrets.token_hex(4)
+    groups = [(directory, _stage(moves, token)) for directory, moves in plan.ops.items()]
+
+    with open(journal_path, 'w', encoding='utf-8') as journal:
+        journal.write(json.dumps({'root': plan.root, 'created': time.time()}) + '\n')
+        for directory, steps in groups:
+            journal.write(json.dumps({'dir': directory, 'steps': steps}, ensure_ascii=False) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+        return _run_groups(groups, workers, journal)
+
+
+def undo_renames(journal_path, workers=8):
+    """按撤销日志把文件名恢复原状，对执行到一半中断的日志同样有效，返回恢复的条目数"""
+    groups = []
+    done = set()
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'steps' in record:
+                groups.append((record['dir'], record['steps']))
+            elif 'done' in record:
+                done.add(record['done'])
+
+    token = secrets.token_hex(4)
+    reverse = []
+    for directory, steps in groups:
+        moves = []
+        for old, new, tmp in steps:
+            old_exists = os.path.lexists(os.path.join(directory, old))
+            if tmp is not None and os.path.lexists(os.path.join(directory, tmp)):
+                current = tmp
+            elif directory in done or (not old_exists and
+                                       os.path.lexists(os.path.join(directory, new))):
+                current = new
+            else:
+                continue  # 尚未执行
+            moves.append((current, old))
+        if moves:
+            reverse.append((directory, _stage(moves, token)))
+    return _run_groups(reverse, workers, deepest_first=False)
+
 
 def batch_rename_files(directory, old_text, new_text):
-    """批量重命名文件，将文件名中的指定文本替换为新文本"""
-    for filename in os.listdir(directory):
-        if old_text in filename:
-            old_file = os.path.join(directory, filename)
-            new_file = os.path.join(directory, filename.replace(old_text, new_text))
-            os.rename(old_file, new_file)
-            print(f'已将 {filename} 重命名为 {filename.replace(old_text, new_text)}')
-
-# 使用示例
-directory = "你的文件夹路径"
-batch_rename_files(directory, "旧文本", "新文本") 
\ No newline at end of file
+    """批量重命名文件，将文件名中的指定文本替换为新文本
+
+    先生成完整计划再执行，重名或目标已存在的文件会跳过，不会覆盖。
+    """
+    plan = plan_renames(directory, old_text, new_text, literal=True)
+    for path, reason in plan.conflicts:
+        print(f'跳过 {path}: {reason}')
+    for old_file, new_file in plan:
+        print(f'已将 {os.path.basename(old_file)} 重命名为 {os.path.basename(new_file)}')
+    return apply_plan(plan, force=True) if len(plan) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按正则或模板批量重命名，可预演和撤销')
+    parser.add_argument('root', nargs='?', help='根目录')
+    parser.add_argument('pattern', nargs='?', help='匹配文件名的正则表达式')
+    parser.add_argument('replacement', nargs='?', help='替换串，可用 \\1 引用分组')
+    parser.add_argument('-t', '--template', help="名称模板，如 '{mtime:%%Y%%m%%d}_{n:04d}{ext}'")
+    parser.add_argument('-r', '--recursive', action='store_true', help='处理子目录')
+    parser.add_argument('-F', '--literal', action='store_true', help='按普通文本匹配和替换')
+    parser.add_argument('-i', '--ignore-case', action='store_true', help='忽略大小写')
+    parser.add_argument('--dirs', action='store_true', help='同时重命名文件夹')
+    parser.add_argument('--start', type=int, default=1, help='{n} 的起始编号')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='只显示重命名计划')
+    parser.add_argument('--show', type=int, default=100, help='预演时最多显示的条目数')
+    parser.add_argument('--force', action='store_true', help='有冲突时跳过冲突条目继续执行')
+    parser.add_argument('-j', '--workers', type=int, default=8, help='线程数')
+    parser.add_argument('--journal', help='撤销日志路径')
+    parser.add_argument('--undo', metavar='JOURNAL', help='按撤销日志恢复原名')
+    args = parser.parse_args()
+
+    if args.undo:
+        print(f'已恢复 {undo_renames(args.undo, args.workers)} 个条目')
+        return
+    if not args.root or not args.pattern or (args.replacement is None and not args.template):
+        parser.error('需要根目录、匹配模式，以及替换串或 --template')
+
+    start = time.perf_counter()
+    plan = plan_renames(args.root, args.pattern, args.replacement, args.template,
+                        recursive=args.recursive, literal=args.literal,
+                        ignore_case=args.ignore_case, include_dirs=args.dirs, start=args.start)
+    print(f'扫描 {plan.scanned} 个条目，计划重命名 {len(plan)} 个，冲突 {len(plan.conflicts)} 个，'
+          f'经临时名中转 {plan.chained} 个（其中成环 {plan.cycles} 组），'
+          f'用时 {time.perf_counter() - start:.2f}秒')
+    for path, reason in plan.conflicts[:args.show]:
+        print(f'冲突 {path}: {reason}')
+    if args.dry_run:
+        for i, (old_file, new_file) in enumerate(plan):
+            if i >= args.show:
+                print(f'...（共 {len(plan)} 个）')
+                break
+            print(f'{old_file} -> {os.path.basename(new_file)}')
+        return
+    if plan.conflicts and not args.force:
+        print('存在冲突，未执行重命名（使用 --force 跳过冲突条目）')
+        return
+    if not len(plan):
+        return
+
+    journal_path = args.journal or default_journal_path(plan.root)
+    start = time.perf_counter()
+    count = apply_plan(plan, journal_path, args.workers, force=args.force)
+    print(f'已重命名 {count} 个条目，用时 {time.perf_counter() - start:.2f}秒')
+    print(f'撤销: python file_renamer.py --undo {journal_path}')
+
+
+if __name__ == '__main__':
+    main()
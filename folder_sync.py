@@ -1,52 +1,625 @@
 import os
 import shutil
 import hashlib
+import argparse
+import errno
+import mmap
+import sqlite3
+import stat
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# 读文件计算哈希时的缓冲区大小
+HASH_BUFFER_SIZE = 1024 * 1024
+# 块级增量更新的块大小，以及启用增量更新的最小文件大小
+DELTA_BLOCK_SIZE = 64 * 1024
+DELTA_MIN_SIZE = 16 * 1024 * 1024
+# 需要重写的数据超过文件大小的这一比例时放弃增量，直接整体复制
+DELTA_MAX_LITERAL_RATIO = 0.5
+# 大段新数据中每隔这么多个块才逐字节滚动一次，其余位置只按块比较
+DELTA_ROLL_INTERVAL = 16
+_ADLER_MOD = 65521
+# 状态数据库文件名（保存在目标文件夹中，同步时忽略以此开头的文件）
+STATE_DB_NAME = '.folder_sync.db'
+
+
 def get_file_hash(filepath):
-    """计算文件的MD5哈希值"""
-    hash_md5 = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-def sync_folders(source_dir, target_dir):
-    """同步两个文件夹的内容"""
-    if not os.path.exists(target_dir):
+    """计算文件的哈希值（安装了 xxhash 时用 xxh3_128，否则用 BLAKE2b）"""
+    hasher = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=20)
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(filepath, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+class SyncState:
+    """记录文件哈希的 SQLite 状态库
+
+    以 (路径, 大小, 修改时间) 为准缓存哈希值，文件未变化时直接复用上次的结果。
+    只在调用线程中访问。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS hashes ('
+                          'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)')
+        self._pending = 0
+
+    def get_hash(self, path, st):
+        row = self.conn.execute('SELECT size, mtime_ns, hash FROM hashes WHERE path = ?',
+                                (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        return None
+
+    def set_hash(self, path, st, digest):
+        self.conn.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)',
+                          (path, st.st_size, st.st_mtime_ns, digest))
+        self._pending += 1
+        if self._pending >= 1000:
+            self.commit()
+
+    def forget(self, path):
+        self.conn.execute('DELETE FROM hashes WHERE path = ? OR path LIKE ?',
+                          (path, path.rstrip(os.sep) + os.sep + '%'))
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def _scan(path):
+    """列出目录内容，返回 {名称: DirEntry}，目录不存在时返回空字典"""
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name: entry for entry in entries
+                    if not entry.name.startswith(STATE_DB_NAME)}
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+
+
+def copy_file(source_file, target_file):
+    """复制文件及其元数据，先写临时文件再替换，中断时不会留下半个文件"""
+    tmp_file = os.path.join(os.path.dirname(target_file),
+                            f'.{os.path.basename(target_file)}.sync-tmp')
+    try:
+        shutil.copy2(source_file, tmp_file)
+        os.replace(tmp_file, target_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return os.path.getsize(target_file)
+
+
+def copy_link(source_link, target_link):
+    """在目标中重建符号链接（复制链接内容本身，不跟随），先建临时链接再替换"""
+    link = os.readlink(source_link)
+    tmp_link = os.path.join(os.path.dirname(target_link),
+                            f'.{os.path.basename(target_link)}.sync-tmp')
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(link, tmp_link)
+    os.replace(tmp_link, target_link)
+    return link
+
+
+def block_signature(path, block_size=DELTA_BLOCK_SIZE):
+    """计算文件每个块的弱校验（Adler-32）和强校验（BLAKE2b）
+
+    返回 {弱校验: [(强校验, 偏移, 长度), ...]}
+    """
+    signature = {}
+    with open(path, 'rb') as f:
+        offset = 0
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            strong = hashlib.blake2b(block, digest_size=16).digest()
+            signature.setdefault(zlib.adler32(block), []).append((strong, offset, len(block)))
+            offset += len(block)
+    return signature
+
+
+def _find_block(signature, weak, data, min_offset=None, prefer=None):
+    """在签名中查找与 data 相同的块，返回其偏移；min_offset 限制只匹配不早于它的块"""
+    candidates = signature.get(weak)
+    if not candidates:
+        return None
+    strong = hashlib.blake2b(data, digest_size=16).digest()
+    found = None
+    for digest, offset, length in candidates:
+        if digest != strong or length != len(data):
+            continue
+        if min_offset is not None and offset < min_offset:
+            continue
+        if offset == prefer:
+            return offset
+        if found is None:
+            found = offset
+    return found
+
+
+def delta_plan(source_file, signature, block_size=DELTA_BLOCK_SIZE, inplace=False,
+               max_literal=None):
+    """用滚动校验把源文件表示为目标文件中已有的块和需要写入的新数据
+
+    先按块对齐直接比较（C 实现的 adler32，未变化的区域很快）；对不上时逐字节
+    滚动 Adler-32，在一个块的范围内寻找插入/删除后错位的块。在连续的新数据中
+    每 DELTA_ROLL_INTERVAL 个块才滚动一次，其余按块跳过，避免逐字节处理整段新数据。
+    返回 [('copy', 目标偏移, 长度) 或 ('data', 源偏移, 长度)]，相邻的操作已合并。
+    inplace 为 True 时只匹配不早于当前写入位置的块，保证原地更新时不会读到已被覆盖的数据。
+    新数据超过 max_literal 字节时提前放弃，返回 None。
+    """
+    ops = []
+
+    def emit(kind, offset, length):
+        if ops and ops[-1][0] == kind and ops[-1][1] + ops[-1][2] == offset:
+            ops[-1] = (kind, ops[-1][1], ops[-1][2] + length)
+        elif length:
+            ops.append((kind, offset, length))
+
+    with open(source_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ops
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            pos = 0
+            literal = 0  # 尚未输出的新数据起点
+            emitted = 0  # 已输出的新数据字节数
+            while pos < size:
+                if max_literal is not None and emitted + pos - literal > max_literal:
+                    return None
+                block = data[pos:pos + block_size]
+                weak = zlib.adler32(block)
+                match = _find_block(signature, weak, block,
+                                    pos if inplace else None, prefer=pos)
+                # 变化的数据可能跨到下一个块，新数据开头的两个块都要滚动
+                rolling = (pos - literal) % (block_size * DELTA_ROLL_INTERVAL) < 2 * block_size
+                if match is None and len(block) == block_size and not rolling:
+                    pos += block_size
+                    continue
+                if match is None and len(block) == block_size:
+                    # 逐字节滚动，最多向后找一个块
+                    a, b = weak & 0xffff, weak >> 16
+                    limit = min(size - block_size, pos + block_size)
+                    start = pos
+                    while pos < limit:
+                        out, new = data[pos], data[pos + block_size]
+                        a = (a - out + new) % _ADLER_MOD
+                        b = (b - block_size * out + a - 1) % _ADLER_MOD
+                        pos += 1
+                        weak = a | (b << 16)
+                        if weak in signature:
+                            block = data[pos:pos + block_size]
+                            match = _find_block(signature, weak, block,
+                                                pos if inplace else None, prefer=pos)
+                            if match is not None:
+                                break
+                    if match is None:
+                        pos = max(pos, start + 1)
+                        continue
+                if match is None:
+                    pos += len(block)  # 末尾不足一块
+                    continue
+                emit('data', literal, pos - literal)
+                emitted += pos - literal
+                emit('copy', match, len(block))
+                pos += len(block)
+                literal = pos
+            emit('data', literal, size - literal)
+        finally:
+            data.close()
+    return ops
+
+
+def _copy_range(fd_in, fd_out, length, offset_in, offset_out):
+    """在两个文件描述符之间复制一段数据，优先用 copy_file_range（写时复制文件系统上为引用复制）"""
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    while length > 0:
+        if copy_file_range is not None and fd_in != fd_out:
+            try:
+                n = copy_file_range(fd_in, fd_out, length, offset_in, offset_out)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                    raise
+                copy_file_range = None
+                continue
+        else:
+            n = os.pwrite(fd_out, os.pread(fd_in, min(length, HASH_BUFFER_SIZE), offset_in),
+                          offset_out)
+        if n == 0:
+            raise OSError(errno.EIO, '复制数据时文件被截断')
+        length -= n
+        offset_in += n
+        offset_out += n
+
+
+def delta_copy(source_file, target_file, block_size=DELTA_BLOCK_SIZE, inplace=False):
+    """按块增量更新目标文件，只写入发生变化的数据
+
+    默认写入临时文件后替换（复用的块用 copy_file_range 从旧文件复制）；inplace 为
+    True 时直接修改目标文件，位置未变的块不写入，完成后 fsync。
+    返回 (写入的新数据字节数, 复用的字节数)；变化过多时退回整体复制。
+    """
+    size = os.path.getsize(source_file)
+    signature = block_signature(target_file, block_size)
+    ops = delta_plan(source_file, signature, block_size, inplace,
+                     max_literal=size * DELTA_MAX_LITERAL_RATIO)
+    if ops is None:
+        return copy_file(source_file, target_file), 0
+    literal = sum(length for kind, _, length in ops if kind == 'data')
+
+    with open(source_file, 'rb') as src:
+        if inplace:
+            with open(target_file, 'r+b') as out:
+                pos = 0
+                for kind, offset, length in ops:
+                    if kind == 'data':
+                        _copy_range(src.fileno(), out.fileno(), length, offset, pos)
+                    elif offset != pos:
+                        # 匹配的块不早于当前位置，顺序向前复制不会读到已覆盖的数据
+                        _copy_range(out.fileno(), out.fileno(), length, offset, pos)
+                    pos += length
+                out.truncate(pos)
+                out.flush()
+                os.fsync(out.fileno())
+            shutil.copystat(source_file, target_file)
+            return literal, size - literal
+
+        tmp_file = os.path.join(os.path.dirname(target_file),
+                                f'.{os.path.basename(target_file)}.sync-tmp')
+        try:
+            with open(target_file, 'rb') as basis, open(tmp_file, 'wb') as out:
+                pos = 0
+                for kind, offset, length in ops:
+                    fd = src.fileno() if kind == 'data' else basis.fileno()
+                    _copy_range(fd, out.fileno(), length, offset, pos)
+                    pos += length
+                out.flush()
+                os.fsync(out.fileno())
+            shutil.copystat(source_file, tmp_file)
+            os.replace(tmp_file, target_file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    return literal, size - literal
+
+
+def update_file(source_file, target_file, delta=True, inplace=False):
+    """更新已存在的目标文件，大文件使用块级增量，返回 (写入字节数, 复用字节数)"""
+    if delta and os.path.getsize(target_file) >= DELTA_MIN_SIZE:
+        return delta_copy(source_file, target_file, inplace=inplace)
+    return copy_file(source_file, target_file), 0
+
+
+def _verify_and_copy(source_file, target_file, source_hash, target_hash, delta, inplace):
+    """大小相同但修改时间不同的文件：比较哈希，不同才更新
+
+    返回 (写入字节数, 复用字节数) 或 None（内容相同），以及源哈希、目标哈希、读取字节数
+    """
+    hashed = 0
+    if source_hash is None:
+        source_hash = get_file_hash(source_file)
+        hashed += os.path.getsize(source_file)
+    if target_hash is None:
+        target_hash = get_file_hash(target_file)
+        hashed += os.path.getsize(target_file)
+    if source_hash == target_hash:
+        # 内容相同，同步修改时间，下次直接按元数据跳过
+        shutil.copystat(source_file, target_file)
+        return None, source_hash, target_hash, hashed
+    transferred = update_file(source_file, target_file, delta, inplace)
+    return transferred, source_hash, source_hash, hashed
+
+
+class _PathEntry:
+    """按路径查询的文件信息，提供与 os.DirEntry 相同的接口"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._lstat = os.lstat(path)
+        self._stat = None
+
+    def is_dir(self, follow_symlinks=True):
+        if follow_symlinks:
+            return os.path.isdir(self.path)
+        return stat.S_ISDIR(self._lstat.st_mode)
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self._lstat.st_mode)
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+
+def _lookup(path):
+    """返回路径对应的 _PathEntry，不存在时返回 None"""
+    try:
+        return _PathEntry(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def new_stats():
+    return {'copied': 0, 'updated': 0, 'unchanged': 0, 'verified': 0, 'deleted': 0,
+            'dirs_created': 0, 'links': 0, 'bytes_copied': 0, 'bytes_reused': 0, 'bytes_hashed': 0,
+            'errors': 0}
+
+
+def sync_paths(source_dir, target_dir, relative_paths, executor, state, record, stats,
+               mirror=False, dry_run=False, workers=8, delta=True, inplace=False):
+    """同步源文件夹中的指定路径（'' 表示整个文件夹），结果累加到 stats
+
+    文件夹路径会递归同步其全部内容；源中已不存在的路径在 mirror 为 True 时从目标中删除。
+    哈希和复制提交到 executor 并行执行，state 和 record 只在调用线程中使用。
+    """
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            kind, source_file, target_file = pending.pop(future)
+            try:
+                result = future.result()
+            except OSError as e:
+                stats['errors'] += 1
+                record(f"失败: {target_file}: {str(e)}")
+                continue
+            if kind == 'copy':
+                stats['copied'] += 1
+                stats['bytes_copied'] += result
+                record(f"复制文件: {target_file}")
+                continue
+            if kind == 'verify':
+                result, source_hash, target_hash, hashed = result
+                stats['bytes_hashed'] += hashed
+                state.set_hash(source_file, os.stat(source_file), source_hash)
+                state.set_hash(target_file, os.stat(target_file), target_hash)
+                if result is None:
+                    stats['verified'] += 1
+                    continue
+            written, reused = result
+            stats['updated'] += 1
+            stats['bytes_copied'] += written
+            stats['bytes_reused'] += reused
+            record(f"更新文件: {target_file}（写入 {written} 字节，复用 {reused} 字节）")
+
+    def submit(kind, func, *args):
+        if len(pending) >= workers * 4:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        future = executor.submit(func, *args)
+        pending[future] = (kind,) + args[:2]
+
+    def remove(entry):
+        stats['deleted'] += 1
+        record(f"删除: {entry.path}")
+        if dry_run:
+            return
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.remove(entry.path)
+        state.forget(entry.path)
+
+    def handle(entry, target_entry, target_path, relative_path):
+        """比较一个源条目和对应的目标条目，需要递归的文件夹加入 stack"""
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if target_entry is not None and \
+                target_entry.is_dir(follow_symlinks=False) != is_dir:
+            stats['errors'] += 1
+            record(f"失败: {target_path}: 源与目标一个是文件夹一个不是")
+            return
+        if entry.is_symlink():
+            # 符号链接（包括指向文件夹的）原样重建，不跟随复制其指向的内容
+            link = os.readlink(entry.path)
+            if target_entry is not None and target_entry.is_symlink() and \
+                    os.readlink(target_path) == link:
+                stats['unchanged'] += 1
+                return
+            stats['links'] += 1
+            record(f"创建链接: {target_path} -> {link}")
+            if not dry_run:
+                try:
+                    copy_link(entry.path, target_path)
+                except OSError as e:
+                    stats['links'] -= 1
+                    stats['errors'] += 1
+                    record(f"失败: {target_path}: {str(e)}")
+                    return
+                state.forget(target_path)
+            return
+        if is_dir:
+            if target_entry is None:
+                stats['dirs_created'] += 1
+                record(f"创建文件夹: {target_path}")
+                if not dry_run:
+                    os.makedirs(target_path, exist_ok=True)
+            stack.append(relative_path)
+            return
+
+        source_stat = entry.stat()
+        if target_entry is None or target_entry.is_symlink():
+            # 目标是符号链接时整体替换为文件，不能写入链接指向的文件
+            if dry_run:
+                stats['copied'] += 1
+                stats['bytes_copied'] += source_stat.st_size
+                record(f"复制文件: {target_path}")
+            else:
+                submit('copy', copy_file, entry.path, target_path)
+            return
+
+        target_stat = target_entry.stat()
+        if source_stat.st_size == target_stat.st_size and \
+                source_stat.st_mtime_ns == target_stat.st_mtime_ns:
+            stats['unchanged'] += 1
+        elif dry_run:
+            # 大小不同一定需要更新；大小相同的可能只是修改时间不同
+            stats['updated'] += 1
+            stats['bytes_copied'] += source_stat.st_size
+            suspect = '（待哈希确认）' if source_stat.st_size == target_stat.st_size else ''
+            record(f"更新文件: {target_path}{suspect}")
+        elif source_stat.st_size != target_stat.st_size:
+            submit('update', update_file, entry.path, target_path, delta, inplace)
+        else:
+            submit('verify', _verify_and_copy, entry.path, target_path,
+                   state.get_hash(entry.path, source_stat),
+                   state.get_hash(target_path, target_stat), delta, inplace)
+
+    stack = []
+    for relative_path in relative_paths:
+        if not relative_path:
+            stack.append('')
+            continue
+        if os.path.basename(relative_path).startswith(STATE_DB_NAME):
+            continue
+        target_path = os.path.join(target_dir, relative_path)
+        entry = _lookup(os.path.join(source_dir, relative_path))
+        target_entry = _lookup(target_path)
+        if entry is None:
+            if mirror and target_entry is not None:
+                remove(target_entry)
+            continue
+        if not dry_run and target_entry is None:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        handle(entry, target_entry, target_path, relative_path)
+
+    while stack:
+        relative_path = stack.pop()
+        source_root = os.path.join(source_dir, relative_path)
+        target_root = os.path.join(target_dir, relative_path)
+        source_entries = _scan(source_root)
+        target_entries = _scan(target_root)
+
+        for name, entry in source_entries.items():
+            handle(entry, target_entries.get(name), os.path.join(target_root, name),
+                   os.path.join(relative_path, name))
+
+        if mirror:
+            for name, entry in target_entries.items():
+                if name not in source_entries:
+                    remove(entry)
+
+    collect(wait(pending).done)
+    return stats
+
+
+def sync_folders(source_dir, target_dir, mirror=False, dry_run=False, workers=8,
+                 state_db=None, log_dir='.', delta=True, inplace=False):
+    """同步两个文件夹的内容
+
+    先按 (大小, 修改时间) 比较：不存在或大小不同的文件直接复制，两者都相同的跳过，
+    只有大小相同而修改时间不同的文件才计算哈希确认（哈希缓存在状态库中）。
+    哈希和复制在线程池中并行执行。已存在的大文件（DELTA_MIN_SIZE 以上）按块增量更新，
+    只写入变化的部分。符号链接（包括指向文件夹的）在目标中原样重建，不跟随复制。
+
+    Args:
+        source_dir: 源文件夹
+        target_dir: 目标文件夹
+        mirror: 删除目标中源文件夹没有的文件和文件夹
+        dry_run: 只列出将要执行的操作，不修改任何文件
+        workers: 线程数
+        state_db: 状态库路径，默认为目标文件夹中的 .folder_sync.db
+        log_dir: 操作日志保存目录
+        delta: 大文件使用块级增量更新
+        inplace: 增量更新时直接修改目标文件（不经临时文件，完成后 fsync）
+
+    Returns:
+        统计信息字典
+    """
+    source_dir = os.path.abspath(source_dir)
+    target_dir = os.path.abspath(target_dir)
+    if not os.path.exists(target_dir) and not dry_run:
         os.makedirs(target_dir)
-    
+
+    stats = new_stats()
+    state = None
+    if not dry_run:
+        state = SyncState(state_db or os.path.join(target_dir, STATE_DB_NAME))
+    start = time.perf_counter()
+
     # 记录操作日志
-    log_file = f"sync_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    
-    with open(log_file, 'w', encoding='utf-8') as log:
-        # 同步源文件夹到目标文件夹
-        for root, dirs, files in os.walk(source_dir):
-            relative_path = os.path.relpath(root, source_dir)
-            target_root = os.path.join(target_dir, relative_path)
-            
-            # 创建目标子文件夹
-            for dir_name in dirs:
-                target_dir_path = os.path.join(target_root, dir_name)
-                if not os.path.exists(target_dir_path):
-                    os.makedirs(target_dir_path)
-                    log.write(f"创建文件夹: {target_dir_path}\n")
-            
-            # 复制/更新文件
-            for file_name in files:
-                source_file = os.path.join(root, file_name)
-                target_file = os.path.join(target_root, file_name)
-                
-                if not os.path.exists(target_file):
-                    shutil.copy2(source_file, target_file)
-                    log.write(f"复制文件: {target_file}\n")
-                else:
-                    # 比较文件哈希值，不同则更新
-                    if get_file_hash(source_file) != get_file_hash(target_file):
-                        shutil.copy2(source_file, target_file)
-                        log.write(f"更新文件: {target_file}\n")
-    
-    print(f"同步完成！详细日志请查看: {log_file}")
-
-# 使用示例
-sync_folders('源文件夹路径', '目标文件夹路径') 
\ No newline at end of file
+    log_file = os.path.join(log_dir, f"sync_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+
+    with open(log_file, 'w', encoding='utf-8') as log, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def record(message):
+            log.write(message + '\n')
+            if dry_run:
+                print(message)
+
+        sync_paths(source_dir, target_dir, [''], executor, state, record, stats,
+                   mirror=mirror, dry_run=dry_run, workers=workers, delta=delta,
+                   inplace=inplace)
+
+    if state is not None:
+        state.close()
+    stats['elapsed'] = time.perf_counter() - start
+
+    prefix = '预演完成（未修改任何文件）' if dry_run else '同步完成'
+    print(f"{prefix}！{format_stats(stats)}")
+    print(f"详细日志请查看: {log_file}")
+    return stats
+
+
+def format_stats(stats):
+    return (f"复制 {stats['copied']}，更新 {stats['updated']}，链接 {stats['links']}，"
+            f"删除 {stats['deleted']}，未变化 {stats['unchanged'] + stats['verified']}，"
+            f"失败 {stats['errors']}，写入 {stats['bytes_copied'] / 1024 / 1024:.2f}MB，"
+            f"复用 {stats['bytes_reused'] / 1024 / 1024:.2f}MB，"
+            f"用时 {stats['elapsed']:.2f}秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='增量同步两个文件夹')
+    parser.add_argument('source', help='源文件夹')
+    parser.add_argument('target', help='目标文件夹')
+    parser.add_argument('--mirror', action='store_true', help='删除目标中多余的文件')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='只列出将要执行的操作')
+    parser.add_argument('-j', '--workers', type=int, default=8, help='线程数')
+    parser.add_argument('--state-db', help='状态库路径')
+    parser.add_argument('--no-delta', action='store_true', help='大文件也整体复制')
+    parser.add_argument('--inplace', action='store_true', help='增量更新时直接修改目标文件')
+    parser.add_argument('--watch', action='store_true', help='完成同步后监听源文件夹，实时同步变化')
+    parser.add_argument('--debounce', type=float, default=0.5, help='实时同步的防抖窗口（秒）')
+    parser.add_argument('--full-sync-interval', type=float, default=3600,
+                        help='实时同步时完整比对的间隔（秒），0 表示不做定期比对')
+    args = parser.parse_args()
+    if args.watch:
+        from folder_watch import FolderWatcher
+        FolderWatcher(args.source, args.target, mirror=args.mirror, workers=args.workers,
+                      debounce=args.debounce, full_sync_interval=args.full_sync_interval,
+                      delta=not args.no_delta, inplace=args.inplace,
+                      state_db=args.state_db).run()
+        return
+    sync_folders(args.source, args.target, mirror=args.mirror, dry_run=args.dry_run,
+                 workers=args.workers, state_db=args.state_db, delta=not args.no_delta,
+                 inplace=args.inplace)
+
+
+if __name__ == '__main__':
+    main()
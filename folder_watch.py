@@ -0,0 +1,357 @@
+"""基于 inotify 的实时文件夹同步
+
+监听源文件夹（递归）中的创建、修改、移动和删除事件，事件在防抖窗口内合并后，
+只同步受影响的路径；另外定期做一次完整的比对，弥补可能漏掉的事件
+（如 inotify 队列溢出、监听数达到上限）。仅支持 Linux::
+
+    python folder_sync.py /data/src /backup/dst --watch --mirror --debounce 0.5
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from folder_sync import STATE_DB_NAME, SyncState, format_stats, new_stats, sync_paths
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+_EVENT = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+# 移出事件等待配对的移入事件的最长时间（秒），超时按删除处理
+MOVE_PAIR_TIMEOUT = 1.0
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, '实时同步依赖 inotify，仅支持 Linux')
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return _libc
+
+
+def _check(result):
+    if result < 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+    return result
+
+
+class Inotify:
+    """递归监听一个目录树的 inotify 封装
+
+    每个子目录一个监听，记录 监听描述符 -> 相对路径；新建或移入的子目录自动加入监听，
+    移出或删除的子目录解除监听。
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.libc = _load_libc()
+        self.fd = _check(self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+        self.watches = {}  # 监听描述符 -> 相对路径
+        self.overflowed = False  # 有事件丢失（队列溢出或监听数达到上限），需要完整比对
+        self.add_tree('')
+
+    def _add(self, relative_path):
+        path = os.path.join(self.root, relative_path)
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code in (errno.ENOENT, errno.ENOTDIR):
+                return  # 刚创建又被删除
+            if code == errno.ENOSPC:
+                if not self.overflowed:
+                    print(f'inotify 监听数达到上限（fs.inotify.max_user_watches），'
+                          f'{path} 的变化将在定期比对时同步')
+                self.overflowed = True
+                return
+            raise OSError(code, os.strerror(code), path)
+        self.watches[wd] = relative_path
+
+    def add_tree(self, relative_path):
+        """监听一个目录及其全部子目录"""
+        stack = [relative_path]
+        while stack:
+            current = stack.pop()
+            self._add(current)
+            try:
+                with os.scandir(os.path.join(self.root, current)) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(os.path.join(current, entry.name))
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+    def remove_tree(self, relative_path):
+        """解除一个目录及其全部子目录的监听"""
+        prefix = relative_path + os.sep
+        for wd, path in list(self.watches.items()):
+            if path == relative_path or path.startswith(prefix):
+                del self.watches[wd]
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """读取当前可用的事件，返回 [(掩码, cookie, 相对路径)]"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                directory = self.watches.get(wd)
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.add_tree(path)
+                    elif mask & IN_MOVED_FROM:
+                        self.remove_tree(path)
+                events.append((mask, cookie, path))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """实时同步两个文件夹
+
+    启动时先做一次完整同步，之后按 inotify 事件增量同步。一个路径在 debounce 秒内
+    没有新事件才会被同步，大文件写入过程中不会被反复复制；同一批路径中某个文件夹
+    的子路径会并入该文件夹一起处理。mirror 为 True 时，源中移动的文件和文件夹在目标
+    中直接改名，不重新复制。
+
+    Args:
+        source_dir: 源文件夹
+        target_dir: 目标文件夹
+        mirror: 同步删除和移动
+        workers: 复制文件的线程数
+        debounce: 防抖窗口（秒）
+        full_sync_interval: 完整比对的间隔（秒），为 0 时不做定期比对
+        delta: 大文件使用块级增量更新
+        inplace: 增量更新时直接修改目标文件
+        state_db: 状态库路径，默认为目标文件夹中的 .folder_sync.db
+        log_dir: 操作日志保存目录
+    """
+
+    def __init__(self, source_dir, target_dir, mirror=False, workers=8, debounce=0.5,
+                 full_sync_interval=3600, delta=True, inplace=False, state_db=None,
+                 log_dir='.'):
+        self.source_dir = os.path.abspath(source_dir)
+        self.target_dir = os.path.abspath(target_dir)
+        if self.target_dir == self.source_dir or \
+                self.target_dir.startswith(self.source_dir + os.sep):
+            raise ValueError('目标文件夹不能位于源文件夹之内')
+        self.mirror = mirror
+        self.workers = workers
+        self.debounce = debounce
+        self.full_sync_interval = full_sync_interval
+        self.delta = delta
+        self.inplace = inplace
+        self.state_db = state_db or os.path.join(self.target_dir, STATE_DB_NAME)
+        self.log_file = os.path.join(
+            log_dir, f"sync_watch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+        self.pending = {}  # 相对路径 -> 最后一次事件的时间
+        self.moves = {}  # cookie -> (移出的相对路径, 事件时间)，等待配对
+        self.renames = []  # [(原相对路径, 新相对路径)]，在下一批同步前应用
+        self.totals = new_stats()
+        self.batches = 0
+        self._wakeup = None  # run() 期间用于唤醒 select 的管道
+        self._wakeup_lock = threading.Lock()
+        self._running = False
+
+    def stop(self):
+        """从其他线程停止 run()"""
+        self._running = False
+        with self._wakeup_lock:
+            if self._wakeup is not None:
+                os.write(self._wakeup[1], b'\0')
+
+    def _record(self, message):
+        self._log.write(message + '\n')
+
+    def _sync(self, relative_paths):
+        stats = new_stats()
+        start = time.perf_counter()
+        sync_paths(self.source_dir, self.target_dir, relative_paths, self._executor,
+                   self._state, self._record, stats, mirror=self.mirror,
+                   workers=self.workers, delta=self.delta, inplace=self.inplace)
+        self._state.commit()
+        self._log.flush()
+        stats['elapsed'] = time.perf_counter() - start
+        for key, value in stats.items():
+            self.totals[key] = self.totals.get(key, 0) + value
+        self.batches += 1
+        return stats
+
+    def full_sync(self):
+        """完整比对两个文件夹"""
+        stats = self._sync([''])
+        self._last_full_sync = time.monotonic()
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] 完整比对：{format_stats(stats)}")
+        return stats
+
+    def _on_event(self, mask, cookie, path, now):
+        if mask & IN_MOVED_FROM:
+            self.moves[cookie] = (path, now)
+        elif mask & IN_MOVED_TO:
+            old_path, _ = self.moves.pop(cookie, (None, None))
+            if old_path is not None and self.mirror:
+                self.renames.append((old_path, path))
+        self.pending[path] = now
+
+    def _expire_moves(self, now):
+        """丢弃等待超时的移出事件（移出了源文件夹），其路径随后按删除同步"""
+        for cookie, (_, ts) in list(self.moves.items()):
+            if now - ts >= MOVE_PAIR_TIMEOUT:
+                del self.moves[cookie]
+
+    def _apply_renames(self):
+        """把源中的移动直接应用到目标，之后的同步只需确认内容未变"""
+        for old_path, new_path in self.renames:
+            old_target = os.path.join(self.target_dir, old_path)
+            new_target = os.path.join(self.target_dir, new_path)
+            if not os.path.lexists(old_target) or os.path.lexists(new_target):
+                continue
+            try:
+                os.rename(old_target, new_target)
+            except OSError:
+                continue  # 交给随后的同步处理
+            self._state.forget(old_target)
+            self._record(f"移动: {old_target} -> {new_target}")
+        self.renames = []
+
+    def _ready_paths(self, now):
+        """取出防抖窗口已过的路径，去掉被父目录包含的子路径
+
+        还在等待配对的移出路径暂不同步：配对的移入事件可能在下一次读取时才到，
+        提前同步会把一次改名变成删除加完整复制。
+        """
+        moving = {path for path, _ in self.moves.values()}
+        ready = sorted(path for path, ts in self.pending.items()
+                       if now - ts >= self.debounce and path not in moving)
+        for path in ready:
+            del self.pending[path]
+        selected = set(ready)
+        result = []
+        for path in ready:
+            parent = path
+            while parent:
+                parent = os.path.dirname(parent)
+                if parent in selected:
+                    break
+            else:
+                result.append(path)
+        return result
+
+    def _timeout(self, now):
+        deadlines = []
+        moving = {path for path, _ in self.moves.values()}
+        waiting = [ts for path, ts in self.pending.items() if path not in moving]
+        if waiting:
+            deadlines.append(min(waiting) + self.debounce)
+        if self.moves:
+            deadlines.append(min(ts for _, ts in self.moves.values()) + MOVE_PAIR_TIMEOUT)
+        if self.full_sync_interval:
+            deadlines.append(self._last_full_sync + self.full_sync_interval)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - now)
+
+    def run(self):
+        """运行直到 stop() 或 Ctrl+C"""
+        os.makedirs(self.target_dir, exist_ok=True)
+        self._running = True
+        inotify = Inotify(self.source_dir)  # 先监听再完整同步，期间的变化不会丢失
+        self._state = SyncState(self.state_db)
+        with self._wakeup_lock:
+            self._wakeup = os.pipe()
+        with open(self.log_file, 'a', encoding='utf-8') as self._log, \
+                ThreadPoolExecutor(max_workers=self.workers) as self._executor:
+            try:
+                self.full_sync()
+                print(f"正在监听 {self.source_dir}（{len(inotify.watches)} 个目录）...")
+                while self._running:
+                    readable, _, _ = select.select([inotify.fd, self._wakeup[0]], [], [],
+                                                   self._timeout(time.monotonic()))
+                    now = time.monotonic()
+                    if inotify.fd in readable:
+                        for mask, cookie, path in inotify.read():
+                            self._on_event(mask, cookie, path, now)
+                    if self._wakeup[0] in readable:
+                        os.read(self._wakeup[0], 64)
+
+                    if inotify.overflowed or (self.full_sync_interval and now -
+                                              self._last_full_sync >= self.full_sync_interval):
+                        inotify.overflowed = False
+                        self.pending.clear()
+                        self.moves.clear()
+                        self.renames = []
+                        self.full_sync()
+                        continue
+
+                    self._expire_moves(now)
+                    paths = self._ready_paths(now)
+                    if not paths:
+                        continue
+                    self._apply_renames()
+                    stats = self._sync(paths)
+                    changed = stats['copied'] + stats['updated'] + stats['deleted'] + \
+                        stats['errors']
+                    if changed:
+                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {len(paths)} 个路径："
+                              f"{format_stats(stats)}")
+            except KeyboardInterrupt:
+                pass
+            finally:
+                inotify.close()
+                self._state.close()
+                with self._wakeup_lock:
+                    for fd in self._wakeup:
+                        os.close(fd)
+                    self._wakeup = None
+        print(f"已停止，共同步 {self.batches} 批：{format_stats(self.totals)}")
+        print(f"详细日志请查看: {self.log_file}")
+        return self.totals
+
@@ -1,32 +1,211 @@
 from PIL import Image
 import os
+import argparse
+import hashlib
+import json
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-def compress_images(input_dir, output_dir, quality=70):
+# 各格式的默认编码参数（传给 Image.save）
+FORMAT_SETTINGS = {
+    '.jpg': {'format': 'JPEG', 'quality': 70, 'optimize': True, 'progressive': True},
+    '.jpeg': {'format': 'JPEG', 'quality': 70, 'optimize': True, 'progressive': True},
+    '.png': {'format': 'PNG', 'optimize': True, 'compress_level': 9},
+    '.webp': {'format': 'WEBP', 'quality': 70, 'method': 6},
+}
+
+# 输出目录中记录已处理图片的清单文件，每行一条 JSON
+MANIFEST_NAME = '.compress_manifest.jsonl'
+
+
+def build_settings(quality=70, overrides=None):
+    """生成各格式的编码参数，quality 作用于 JPEG/WEBP，overrides 按扩展名覆盖"""
+    settings = {}
+    for ext, options in FORMAT_SETTINGS.items():
+        options = dict(options)
+        if 'quality' in options:
+            options['quality'] = quality
+        options.update((overrides or {}).get(ext, {}))
+        settings[ext] = options
+    return settings
+
+
+def _settings_key(options):
+    return hashlib.md5(json.dumps(options, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def iter_images(input_dir, extensions, recursive=True):
+    """遍历目录，生成 (相对路径, 绝对路径, os.stat_result)"""
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(input_dir, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(rel_path)
+                elif os.path.splitext(entry.name)[1].lower() in extensions:
+                    yield rel_path, entry.path, entry.stat()
+
+
+def load_manifest(path):
+    """读取清单，后写入的记录覆盖先前的记录"""
+    manifest = {}
+    if not os.path.exists(path):
+        return manifest
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 上次中断时写了一半的行
+            manifest[record['path']] = record
+    return manifest
+
+
+def save_manifest(path, manifest):
+    """压缩清单（去掉被覆盖的旧记录），先写临时文件再替换"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in manifest.values():
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def compress_one(input_path, output_path, options):
+    """压缩单张图片（在子进程中执行），返回压缩后的大小
+
+    编码结果比原图还大时直接复制原图。
+    """
+    options = dict(options)
+    image_format = options.pop('format')
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    try:
+        with Image.open(input_path) as img:
+            if image_format == 'JPEG' and img.mode not in ('RGB', 'L', 'CMYK'):
+                img = img.convert('RGB')
+            img.save(tmp_path, format=image_format, **options)
+        if os.path.getsize(tmp_path) >= os.path.getsize(input_path):
+            shutil.copyfile(input_path, tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(output_path)
+
+
+def compress_images(input_dir, output_dir, quality=70, workers=None, recursive=True,
+                    settings=None, force=False, verbose=False):
     """批量压缩图片文件
-    
+
+    使用进程池并行压缩，按子目录结构输出。输出目录中的清单记录每张图片的
+    (路径, 大小, 修改时间, 编码参数)，再次运行时跳过未变化的图片；中途中断后
+    重新运行会从中断处继续。
+
     Args:
         input_dir: 输入图片文件夹
         output_dir: 压缩后图片保存文件夹
-        quality: 压缩质量(1-100)
+        quality: 压缩质量(1-100)，作用于 JPEG/WEBP
+        workers: 进程数，默认为 CPU 核心数
+        recursive: 是否处理子目录
+        settings: 按扩展名覆盖编码参数，如 {'.png': {'compress_level': 6}}
+        force: 忽略清单，全部重新压缩
+        verbose: 打印每张图片的压缩结果
+
+    Returns:
+        统计信息字典
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-        
-    for filename in os.listdir(input_dir):
-        if filename.endswith(('.png', '.jpg', '.jpeg')):
-            input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, filename)
-            
-            with Image.open(input_path) as img:
-                img.save(output_path, quality=quality, optimize=True)
-            
-            original_size = os.path.getsize(input_path) / 1024  # KB
-            compressed_size = os.path.getsize(output_path) / 1024  # KB
-            
-            print(f'压缩 {filename}:')
-            print(f'原始大小: {original_size:.2f}KB')
-            print(f'压缩后大小: {compressed_size:.2f}KB')
-            print(f'压缩率: {(1 - compressed_size/original_size)*100:.2f}%\n')
-
-# 使用示例
-compress_images('原始图片文件夹', '压缩后文件夹') 
\ No newline at end of file
+    settings = build_settings(quality, settings)
+    keys = {ext: _settings_key(options) for ext, options in settings.items()}
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = {} if force else load_manifest(manifest_path)
+    output_root = os.path.abspath(output_dir)
+
+    stats = {'processed': 0, 'skipped': 0, 'failed': 0,
+             'input_bytes': 0, 'output_bytes': 0}
+    start = time.perf_counter()
+    max_pending = (workers or os.cpu_count() or 1) * 4
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(manifest_path, 'a', encoding='utf-8') as manifest_file:
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                rel_path, record = pending.pop(future)
+                try:
+                    record['output_size'] = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f'压缩 {rel_path} 失败: {str(e)}')
+                    continue
+                stats['processed'] += 1
+                stats['input_bytes'] += record['size']
+                stats['output_bytes'] += record['output_size']
+                manifest[rel_path] = record
+                # 每条记录立即写出：进程被杀后重新运行时，已完成的图片都能跳过
+                manifest_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                manifest_file.flush()
+                if verbose:
+                    print(f"压缩 {rel_path}: {record['size'] / 1024:.2f}KB -> "
+                          f"{record['output_size'] / 1024:.2f}KB")
+
+        for rel_path, input_path, st in iter_images(input_dir, settings, recursive):
+            if os.path.abspath(input_path).startswith(output_root + os.sep):
+                continue  # 输出目录位于输入目录之内
+            ext = os.path.splitext(rel_path)[1].lower()
+            output_path = os.path.join(output_dir, rel_path)
+            record = {'path': rel_path, 'size': st.st_size, 'mtime': st.st_mtime_ns,
+                      'settings': keys[ext]}
+            known = manifest.get(rel_path)
+            if known is not None and all(known.get(k) == record[k]
+                                         for k in ('size', 'mtime', 'settings')) \
+                    and os.path.exists(output_path):
+                stats['skipped'] += 1
+                continue
+
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(compress_one, input_path, output_path, settings[ext])
+            pending[future] = (rel_path, record)
+        collect(wait(pending).done)
+
+    save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    stats['elapsed'] = elapsed
+    saved = stats['input_bytes'] - stats['output_bytes']
+    rate = stats['processed'] / elapsed if elapsed else 0.0
+    throughput = stats['input_bytes'] / (1024**2) / elapsed if elapsed else 0.0
+    print(f"处理 {stats['processed']} 张，跳过 {stats['skipped']} 张，失败 {stats['failed']} 张，"
+          f"用时 {elapsed:.2f}秒")
+    print(f"速度: {rate:.1f} 张/秒，{throughput:.2f} MB/秒")
+    if stats['input_bytes']:
+        print(f"节省: {saved / (1024**2):.2f}MB "
+              f"({saved / stats['input_bytes'] * 100:.2f}%)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量并行压缩图片')
+    parser.add_argument('input_dir', help='输入图片文件夹')
+    parser.add_argument('output_dir', help='压缩后图片保存文件夹')
+    parser.add_argument('-q', '--quality', type=int, default=70, help='JPEG/WEBP 压缩质量(1-100)')
+    parser.add_argument('-j', '--workers', type=int, help='进程数，默认为 CPU 核心数')
+    parser.add_argument('--no-recursive', action='store_true', help='不处理子目录')
+    parser.add_argument('--force', action='store_true', help='忽略清单，全部重新压缩')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每张图片的结果')
+    args = parser.parse_args()
+    compress_images(args.input_dir, args.output_dir, quality=args.quality,
+                    workers=args.workers, recursive=not args.no_recursive,
+                    force=args.force, verbose=args.verbose)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,416 @@
-from PyPDF2 import PdfMerger
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (ArrayObject, DictionaryObject, IndirectObject, NameObject,
+                            NumberObject, StreamObject)
 import os
+import argparse
+import fnmatch
+import glob
+import hashlib
+import io
+import re
+from concurrent.futures import ProcessPoolExecutor
 
-def merge_pdfs(directory, output_filename):
-    """合并指定文件夹中的所有PDF文件"""
-    merger = PdfMerger()
-    
-    for filename in os.listdir(directory):
-        if filename.endswith('.pdf'):
-            merger.append(os.path.join(directory, filename))
-    
-    merger.write(output_filename)
-    merger.close()
-    print(f'PDF文件已合并为: {output_filename}')
-
-# 使用示例
-directory = "PDF文件夹路径"
-merge_pdfs(directory, "合并后的文件.pdf") 
\ No newline at end of file
+# 合并结果中页面树根节点和文档目录的对象编号
+CATALOG_ID = 1
+PAGES_ID = 2
+# 书签项中由合并器重新生成的链接
+OUTLINE_LINKS = ('/Parent', '/Prev', '/Next', '/First', '/Last')
+# 文档目录中会被合并的项，其余项（页码标签、结构树、脚本等）合并后丢弃
+CATALOG_MERGED = ('/Type', '/Pages', '/Outlines', '/Names', '/Dests', '/AcroForm')
+
+
+def natural_key(path):
+    """自然排序键：file2.pdf 排在 file10.pdf 之前"""
+    return [int(part) if part.isdigit() else part.lower()
+            for part in re.split(r'(\d+)', os.path.basename(path))]
+
+
+def collect_inputs(directory=None, pattern=None, manifest=None):
+    """按确定的顺序列出要合并的PDF文件
+
+    Args:
+        directory: 合并文件夹中的全部PDF（自然排序）
+        pattern: glob 模式，如 'scans/**/*.pdf'（自然排序）
+        manifest: 清单文件，每行一个路径（相对清单所在目录），按行序合并，# 开头为注释
+    """
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+        return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+    if pattern:
+        paths = glob.glob(pattern, recursive=True)
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)
+                 if fnmatch.fnmatch(name.lower(), '*.pdf')]
+    return sorted((p for p in paths if os.path.isfile(p)), key=natural_key)
+
+
+def inspect_pdf(path):
+    """检查一个PDF能否读取（在子进程中执行），返回 (路径, 页数, 错误信息)"""
+    try:
+        with open(path, 'rb') as f:
+            reader = PdfReader(f)
+            if reader.is_encrypted and not reader.decrypt(''):
+                return path, 0, '文件已加密'
+            return path, len(reader.pages), None
+    except Exception as e:
+        return path, 0, str(e) or e.__class__.__name__
+
+
+class StreamingPdfWriter:
+    """逐页写出的PDF合并器
+
+    每复制一页，就把该页及其引用的对象（内容流、字体、图片等）立即写入输出文件，
+    内存中只保留对象偏移表和去重用的摘要，峰值内存与单页大小相关，与输入总大小无关。
+    对象按内容（引用已重新编号后）做摘要，不同文件中完全相同的字体、图片只写一份。
+    书签、命名目标和表单域随页面一起复制，其中的页面引用指向合并后的页面；
+    无法合并的目录项记录在 dropped 中。
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+        self._offsets = [None, None, None]  # 0 号对象保留，1/2 为目录和页面树
+        self._kids = []
+        self._digests = {}
+        self._outline_root = None
+        self._outline_first = None
+        self._outline_last = None  # 尚未写出的最后一个顶层书签 (编号, 书签)
+        self._outline_count = 0
+        self._dests = {}  # (是否为名称对象, 名称) -> (名称, 目标)
+        self._fields = []
+        self._form = {}
+        self._field_names = set()
+        self.deduplicated = 0
+        self.dropped = set()
+        self.conflicts = 0
+
+    def _allocate(self):
+        self._offsets.append(None)
+        return len(self._offsets) - 1
+
+    def _write(self, number, data):
+        self._offsets[number] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % number)
+        self._file.write(data)
+        self._file.write(b'\nendobj\n')
+
+    @staticmethod
+    def _serialize(obj):
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    def _copy(self, obj, mapping, visiting):
+        """复制一个直接对象，其中的间接引用换成输出文件中的编号"""
+        if isinstance(obj, IndirectObject):
+            return IndirectObject(self._reference(obj, mapping, visiting), 0, None)
+        if isinstance(obj, DictionaryObject):
+            copied = obj.__class__()
+            if isinstance(obj, StreamObject):
+                copied._data = obj._data
+            page = obj.get('/Type') in ('/Page', '/Pages')
+            for key, value in obj.items():
+                if key == '/Parent' and page:
+                    continue  # 页面树另行生成，不沿父节点回溯
+                copied[key] = self._copy(value, mapping, visiting)
+            return copied
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value, mapping, visiting) for value in obj)
+        return obj
+
+    def _reference(self, ref, mapping, visiting):
+        """写出被引用的对象（先写它引用的对象），返回其在输出文件中的编号"""
+        key = (ref.idnum, ref.generation)
+        number = mapping.get(key)
+        if number is not None:
+            return number
+        if key in visiting:
+            # 循环引用：先占一个编号，写出时不做去重
+            number = mapping[key] = self._allocate()
+            return number
+        visiting.add(key)
+        copied = self._copy(ref.get_object(), mapping, visiting)
+        visiting.discard(key)
+
+        data = self._serialize(copied)
+        number = mapping.get(key)
+        if number is not None:
+            self._write(number, data)
+            return number
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        number = self._digests.get(digest)
+        if number is None:
+            number = self._digests[digest] = self._allocate()
+            self._write(number, data)
+        else:
+            self.deduplicated += 1
+        mapping[key] = number
+        return number
+
+    def append(self, path):
+        """追加一个PDF的全部页面，返回页数"""
+        with open(path, 'rb') as f:
+            # 传入文件对象而不是路径，PdfReader 才会按需读取而不是整个读入内存
+            reader = PdfReader(f)
+            if reader.is_encrypted:
+                reader.decrypt('')
+            pages = reader.pages
+            mapping = {}
+            # 先为所有页面分配编号，链接注释等对页面的引用直接指向新页面
+            numbers = []
+            for page in pages:
+                ref = page.indirect_reference
+                number = self._allocate()
+                numbers.append(number)
+                if ref is not None:
+                    mapping[(ref.idnum, ref.generation)] = number
+
+            for page, number in zip(pages, numbers):
+                copied = self._copy(page, mapping, set())
+                copied[NameObject('/Parent')] = IndirectObject(PAGES_ID, 0, None)
+                self._write(number, self._serialize(copied))
+                self._kids.append(number)
+                # 已写出的对象不再需要，清空读取缓存以限制内存
+                reader.resolved_objects.clear()
+            self._append_catalog(reader.trailer['/Root'], mapping)
+        return len(numbers)
+
+    def _append_catalog(self, root, mapping):
+        """复制文档目录中的书签、命名目标和表单域"""
+        outlines = root.get('/Outlines')
+        if outlines is not None:
+            if self._outline_root is None:
+                self._outline_root = self._allocate()
+            prev = self._outline_last[0] if self._outline_last else None
+            items = self._copy_outlines(outlines.get_object().get('/First'),
+                                        self._outline_root, mapping, prev)
+            if items:
+                if self._outline_last:
+                    self._write_outline(self._outline_last, items[0][0])
+                else:
+                    self._outline_first = items[0][0]
+                # 最后一个顶层书签的 /Next 要等下一个文件才知道，延后写出
+                self._outline_last = items[-1]
+
+        names = root.get('/Names')
+        dests = []
+        if names is not None:
+            names = names.get_object()
+            if '/Dests' in names:
+                dests.extend(self._name_tree(names['/Dests']))
+            if any(key != '/Dests' for key in names):
+                self.dropped.add('/Names')
+        if '/Dests' in root:
+            dests.extend(root['/Dests'].get_object().items())
+        for name, dest in dests:
+            key = (isinstance(name, NameObject), str(name))
+            if key in self._dests:
+                self.conflicts += 1  # 同名的目标只保留第一个文件中的
+                continue
+            self._dests[key] = (name, self._copy(dest, mapping, set()))
+
+        form = root.get('/AcroForm')
+        if form is not None:
+            form = form.get_object()
+            for field in form.get('/Fields', ()):
+                name = field.get_object().get('/T')
+                if name is not None:
+                    if str(name) in self._field_names:
+                        self.conflicts += 1  # 同名的表单域在合并后共用一个值
+                    self._field_names.add(str(name))
+                self._fields.append(self._copy(field, mapping, set()))
+            for key, value in form.items():
+                if key != '/Fields' and key not in self._form:
+                    self._form[key] = self._copy(value, mapping, set())
+
+        self.dropped.update(key for key in root if key not in CATALOG_MERGED)
+
+    @staticmethod
+    def _name_tree(node):
+        """遍历名称树，依次返回 (名称, 值)"""
+        stack = [node]
+        while stack:
+            node = stack.pop().get_object()
+            names = node.get('/Names', ())
+            for i in range(0, len(names) - 1, 2):
+                yield names[i].get_object(), names[i + 1]
+            stack.extend(reversed(node.get('/Kids', ())))
+
+    def _copy_outlines(self, first, parent, mapping, prev=None):
+        """复制一串同级书签（沿 /Next）及其子书签
+
+        除最后一项外都已写出，返回 [(编号, 书签), ...]；prev 为前一个同级书签的编号。
+        """
+        refs = []
+        seen = set()
+        while isinstance(first, IndirectObject) and (first.idnum, first.generation) not in seen:
+            seen.add((first.idnum, first.generation))
+            refs.append(first)
+            first = first.get_object().get('/Next')
+
+        items = [(self._allocate(), ref.get_object()) for ref in refs]
+        copied_items = []
+        for i, (number, item) in enumerate(items):
+            copied = DictionaryObject()
+            for key, value in item.items():
+                if key not in OUTLINE_LINKS and key != '/SE':
+                    copied[NameObject(key)] = self._copy(value, mapping, set())
+            copied[NameObject('/Parent')] = IndirectObject(parent, 0, None)
+            before = items[i - 1][0] if i else prev
+            if before is not None:
+                copied[NameObject('/Prev')] = IndirectObject(before, 0, None)
+            children = self._copy_outlines(item.get('/First'), number, mapping)
+            if children:
+                copied[NameObject('/First')] = IndirectObject(children[0][0], 0, None)
+                copied[NameObject('/Last')] = IndirectObject(children[-1][0], 0, None)
+                self._write_outline(children[-1])
+            if parent == self._outline_root:
+                self._outline_count += 1 + max(0, copied.get('/Count', 0))
+            if i:
+                self._write_outline(copied_items[-1], number)
+            copied_items.append((number, copied))
+        return copied_items
+
+    def _write_outline(self, item, next_number=None):
+        number, copied = item
+        if next_number is not None:
+            copied[NameObject('/Next')] = IndirectObject(next_number, 0, None)
+        self._write(number, self._serialize(copied))
+
+    def _add(self, obj):
+        """写出一个新对象，返回对它的引用"""
+        number = self._allocate()
+        self._write(number, self._serialize(obj))
+        return IndirectObject(number, 0, None)
+
+    def close(self):
+        """写出页面树、目录和交叉引用表"""
+        pages = DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(n, 0, None) for n in self._kids),
+            NameObject('/Count'): NumberObject(len(self._kids)),
+        })
+        self._write(PAGES_ID, self._serialize(pages))
+        catalog = DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(PAGES_ID, 0, None),
+        })
+        if self._outline_last:
+            self._write_outline(self._outline_last)
+            outlines = DictionaryObject({
+                NameObject('/Type'): NameObject('/Outlines'),
+                NameObject('/First'): IndirectObject(self._outline_first, 0, None),
+                NameObject('/Last'): IndirectObject(self._outline_last[0], 0, None),
+                NameObject('/Count'): NumberObject(self._outline_count),
+            })
+            self._write(self._outline_root, self._serialize(outlines))
+            catalog[NameObject('/Outlines')] = IndirectObject(self._outline_root, 0, None)
+        elif self._outline_root is not None:
+            self._write(self._outline_root, self._serialize(DictionaryObject()))
+        if self._dests:
+            # 名称树中的名称按字节序排列；旧式的 /Dests 字典以名称对象为键
+            tree = ArrayObject()
+            old = DictionaryObject()
+            for (is_name, key), (name, dest) in sorted(self._dests.items()):
+                if is_name:
+                    old[name] = dest
+                else:
+                    tree.extend((name, dest))
+            if tree:
+                catalog[NameObject('/Names')] = self._add(DictionaryObject({
+                    NameObject('/Dests'): self._add(DictionaryObject({
+                        NameObject('/Names'): tree})),
+                }))
+            if old:
+                catalog[NameObject('/Dests')] = self._add(old)
+        if self._fields:
+            form = DictionaryObject(self._form)
+            form[NameObject('/Fields')] = ArrayObject(self._fields)
+            catalog[NameObject('/AcroForm')] = self._add(form)
+        self._write(CATALOG_ID, self._serialize(catalog))
+
+        xref = self._file.tell()
+        self._file.write(b'xref\n0 %d\n' % len(self._offsets))
+        self._file.write(b'0000000000 65535 f \n')
+        for offset in self._offsets[1:]:
+            if offset is None:  # 被去重复用后未写出的编号
+                self._file.write(b'0000000000 65535 f \n')
+            else:
+                self._file.write(b'%010d 00000 n \n' % offset)
+        self._file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                         % (len(self._offsets), CATALOG_ID, xref))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def merge_pdfs(directory, output_filename, pattern=None, manifest=None, workers=None,
+               skip_invalid=False):
+    """合并PDF文件
+
+    输入按自然排序（或 glob 模式、清单文件的顺序）确定；先用进程池并行检查
+    所有输入，再逐页流式写入输出文件。
+
+    Args:
+        directory: PDF文件夹路径
+        output_filename: 合并后的文件
+        pattern: glob 模式，设置后代替 directory
+        manifest: 清单文件，设置后按清单顺序合并
+        workers: 并行检查的进程数，默认为 CPU 核心数
+        skip_invalid: 跳过无法读取的文件，否则遇到时不进行合并
+    """
+    paths = collect_inputs(directory, pattern, manifest)
+    output_path = os.path.abspath(output_filename)
+    paths = [p for p in paths if os.path.abspath(p) != output_path]
+    if not paths:
+        print('没有找到PDF文件')
+        return 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(inspect_pdf, paths, chunksize=8))
+    invalid = [(path, error) for path, _, error in results if error]
+    for path, error in invalid:
+        print(f'无法读取 {path}: {error}')
+    if invalid and not skip_invalid:
+        print('存在无法读取的文件，未进行合并')
+        return 0
+
+    total = 0
+    with StreamingPdfWriter(output_filename) as writer:
+        for path, _, error in results:
+            if not error:
+                total += writer.append(path)
+    print(f'PDF文件已合并为: {output_filename}（{len(results) - len(invalid)} 个文件，'
+          f'{total} 页，去重 {writer.deduplicated} 个对象）')
+    if writer.conflicts:
+        print(f'警告: {writer.conflicts} 个命名目标或表单域重名（目标只保留第一个，表单域会共用一个值）')
+    if writer.dropped:
+        print(f"警告: 合并结果中未保留以下文档级内容: {', '.join(sorted(writer.dropped))}")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按顺序合并PDF文件')
+    parser.add_argument('output', help='合并后的文件')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('-d', '--directory', help='合并文件夹中的全部PDF（自然排序）')
+    source.add_argument('-g', '--glob', help="glob 模式，如 'scans/**/*.pdf'")
+    source.add_argument('-m', '--manifest', help='清单文件，每行一个路径')
+    parser.add_argument('-j', '--workers', type=int, help='并行检查的进程数')
+    parser.add_argument('--skip-invalid', action='store_true', help='跳过无法读取的文件')
+    args = parser.parse_args()
+    merge_pdfs(args.directory, args.output, pattern=args.glob, manifest=args.manifest,
+               workers=args.workers, skip_invalid=args.skip_invalid)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+"""上报时增量评估的告警规则
+
+规则为一行文本::
+
+    memory.memory_percent > 90 for 5m      # 连续 5 分钟超过阈值
+    disk.*.percent >= 95                   # 任一挂载点，* 匹配任意字符
+    avg(cpu.cpu_percent) > 80 over 10m     # 10 分钟滑动窗口的平均值
+    host offline > 3m                      # 超过 3 分钟未上报
+
+每条规则对每台主机、每个匹配的指标维护一个状态机（正常 → 待定 → 告警 → 恢复），
+窗口聚合用滑动窗口增量计算，不回扫历史数据。状态变化交给 AlertDispatcher
+攒批、去重后发送给各通知器。
+"""
+import collections
+import fnmatch
+import operator
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+from probe_index import ClientIndex
+
+OPERATORS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt,
+    '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+}
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+FIRING = 'firing'
+RESOLVED = 'resolved'
+
+_RULE_RE = re.compile(
+    r'^(?:(?P<func>avg|min|max)\((?P<agg_metric>[^()\s]+)\)|(?P<metric>\S+))\s*'
+    r'(?P<op>>=|<=|==|!=|>|<)\s*(?P<threshold>-?\d+(?:\.\d+)?)'
+    r'(?:\s+(?P<mode>for|over)\s+(?P<duration>\d+[smhd]?))?$')
+_OFFLINE_RE = re.compile(r'^host\s+offline\s*>\s*(?P<duration>\d+[smhd]?)$')
+
+
+def parse_duration(text):
+    """解析 30s、5m、1h、2d 形式的时长，纯数字按秒计"""
+    if text[-1] in UNITS:
+        return int(text[:-1]) * UNITS[text[-1]]
+    return int(text)
+
+
+class Rule:
+    """一条告警规则，见模块说明中的语法"""
+
+    def __init__(self, expr, name=None, severity='warning'):
+        self.expr = expr.strip()
+        self.name = name or self.expr
+        self.severity = severity
+        self.offline = False
+        self.func = None
+        self.duration = 0
+        self.window = 0
+
+        match = _OFFLINE_RE.match(self.expr)
+        if match:
+            self.offline = True
+            self.metric = 'offline'
+            self.op = '>'
+            self.threshold = parse_duration(match.group('duration'))
+            return
+
+        match = _RULE_RE.match(self.expr)
+        if not match:
+            raise ValueError(f"无法解析告警规则: {expr}")
+        self.func = match.group('func')
+        self.metric = match.group('agg_metric') or match.group('metric')
+        self.op = match.group('op')
+        self.threshold = float(match.group('threshold'))
+        mode, duration = match.group('mode'), match.group('duration')
+        if self.func and mode != 'over':
+            raise ValueError(f"聚合规则需要 over 时间窗口: {expr}")
+        if mode == 'over' and not self.func:
+            raise ValueError(f"over 只能用于 avg/min/max: {expr}")
+        if mode == 'for':
+            self.duration = parse_duration(duration)
+        elif mode == 'over':
+            self.window = parse_duration(duration)
+
+        self._compare = OPERATORS[self.op]
+        self._pattern = re.compile(fnmatch.translate(self.metric)) if '*' in self.metric else None
+        self._matches = {}  # 指标名 -> 是否匹配，避免每次上报重复做正则匹配
+
+    def metrics(self, values):
+        """返回本次上报中与规则匹配的指标名"""
+        if self._pattern is None:
+            return (self.metric,) if self.metric in values else ()
+        matched = []
+        for name in values:
+            hit = self._matches.get(name)
+            if hit is None:
+                hit = self._matches[name] = self._pattern.match(name) is not None
+            if hit:
+                matched.append(name)
+        return matched
+
+    def check(self, value):
+        return self._compare(value, self.threshold)
+
+
+class RollingWindow:
+    """时间窗口内的 avg/min/max，每个样本均摊 O(1)"""
+
+    __slots__ = ('span', 'func', 'samples', 'total', 'extremes', 'start')
+
+    def __init__(self, span, func):
+        self.span = span
+        self.func = func
+        self.samples = collections.deque()  # (ts, value)
+        self.total = 0.0
+        self.extremes = collections.deque()  # 单调队列，队首为当前最值
+        self.start = None
+
+    def add(self, ts, value):
+        if self.start is None:
+            self.start = ts
+        self.samples.append((ts, value))
+        self.total += value
+        extremes = self.extremes
+        if self.func == 'max':
+            while extremes and extremes[-1][1] <= value:
+                extremes.pop()
+        elif self.func == 'min':
+            while extremes and extremes[-1][1] >= value:
+                extremes.pop()
+        extremes.append((ts, value))
+
+        cutoff = ts - self.span
+        samples = self.samples
+        while samples[0][0] < cutoff:
+            self.total -= samples.popleft()[1]
+        while extremes[0][0] < cutoff:
+            extremes.popleft()
+
+    def full(self, ts):
+        """窗口是否已经覆盖完整的时长"""
+        return self.start is not None and ts - self.start >= self.span
+
+    def value(self):
+        if self.func == 'avg':
+            return self.total / len(self.samples)
+        return self.extremes[0][1]
+
+
+class _State:
+    __slots__ = ('firing', 'since', 'value', 'window')
+
+    def __init__(self):
+        self.firing = False
+        self.since = None  # 条件开始成立的时间
+        self.value = None
+        self.window = None
+
+
+class AlertEngine:
+    """在每次上报时增量评估全部规则
+
+    ``observe`` 由上报线程调用，``check_offline`` 由后台线程定期调用；
+    产生的告警/恢复事件交给 ``dispatcher.submit``。
+    """
+
+    def __init__(self, rules, dispatcher=None, check_interval=10):
+        self.rules = [rule if isinstance(rule, Rule) else Rule(rule) for rule in rules]
+        self.dispatcher = dispatcher
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self._states = {}  # (规则名, ip, 指标名) -> _State
+        self._hostnames = {}
+        # 每条离线规则各用一个 ClientIndex 跟踪上线/离线转换
+        self._offline = [(rule, ClientIndex(offline_after=rule.threshold))
+                         for rule in self.rules if rule.offline]
+        self._thread = None
+
+    def start(self):
+        with self.lock:
+            if self._thread is None and self._offline:
+                self._thread = threading.Thread(target=self._run, name='alert-offline',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.check_interval)
+            try:
+                self.check_offline()
+            except Exception as e:
+                print(f"检查离线告警失败: {str(e)}")
+
+    def observe(self, ip, hostname, values, ts):
+        """评估一次上报（values 为 probe_store.flatten_metrics 的结果）"""
+        events = []
+        with self.lock:
+            self._hostnames[ip] = hostname
+            for rule in self.rules:
+                if rule.offline:
+                    continue
+                for name in rule.metrics(values):
+                    self._evaluate(rule, ip, name, values[name], ts, events)
+        for rule, index in self._offline:
+            for back in index.update(ip, None, None, ts):
+                events.extend(self._transition(rule, back, rule.metric, False, None, ts))
+        if self._offline and self._thread is None:
+            self.start()
+        self._emit(events)
+
+    def _evaluate(self, rule, ip, name, value, ts, events):
+        key = (rule.name, ip, name)
+        state = self._states.get(key)
+        if rule.func:
+            if state is None:
+                state = self._states[key] = _State()
+                state.window = RollingWindow(rule.window, rule.func)
+            state.window.add(ts, value)
+            if not state.window.full(ts):
+                return
+            value = state.window.value()
+
+        if rule.check(value):
+            if state is None:
+                state = self._states[key] = _State()
+            if state.since is None:
+                state.since = ts
+            state.value = value
+            if not state.firing and ts - state.since >= rule.duration:
+                state.firing = True
+                events.append(self._event(rule, ip, name, FIRING, value, state.since, ts))
+        elif state is not None:
+            state.since = None
+            if state.firing:
+                state.firing = False
+                events.append(self._event(rule, ip, name, RESOLVED, value, None, ts))
+            if state.window is None:
+                del self._states[key]  # 正常状态不保留
+
+    def check_offline(self, now=None):
+        """检查离线规则，返回本次产生的事件"""
+        now = time.time() if now is None else now
+        events = []
+        for rule, index in self._offline:
+            for ip in index.sweep(now):
+                events.extend(self._transition(rule, ip, rule.metric, True, now, now))
+        self._emit(events)
+        return events
+
+    def _transition(self, rule, ip, name, firing, since, ts):
+        with self.lock:
+            key = (rule.name, ip, name)
+            state = self._states.get(key)
+            if firing:
+                if state is None:
+                    state = self._states[key] = _State()
+                if state.firing:
+                    return []
+                state.firing = True
+                state.since = since
+                return [self._event(rule, ip, name, FIRING, None, since, ts)]
+            if state is None or not state.firing:
+                return []
+            del self._states[key]
+            return [self._event(rule, ip, name, RESOLVED, None, None, ts)]
+
+    def _event(self, rule, ip, name, status, value, since, ts):
+        return {
+            'rule': rule.name,
+            'severity': rule.severity,
+            'status': status,
+            'ip': ip,
+            'hostname': self._hostnames.get(ip),
+            'metric': name,
+            'value': value,
+            'threshold': rule.threshold,
+            'since': since,
+            'time': ts,
+        }
+
+    def _emit(self, events):
+        if events and self.dispatcher is not None:
+            for event in events:
+                self.dispatcher.submit(event)
+
+    def active(self):
+        """返回当前处于告警状态的 (规则名, ip, 指标名, 开始时间) 列表"""
+        with self.lock:
+            return [key + (state.since,) for key, state in self._states.items()
+                    if state.firing]
+
+
+def format_event(event):
+    """把告警事件格式化为一行文本"""
+    when = datetime.fromtimestamp(event['time']).strftime('%Y-%m-%d %H:%M:%S')
+    host = event['hostname'] or event['ip']
+    status = '告警' if event['status'] == FIRING else '恢复'
+    value = '' if event['value'] is None else f"，当前值 {event['value']:.2f}"
+    return f"[{when}] {status} {host}({event['ip']}) {event['rule']}: {event['metric']}{value}"
+
+
+class PrintNotifier:
+    """把告警打印到标准输出"""
+
+    def notify(self, events):
+        for event in events:
+            print(format_event(event))
+
+
+class EmailNotifier:
+    """把一批告警合并为一封邮件发送（复用 website_monitor.send_email）"""
+
+    def __init__(self, email_config, subject='系统探针告警'):
+        self.email_config = email_config
+        self.subject = subject
+
+    def notify(self, events):
+        from website_monitor import send_email
+
+        firing = sum(1 for event in events if event['status'] == FIRING)
+        subject = f"{self.subject}：{firing} 条告警，{len(events) - firing} 条恢复"
+        send_email(self.email_config, subject, '\n'.join(format_event(e) for e in events))
+
+
+class AlertDispatcher:
+    """攒批并去重后把告警事件发送给通知器
+
+    同一 (规则, 主机, 指标) 在一个批次内只保留最后一次状态；与上次已通知的状态
+    相同时不再发送，因此批次内先告警又恢复的抖动不会产生通知。通知器是任何
+    带有 ``notify(events)`` 方法的对象。
+    """
+
+    def __init__(self, notifiers, batch_interval=30, max_queue=10000):
+        self.notifiers = list(notifiers)
+        self.batch_interval = batch_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._notified = {}  # 键 -> 上次通知的状态
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.sent = 0
+        self.suppressed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='alert-dispatcher',
+                                                daemon=True)
+                self._thread.start()
+
+    def submit(self, event):
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.batch_interval)
+            self.flush()
+
+    def flush(self):
+        """发送队列中积压的事件"""
+        latest = {}
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            latest[(event['rule'], event['ip'], event['metric'])] = event
+
+        batch = []
+        for key, event in latest.items():
+            if self._notified.get(key, RESOLVED) == event['status']:
+                self.suppressed += 1
+                continue
+            if event['status'] == RESOLVED:
+                del self._notified[key]
+            else:
+                self._notified[key] = event['status']
+            batch.append(event)
+        if not batch:
+            return
+
+        batch.sort(key=lambda event: event['time'])
+        for notifier in self.notifiers:
+            try:
+                notifier.notify(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"发送告警通知失败: {str(e)}")
+        self.sent += len(batch)
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'suppressed': self.suppressed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'pending': self._queue.qsize(),
+        }
+
+
+def load_rules(path):
+    """从文件读取规则，每行一条，# 开头为注释"""
+    rules = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                rules.append(Rule(line))
+    return rules
@@ -0,0 +1,378 @@
+"""探针历史数据归档格式
+
+段文件（``*.seg``）只追加写入，由若干压缩块组成::
+
+    块头  struct '>4sBBIII'  魔数 b'PBLK'、压缩方式、编码方式、记录数、原始长度、压缩后长度
+    块体  压缩后的记录序列
+
+每条记录为 ``struct '>dH'``（时间戳、IP长度）+ IP + ``struct '>I'``（正文长度）+ 正文，
+正文使用 msgpack（已安装时）或紧凑 JSON 编码。
+
+旁路索引（``*.seg.idx``）每行一个 JSON，记录块的偏移、长度、时间范围以及块内
+各 IP 的时间范围，读取时只需解压命中的块。块先于索引行写入，打开时用 check_index
+核对两者：崩溃后尚未写入索引的完整块补建索引，写了一半的块和索引行被丢弃。
+"""
+import argparse
+import bisect
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_MAGIC = b'PBLK'
+BLOCK_HEADER = struct.Struct('>4sBBIII')
+RECORD_HEADER = struct.Struct('>dH')
+BODY_LENGTH = struct.Struct('>I')
+
+CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD = 0, 1, 2
+ENCODING_JSON, ENCODING_MSGPACK = 0, 1
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _default_codec():
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def _compress(codec, raw):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(raw, 6)
+    return raw
+
+
+def _decompress(codec, payload, raw_len):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError('读取该归档需要安装 zstandard')
+        return zstandard.ZstdDecompressor().decompress(payload, max_output_size=raw_len)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    return payload
+
+
+def _encode(encoding, record):
+    if encoding == ENCODING_MSGPACK:
+        return msgpack.packb(record, use_bin_type=True)
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _decode(encoding, body):
+    if encoding == ENCODING_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError('读取该归档需要安装 msgpack')
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body.decode('utf-8'))
+
+
+def _records(raw, count):
+    """依次返回块内的 (时间戳, IP, 正文)"""
+    pos = 0
+    for _ in range(count):
+        ts, ip_len = RECORD_HEADER.unpack_from(raw, pos)
+        pos += RECORD_HEADER.size
+        ip = raw[pos:pos + ip_len].decode('utf-8')
+        pos += ip_len
+        (body_len,) = BODY_LENGTH.unpack_from(raw, pos)
+        pos += BODY_LENGTH.size
+        yield ts, ip, raw[pos:pos + body_len]
+        pos += body_len
+
+
+def _index_entry(offset, length, count, ips):
+    return {
+        'offset': offset,
+        'length': length,
+        'count': count,
+        'start': min(span[0] for span in ips.values()),
+        'end': max(span[1] for span in ips.values()),
+        'ips': ips,
+    }
+
+
+def _read_block(f, offset):
+    """读取 offset 处的块并生成索引项，块不完整或已损坏时返回 None"""
+    f.seek(offset)
+    header = f.read(BLOCK_HEADER.size)
+    if len(header) < BLOCK_HEADER.size:
+        return None
+    magic, codec, _, count, raw_len, comp_len = BLOCK_HEADER.unpack(header)
+    payload = f.read(comp_len)
+    if magic != BLOCK_MAGIC or len(payload) < comp_len or not count:
+        return None
+    try:
+        raw = _decompress(codec, payload, raw_len)
+        ips = {}
+        for ts, ip, _ in _records(raw, count):
+            span = ips.setdefault(ip, [ts, ts])
+            span[0] = min(span[0], ts)
+            span[1] = max(span[1], ts)
+    except RuntimeError:
+        raise  # 缺少解压库
+    except Exception:
+        return None
+    return _index_entry(offset, BLOCK_HEADER.size + comp_len, count, ips)
+
+
+def check_index(path, index_path=None):
+    """核对段文件与索引，返回 (索引项列表, 段文件有效长度, 索引是否需要重写)
+
+    未写完的索引行和超出段文件的索引项被丢弃；最后一个索引项之后的完整块
+    补建索引（索引缺失时即全部重建）；之后剩余的字节是写了一半的块，不计入有效长度。
+    """
+    index_path = index_path or path + '.idx'
+    blocks = []
+    dirty = False
+    if os.path.exists(index_path):
+        with open(index_path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        if lines[-1]:
+            dirty = True  # 最后一行没有换行符，没有写完
+        for line in lines[:-1]:
+            try:
+                blocks.append(json.loads(line))
+            except ValueError:
+                dirty = True
+                break
+    elif os.path.exists(path):
+        dirty = True
+
+    if not os.path.exists(path):
+        return [], 0, dirty or bool(blocks)
+    valid = []
+    end = 0
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        for block in blocks:
+            length = block.get('length')
+            if length is None or block.get('offset') != end or end + length > size:
+                dirty = True
+                break
+            valid.append(block)
+            end += length
+        while end < size:
+            block = _read_block(f, end)
+            if block is None:
+                break
+            valid.append(block)
+            end += block['length']
+            dirty = True
+    return valid, end, dirty
+
+
+def record_timestamp(record, default=None):
+    """从上报数据的 timestamp 字段解析出时间戳"""
+    try:
+        return datetime.strptime(record['timestamp'], TIMESTAMP_FORMAT).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time() if default is None else default
+
+
+class ArchiveWriter:
+    """段文件追加写入器，每调用一次 flush() 写出一个压缩块
+
+    打开已有的段文件时先用 check_index 核对：截掉末尾写了一半的块，
+    并为缺少索引的完整块补写索引。
+    """
+
+    def __init__(self, path, block_records=1000, codec=None):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.block_records = block_records
+        self.codec = _default_codec() if codec is None else codec
+        self.encoding = ENCODING_MSGPACK if msgpack is not None else ENCODING_JSON
+        self._recover()
+        self._file = open(path, 'ab')
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+        self._pending = []
+        self._ips = {}
+
+    def _recover(self):
+        blocks, end, dirty = check_index(self.path, self.index_path)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > end:
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        if dirty:
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for block in blocks:
+                    f.write(json.dumps(block, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.index_path)
+
+    def append(self, record, ts=None):
+        """追加一条上报数据，ts 缺省时取数据中的 timestamp"""
+        if ts is None:
+            ts = record_timestamp(record)
+        ip = record.get('ip', '')
+        ip_bytes = ip.encode('utf-8')
+        body = _encode(self.encoding, record)
+        self._pending.append(RECORD_HEADER.pack(ts, len(ip_bytes)) + ip_bytes +
+                             BODY_LENGTH.pack(len(body)) + body)
+        span = self._ips.get(ip)
+        if span is None:
+            self._ips[ip] = [ts, ts]
+        else:
+            span[0] = min(span[0], ts)
+            span[1] = max(span[1], ts)
+        if len(self._pending) >= self.block_records:
+            self.flush()
+
+    def flush(self):
+        """把缓存的记录压缩为一个块写入文件，并追加索引"""
+        if not self._pending:
+            return
+        raw = b''.join(self._pending)
+        payload = _compress(self.codec, raw)
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, self.codec, self.encoding,
+                                           len(self._pending), len(raw), len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+
+        entry = _index_entry(offset, BLOCK_HEADER.size + len(payload), len(self._pending),
+                             self._ips)
+        self._index.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._index.flush()
+
+        self._pending = []
+        self._ips = {}
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+    """段文件读取器，按 IP 和时间范围定位到块后再解压"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        # 只在内存中补齐索引，不修改文件（写入器可能正在追加）
+        self.blocks = check_index(path, self.index_path)[0]
+        self._starts = [block['start'] for block in self.blocks]
+        # 块按写入顺序排列，起始时间通常递增，此时 at() 可以二分查找
+        self._sorted = all(a <= b for a, b in zip(self._starts, self._starts[1:]))
+        self._max_end = []  # 前 i+1 个块中最大的结束时间
+        for block in self.blocks:
+            self._max_end.append(max(block['end'], self._max_end[-1]) if self._max_end
+                                 else block['end'])
+
+    def _match(self, block, ip, start, end):
+        if ip is not None and 'ips' in block:
+            span = block['ips'].get(ip)
+            if span is None:
+                return False
+            lo, hi = span
+        else:
+            lo, hi = block.get('start'), block.get('end')
+        if lo is None:
+            return True
+        return (start is None or hi >= start) and (end is None or lo <= end)
+
+    def query(self, ip=None, start=None, end=None):
+        """按时间顺序迭代 (时间戳, 数据)，可按 IP 和 [start, end] 过滤"""
+        with open(self.path, 'rb') as f:
+            for block in self.blocks:
+                if self._match(block, ip, start, end):
+                    yield from self._scan(f, block, ip, start, end)
+
+    @staticmethod
+    def _scan(f, block, ip, start, end):
+        f.seek(block['offset'])
+        _, codec, encoding, count, raw_len, comp_len = BLOCK_HEADER.unpack(
+            f.read(BLOCK_HEADER.size))
+        raw = _decompress(codec, f.read(comp_len), raw_len)
+        for ts, record_ip, body in _records(raw, count):
+            if ip is not None and record_ip != ip:
+                continue
+            if (start is not None and ts < start) or (end is not None and ts > end):
+                continue
+            yield ts, _decode(encoding, body)
+
+    def at(self, ip, ts):
+        """返回 ip 在 ts 时刻或之前最近的一条数据
+
+        二分查找最后一个起始时间不晚于 ts 的块，从它开始向前只解压包含该 IP 的块；
+        找到的记录不早于之前所有块的结束时间时即可停止，通常只需解压一两个块。
+        """
+        i = bisect.bisect_right(self._starts, ts) if self._sorted else len(self.blocks)
+        latest = None
+        with open(self.path, 'rb') as f:
+            for k in range(i - 1, -1, -1):
+                if latest is not None and self._max_end[k] <= latest[0]:
+                    break
+                block = self.blocks[k]
+                if not self._match(block, ip, None, ts):
+                    continue
+                for record_ts, record in self._scan(f, block, ip, None, ts):
+                    if latest is None or record_ts >= latest[0]:
+                        latest = (record_ts, record)
+        return latest[1] if latest else None
+
+
+def convert_jsonl(src, dst=None, block_records=1000):
+    """将 JSONL 日志（logs/probe_*.json）转换为段文件，返回记录数"""
+    if dst is None:
+        dst = os.path.splitext(src)[0] + '.seg'
+    count = 0
+    with open(src, encoding='utf-8') as f, ArchiveWriter(dst, block_records) as writer:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            writer.append(json.loads(line))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='探针日志归档工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    convert = sub.add_parser('convert', help='把 JSONL 日志转换为段文件')
+    convert.add_argument('files', nargs='+')
+    convert.add_argument('--block-records', type=int, default=1000)
+
+    query = sub.add_parser('query', help='按 IP 和时间范围查询段文件')
+    query.add_argument('file')
+    query.add_argument('--ip')
+    query.add_argument('--start', help='起始时间 YYYY-mm-dd HH:MM:SS')
+    query.add_argument('--end', help='结束时间 YYYY-mm-dd HH:MM:SS')
+
+    args = parser.parse_args()
+    if args.command == 'convert':
+        for src in args.files:
+            count = convert_jsonl(src, block_records=args.block_records)
+            src_size = os.path.getsize(src)
+            dst_size = os.path.getsize(os.path.splitext(src)[0] + '.seg')
+            print(f"{src}: {count} 条记录, {src_size / 1024:.1f}KB -> {dst_size / 1024:.1f}KB")
+    else:
+        start = datetime.strptime(args.start, TIMESTAMP_FORMAT).timestamp() if args.start else None
+        end = datetime.strptime(args.end, TIMESTAMP_FORMAT).timestamp() if args.end else None
+        for _, record in ArchiveReader(args.file).query(args.ip, start, end):
+            print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,268 @@
-import psutil
 import time
 import json
+import gzip
+import os
+from collections import deque
 from datetime import datetime
 import socket
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import platform
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from probe_ticker import Ticker
+from probe_registry import CollectorSet
+from probe_delta import PROTOCOL_VERSION, diff_state
+from probe_prometheus import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_report, render_families
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class DiskSpool:
+    """本地磁盘缓存队列
+
+    未成功上报的样本按 JSON 行追加到 ``seg_<序号>.jsonl`` 分段文件中，
+    发送成功后推进读取位置（保存在 ``offset`` 文件，重启后继续），
+    已读完的分段直接删除。总大小超过 max_bytes 时按 evict 策略丢弃：
+    ``oldest`` 删除最旧的分段，``newest`` 丢弃新样本。
+    """
+    
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024,
+                 segment_bytes=1024 * 1024, evict='oldest', fsync=False):
+        if evict not in ('oldest', 'newest'):
+            raise ValueError("evict 只能是 'oldest' 或 'newest'")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.evict = evict
+        self.fsync = fsync
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        
+        self._segments = sorted(
+            int(name[4:-6]) for name in os.listdir(directory)
+            if name.startswith('seg_') and name.endswith('.jsonl')
+        )
+        self._read_seq, self._read_offset = self._load_offset()
+        for seq in [s for s in self._segments if s < self._read_seq]:
+            os.remove(self._path(seq))
+            self._segments.remove(seq)
+        if self._segments and self._segments[0] != self._read_seq:
+            self._read_seq, self._read_offset = self._segments[0], 0
+        
+        # 每个分段未读的条数和字节数
+        self._counts = {}
+        self._sizes = {}
+        for seq in self._segments:
+            offset = self._read_offset if seq == self._segments[0] else 0
+            with open(self._path(seq), 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            self._counts[seq] = data.count(b'\n')
+            self._sizes[seq] = len(data)
+        self._write_file = None
+    
+    def __len__(self):
+        return sum(self._counts.values())
+    
+    @property
+    def size(self):
+        return sum(self._sizes.values())
+    
+    def _path(self, seq):
+        return os.path.join(self.directory, f"seg_{seq:012d}.jsonl")
+    
+    def _load_offset(self):
+        try:
+            with open(os.path.join(self.directory, 'offset'), encoding='utf-8') as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (OSError, ValueError):
+            return (self._segments[0] if self._segments else 0), 0
+    
+    def _save_offset(self):
+        path = os.path.join(self.directory, 'offset')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(f"{self._read_seq} {self._read_offset}")
+        os.replace(path + '.tmp', path)
+    
+    def _close_write(self):
+        if self._write_file is not None:
+            self._write_file.close()
+            self._write_file = None
+    
+    def _drop_oldest(self):
+        seq = self._segments.pop(0)
+        if not self._segments:
+            self._close_write()
+        self.dropped += self._counts.pop(seq)
+        self._sizes.pop(seq)
+        os.remove(self._path(seq))
+        self._read_seq = self._segments[0] if self._segments else seq + 1
+        self._read_offset = 0
+        self._save_offset()
+    
+    def append(self, sample):
+        """追加一条样本，因容量限制被丢弃时返回 False"""
+        line = (json.dumps(sample, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        if self.size + len(line) > self.max_bytes:
+            if self.evict == 'newest':
+                self.dropped += 1
+                return False
+            while self._segments and self.size + len(line) > self.max_bytes:
+                self._drop_oldest()
+        
+        seq = self._segments[-1] if self._segments else self._read_seq
+        if self._write_file is None or self._sizes[seq] >= self.segment_bytes:
+            self._close_write()
+            if self._segments and self._sizes[seq] >= self.segment_bytes:
+                seq += 1
+            if seq not in self._sizes:
+                self._segments.append(seq)
+                self._counts[seq] = 0
+                self._sizes[seq] = 0
+            self._write_file = open(self._path(seq), 'ab')
+        
+        self._write_file.write(line)
+        self._write_file.flush()
+        if self.fsync:
+            os.fsync(self._write_file.fileno())
+        self._counts[seq] += 1
+        self._sizes[seq] += len(line)
+        return True
+    
+    def peek(self, limit):
+        """按写入顺序读取最多 limit 条样本，返回 (样本列表, 位置)，位置交给 commit()"""
+        samples = []
+        lines = 0
+        seq, offset = self._read_seq, self._read_offset
+        for seq in self._segments:
+            if seq != self._read_seq:
+                offset = 0
+            with open(self._path(seq), 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # 写入中断留下的半行
+                    offset += len(line)
+                    lines += 1
+                    try:
+                        samples.append(json.loads(line))
+                    except ValueError:
+                        continue  # 跳过损坏的行
+                    if len(samples) >= limit:
+                        return samples, (seq, offset, lines)
+        return samples, (seq, offset, lines)
+    
+    def commit(self, position):
+        """确认 peek() 返回的样本已发送，推进读取位置并删除读完的分段"""
+        seq, offset, lines = position
+        if not lines or seq not in self._counts:
+            return  # 期间分段已被淘汰
+        while self._segments[0] < seq:
+            done = self._segments.pop(0)
+            lines -= self._counts.pop(done)
+            self._sizes.pop(done)
+            os.remove(self._path(done))
+        consumed = offset - (self._read_offset if self._read_seq == seq else 0)
+        self._counts[seq] -= lines
+        self._sizes[seq] -= consumed
+        self._read_seq, self._read_offset = seq, offset
+        if seq == self._segments[-1] and self._sizes[seq] == 0:
+            # 全部发送完毕，从新分段重新开始
+            self._close_write()
+            self._segments.pop()
+            self._counts.pop(seq)
+            self._sizes.pop(seq)
+            os.remove(self._path(seq))
+            self._read_seq, self._read_offset = seq + 1, 0
+        self._save_offset()
 
 class ProbeClient:
-    def __init__(self, server_url):
+    # 默认启用的采集器
+    DEFAULT_COLLECTORS = ('cpu', 'memory', 'disk', 'network')
+    # 从磁盘缓存补发时单次请求的最大样本数
+    REPLAY_BATCH = 500
+    # 上报失败后的最长退避时间（秒）
+    MAX_BACKOFF = 300
+    
+    def __init__(self, server_url, batch_size=1, batch_interval=None,
+                 compression='gzip', max_buffer=1000, timeout=(5, 30), retries=3,
+                 spool_dir=None, spool_max_bytes=64 * 1024 * 1024,
+                 spool_segment_bytes=1024 * 1024, spool_evict='oldest',
+                 metric_intervals=None, delta=False, full_every=60, collectors=None):
+        """
+        Args:
+            server_url: 服务端地址，只使用 serve_metrics 本地导出时可为 None
+            batch_size: 攒够多少条样本后批量上报，1 表示逐条上报
+            batch_interval: 最早一条缓存样本超过多少秒后批量上报
+            compression: 批量上报的压缩方式，gzip/zstd/None
+            max_buffer: 上报失败时最多缓存的样本数，超出后丢弃最旧的（未启用磁盘缓存时）
+            timeout: 请求超时（连接, 读取）秒数
+            retries: 建立连接失败时的重试次数（请求发出后的失败不重试，见 _create_session）
+            spool_dir: 磁盘缓存目录，设置后未发送的样本写入磁盘并按顺序补发。只有设置了
+                该目录才保证不丢数据：未设置时，逐条上报失败的样本直接丢弃，批量上报的
+                样本最多在内存中保留 max_buffer 条，进程退出即丢失
+            spool_max_bytes: 磁盘缓存的最大字节数
+            spool_segment_bytes: 单个缓存分段文件的大小
+            spool_evict: 缓存满时丢弃 oldest（最旧分段）或 newest（新样本）
+            metric_intervals: 各指标组的刷新间隔，如 {'disk': 300}，未到期时沿用上次的值
+            delta: 逐条上报时使用增量协议（/report/delta），只发送变化的字段
+            full_every: 增量协议下每隔多少次上报发送一次完整快照
+            collectors: 采集器配置，如 {'disk': {'interval': 300}, 'cgroup': True}
+                或只启用的名称列表，见 probe_registry.CollectorSet
+        """
         self.server_url = server_url
         self.hostname = socket.gethostname()
         self.ip = self._get_ip()
         self.system = platform.system()
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.compression = compression
+        if compression == 'zstd' and zstandard is None:
+            print("未安装 zstandard，批量上报改用 gzip 压缩")
+            self.compression = 'gzip'
+        self._buffer = deque(maxlen=max_buffer)
+        self._buffer_since = None
+        self.timeout = timeout
+        self.session = self._create_session(retries)
+        self.spool = None
+        if spool_dir:
+            self.spool = DiskSpool(spool_dir, spool_max_bytes, spool_segment_bytes, spool_evict)
+        self._backoff = 0
+        self._retry_at = 0
+        self.delta = delta
+        self.full_every = full_every
+        self._seq = 0
+        self._acked = None  # 服务端已确认的最近状态 (seq, metrics)
+        self._since_full = 0
+        self.collectors = CollectorSet(self.DEFAULT_COLLECTORS, collectors, metric_intervals)
+    
+    def _create_session(self, retries):
+        """创建保持长连接的会话，只在建立连接失败时按指数退避重试
+
+        上报都是不幂等的 POST：读取超时、连接中断或网关返回 502/503/504 时请求可能
+        已被服务端处理（如代理在上游写入后才返回 502），重发会重复写入同一批样本，
+        所以这些情况都不重试，交给调用方的退避和缓存处理。
+        """
+        session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=0.5,
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
         
     def _get_ip(self):
         """获取本机IP地址"""
@@ -26,75 +277,149 @@ class ProbeClient:
     
     def get_cpu_info(self):
         """获取CPU信息"""
-        cpu_percent = psutil.cpu_percent(interval=1, percpu=True)
-        cpu_freq = psutil.cpu_freq()
-        return {
-            'cpu_percent': cpu_percent,
-            'cpu_count': psutil.cpu_count(),
-            'cpu_freq_current': round(cpu_freq.current, 2) if cpu_freq else None,
-            'cpu_freq_max': round(cpu_freq.max, 2) if cpu_freq else None
-        }
+        return self.collectors.get('cpu')
     
     def get_memory_info(self):
         """获取内存信息"""
-        memory = psutil.virtual_memory()
-        swap = psutil.swap_memory()
-        return {
-            'memory_total': round(memory.total / (1024**3), 2),
-            'memory_used': round(memory.used / (1024**3), 2),
-            'memory_percent': memory.percent,
-            'swap_total': round(swap.total / (1024**3), 2),
-            'swap_used': round(swap.used / (1024**3), 2),
-            'swap_percent': swap.percent
-        }
+        return self.collectors.get('memory')
     
     def get_disk_info(self):
         """获取磁盘信息"""
-        disk_partitions = []
-        for partition in psutil.disk_partitions():
-            try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                disk_partitions.append({
-                    'device': partition.device,
-                    'mountpoint': partition.mountpoint,
-                    'total_size': round(usage.total / (1024**3), 2),
-                    'used': round(usage.used / (1024**3), 2),
-                    'free': round(usage.free / (1024**3), 2),
-                    'percent': usage.percent
-                })
-            except PermissionError:
-                continue
-        return disk_partitions
+        return self.collectors.get('disk')
     
     def get_network_info(self):
         """获取网络信息"""
-        net_io = psutil.net_io_counters()
-        return {
-            'bytes_sent': round(net_io.bytes_sent / (1024**2), 2),
-            'bytes_recv': round(net_io.bytes_recv / (1024**2), 2),
-            'packets_sent': net_io.packets_sent,
-            'packets_recv': net_io.packets_recv,
-            'connections': len(psutil.net_connections())
-        }
+        return self.collectors.get('network')
     
     def collect_metrics(self):
-        """收集所有系统指标"""
-        return {
+        """收集所有启用的系统指标"""
+        metrics = {
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'hostname': self.hostname,
             'ip': self.ip,
-            'system': self.system,
-            'cpu': self.get_cpu_info(),
-            'memory': self.get_memory_info(),
-            'disk': self.get_disk_info(),
-            'network': self.get_network_info()
+            'system': self.system
         }
+        metrics.update(self.collectors.collect())
+        return metrics
+    
+    @property
+    def batching(self):
+        return self.batch_size > 1 or bool(self.batch_interval) or self.spool is not None
+    
+    def _pending(self):
+        return len(self.spool) if self.spool is not None else len(self._buffer)
+    
+    def _encode_batch(self, samples):
+        """序列化并压缩一批样本，返回 (body, Content-Encoding)"""
+        body = json.dumps(samples, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(body), 'zstd'
+        if self.compression == 'gzip':
+            return gzip.compress(body, compresslevel=6), 'gzip'
+        return body, 'identity'
+    
+    def _batch_due(self):
+        if self._pending() >= self.batch_size:
+            return True
+        return bool(self.batch_interval) and \
+            time.monotonic() - self._buffer_since >= self.batch_interval
+    
+    def _send_batch(self, samples):
+        """通过 /report/batch 上报一批样本，返回是否成功"""
+        body, encoding = self._encode_batch(samples)
+        try:
+            response = self.session.post(
+                f"{self.server_url}/report/batch",
+                data=body,
+                headers={'Content-Type': 'application/json', 'Content-Encoding': encoding},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            print(f"批量上报失败: {str(e)}，已缓存 {self._pending()} 条")
+            return False
+        if response.status_code != 200:
+            print(f"批量上报失败: {response.status_code}，已缓存 {self._pending()} 条")
+            return False
+        print(f"[{samples[-1]['timestamp']}] 批量上报成功: {len(samples)} 条")
+        return True
+    
+    def _record_result(self, success):
+        """成功时清零退避，失败时按指数退避推迟下一次发送"""
+        if success:
+            self._backoff = 0
+            self._retry_at = 0
+        else:
+            self._backoff = min(self.MAX_BACKOFF, max(1, self._backoff * 2))
+            self._retry_at = time.monotonic() + self._backoff
+    
+    def flush(self):
+        """把缓存的样本压缩后批量上报，失败时保留缓存，启用磁盘缓存时按顺序全部补发"""
+        if time.monotonic() < self._retry_at:
+            return False
+        if self.spool is not None:
+            while len(self.spool):
+                samples, position = self.spool.peek(self.REPLAY_BATCH)
+                if not position[2]:
+                    break
+                if samples and not self._send_batch(samples):
+                    self._record_result(False)
+                    return False
+                self.spool.commit(position)
+        elif self._buffer:
+            samples = list(self._buffer)
+            if not self._send_batch(samples):
+                self._record_result(False)
+                return False
+            for _ in samples:
+                self._buffer.popleft()
+        
+        self._record_result(True)
+        self._buffer_since = time.monotonic() if self._pending() else None
+        return True
+    
+    def _send_delta(self, metrics):
+        """按增量协议上报，服务端要求重同步时立即改发完整快照"""
+        for _ in range(2):
+            self._seq += 1
+            message = {'v': PROTOCOL_VERSION, 'ip': self.ip, 'seq': self._seq}
+            full = self._acked is None or self._since_full >= self.full_every
+            if full:
+                message['full'] = metrics
+            else:
+                message['base'] = self._acked[0]
+                message['delta'] = diff_state(self._acked[1], metrics)
+            response = self.session.post(f"{self.server_url}/report/delta", json=message,
+                                         timeout=self.timeout)
+            if response.status_code == 409:
+                self._acked = None
+                continue
+            if response.status_code == 200:
+                self._acked = (self._seq, metrics)
+                self._since_full = 0 if full else self._since_full + 1
+            return response
+        return response
     
     def report_metrics(self):
         """向服务器报告指标"""
+        if self.batching:
+            metrics = self.collect_metrics()
+            if self.spool is not None:
+                self.spool.append(metrics)
+            else:
+                self._buffer.append(metrics)
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+            if self._batch_due():
+                self.flush()
+            return
+        
         try:
             metrics = self.collect_metrics()
-            response = requests.post(f"{self.server_url}/report", json=metrics)
+            if self.delta:
+                response = self._send_delta(metrics)
+            else:
+                response = self.session.post(f"{self.server_url}/report", json=metrics,
+                                             timeout=self.timeout)
             if response.status_code == 200:
                 print(f"[{metrics['timestamp']}] 数据上报成功")
             else:
@@ -107,18 +432,64 @@ class ProbeClient:
         print(f"探针客户端启动 - {self.hostname}({self.ip})")
         print(f"上报间隔：{interval}秒")
         
+        ticker = Ticker(interval)
+        self.collectors.tolerance = interval / 2
         while True:
             try:
                 self.report_metrics()
-                time.sleep(interval)
+                ticker.wait(self.collectors)
             except KeyboardInterrupt:
+                if self.batching:
+                    self.flush()
                 print("\n探针停止运行")
                 break
             except Exception as e:
                 print(f"发生错误: {str(e)}")
-                time.sleep(interval)
+                ticker.wait(self.collectors)
+
+    def serve_metrics(self, port=9105, host='0.0.0.0'):
+        """本地导出模式：不向服务端上报，在 http://host:port/metrics 以
+        Prometheus 文本格式输出本机指标，每次抓取时采集一次"""
+        client = self
+        lock = threading.Lock()
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                with lock:
+                    metrics = client.collect_metrics()
+                fragments = render_report(metrics, time.time())
+                body = render_families({family: [fragment]
+                                        for family, fragment in fragments.items()})
+                self.send_response(200)
+                self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        print(f"探针导出模式启动 - {self.hostname}({self.ip})")
+        print(f"指标地址：http://{host}:{port}/metrics")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n探针停止运行")
+        finally:
+            server.server_close()
 
 if __name__ == "__main__":
     SERVER_URL = "http://localhost:5000"  # 修改为你的服务器地址
-    client = ProbeClient(SERVER_URL)
-    client.run() 
\ No newline at end of file
+    # 设置后只在本地暴露 Prometheus /metrics，不向服务端上报
+    EXPORTER_PORT = int(os.environ.get('PROBE_EXPORTER_PORT', 0))
+    # 逗号分隔的采集器名称，如 cpu,memory,disk,network,cgroup；不设置时使用默认采集器
+    COLLECTORS = [name for name in os.environ.get('PROBE_COLLECTORS', '').split(',') if name]
+    if EXPORTER_PORT:
+        ProbeClient(None, collectors=COLLECTORS or None).serve_metrics(EXPORTER_PORT)
+    else:
+        client = ProbeClient(SERVER_URL, collectors=COLLECTORS or None)
+        client.run() 
\ No newline at end of file
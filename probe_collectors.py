@@ -0,0 +1,340 @@
+import heapq
+import os
+import socket
+import time
+
+import psutil
+
+from probe_registry import Collector
+
+
+class CpuSampler:
+    """非阻塞的CPU使用率采样
+
+    每次调用与上一次的 ``psutil.cpu_times`` 快照做差，得到两次调用之间的
+    使用率，不需要像 ``cpu_percent(interval=1)`` 那样阻塞等待。
+    """
+
+    def __init__(self):
+        self._last = psutil.cpu_times(percpu=True)
+
+    @staticmethod
+    def _busy_percent(before, after):
+        total = sum(after) - sum(before)
+        if total <= 0:
+            return 0.0
+        idle = (after.idle - before.idle) + \
+            (getattr(after, 'iowait', 0) - getattr(before, 'iowait', 0))
+        return round(min(100.0, max(0.0, (total - idle) / total * 100)), 1)
+
+    def percpu(self):
+        """返回自上次调用以来每个核心的使用率列表"""
+        current = psutil.cpu_times(percpu=True)
+        last = self._last
+        self._last = current
+        if len(last) != len(current):  # CPU 热插拔
+            return [0.0] * len(current)
+        return [self._busy_percent(b, a) for b, a in zip(last, current)]
+
+
+# /proc/net/{tcp,udp}* 中 st 列的十六进制状态码
+SOCKET_STATES = {
+    b'01': 'ESTABLISHED', b'02': 'SYN_SENT', b'03': 'SYN_RECV',
+    b'04': 'FIN_WAIT1', b'05': 'FIN_WAIT2', b'06': 'TIME_WAIT',
+    b'07': 'CLOSE', b'08': 'CLOSE_WAIT', b'09': 'LAST_ACK',
+    b'0A': 'LISTEN', b'0B': 'CLOSING', b'0C': 'NEW_SYN_RECV',
+}
+
+PROC_NET_TABLES = (('tcp', 'tcp'), ('tcp', 'tcp6'), ('udp', 'udp'), ('udp', 'udp6'))
+
+
+def _count_states(path):
+    """逐行读取一张 /proc/net 连接表，只取状态列计数"""
+    counts = {}
+    with open(path, 'rb', buffering=1024 * 1024) as f:
+        next(f, None)  # 表头
+        for line in f:
+            state = line.split(None, 4)[3]
+            counts[state] = counts.get(state, 0) + 1
+    return counts
+
+
+def count_connections(proc_net='/proc/net'):
+    """按协议和状态统计 TCP/UDP 连接数
+
+    直接流式解析 /proc/net/tcp、tcp6、udp、udp6，不为每个连接创建对象；
+    统计范围与 ``psutil.net_connections('inet')`` 相同。返回
+    ``(总数, {'tcp': {'ESTABLISHED': n, ...}, 'udp': {...}})``。
+    非 Linux 系统回退到 psutil。
+    """
+    by_proto = {'tcp': {}, 'udp': {}}
+    total = 0
+    found = False
+    for proto, table in PROC_NET_TABLES:
+        try:
+            counts = _count_states(f"{proc_net}/{table}")
+        except FileNotFoundError:
+            continue  # 未启用 IPv6 等
+        found = True
+        states = by_proto[proto]
+        for code, n in counts.items():
+            name = SOCKET_STATES.get(code, code.decode('ascii', 'replace'))
+            states[name] = states.get(name, 0) + n
+            total += n
+    if not found:
+        return _count_connections_psutil()
+    return total, by_proto
+
+
+def _count_connections_psutil():
+    by_proto = {'tcp': {}, 'udp': {}}
+    connections = psutil.net_connections('inet')
+    for conn in connections:
+        proto = 'tcp' if conn.type == socket.SOCK_STREAM else 'udp'
+        state = conn.status if proto == 'tcp' else ('ESTABLISHED' if conn.raddr else 'CLOSE')
+        by_proto[proto][state] = by_proto[proto].get(state, 0) + 1
+    return len(connections), by_proto
+
+
+class _ProcessEntry:
+    __slots__ = ('proc', 'name', 'create_time', 'cpu_time', 'cpu_percent', 'rss')
+
+    def __init__(self, proc, name, create_time):
+        self.proc = proc
+        self.name = name
+        self.create_time = create_time
+        self.cpu_time = None
+        self.cpu_percent = 0.0
+        self.rss = 0
+
+
+class ProcessTracker:
+    """跨周期缓存进程句柄的 top-N 进程统计
+
+    每个周期仍要列出全部 PID 并读取每个进程的 CPU 时间和 RSS（同一次 oneshot 内），
+    与上一周期做差得到真实的 CPU 使用率（新进程按其生命周期平均值估算），开销与进程数
+    成正比；省掉的是每周期重建 Process 对象、读取进程名和对全部进程排序。进程退出时
+    移出缓存，``is_running()`` 发现 PID 被复用时重建句柄；top-N 用堆选出。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._last_update = None
+        self._total_memory = psutil.virtual_memory().total
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self):
+        """刷新所有进程的 CPU 使用率和内存占用"""
+        now = time.monotonic()
+        wall = time.time()
+        elapsed = now - self._last_update if self._last_update is not None else None
+        self._last_update = now
+
+        entries = self._entries
+        alive = {}
+        for pid in psutil.pids():
+            entry = entries.get(pid)
+            try:
+                if entry is not None and not entry.proc.is_running():
+                    entry = None  # 启动时间与缓存的句柄不同，PID 已被新进程复用
+                if entry is None:
+                    entry = self._new_entry(pid)
+                cpu_time, rss = self._read(entry.proc)
+                if entry.cpu_time is not None and cpu_time < entry.cpu_time:
+                    # 两次检查之间被复用时 CPU 时间会倒退
+                    entry = self._new_entry(pid)
+                    cpu_time, rss = self._read(entry.proc)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                continue
+            except psutil.AccessDenied:
+                if entry is not None:
+                    alive[pid] = entry
+                continue
+
+            if entry.cpu_time is not None and elapsed:
+                entry.cpu_percent = (cpu_time - entry.cpu_time) / elapsed * 100
+            else:
+                entry.cpu_percent = cpu_time / max(wall - entry.create_time, 1.0) * 100
+            entry.cpu_time = cpu_time
+            entry.rss = rss
+            alive[pid] = entry
+        self._entries = alive
+
+    @staticmethod
+    def _read(proc):
+        """返回 (CPU 时间, RSS)"""
+        with proc.oneshot():
+            times = proc.cpu_times()
+            rss = proc.memory_info().rss
+        return times.user + times.system, rss
+
+    @staticmethod
+    def _new_entry(pid):
+        proc = psutil.Process(pid)
+        with proc.oneshot():
+            return _ProcessEntry(proc, proc.name(), proc.create_time())
+
+    def _format(self, pid, entry):
+        return {
+            'pid': pid,
+            'name': entry.name,
+            'cpu_percent': round(entry.cpu_percent, 1),
+            'memory_percent': round(entry.rss / self._total_memory * 100, 2),
+            'rss': round(entry.rss / (1024**2), 2)  # MB
+        }
+
+    def top_cpu(self, n=10):
+        """CPU 使用率最高的 n 个进程"""
+        top = heapq.nlargest(n, self._entries.items(), key=lambda item: item[1].cpu_percent)
+        return [self._format(pid, entry) for pid, entry in top]
+
+    def top_memory(self, n=10):
+        """RSS 最大的 n 个进程"""
+        top = heapq.nlargest(n, self._entries.items(), key=lambda item: item[1].rss)
+        return [self._format(pid, entry) for pid, entry in top]
+
+
+# 内置采集器（在 probe_registry 中按名称注册）
+
+class CpuCollector(Collector):
+    """CPU 使用率（每核心）和频率"""
+
+    def __init__(self):
+        self._sampler = CpuSampler()
+
+    def collect(self):
+        cpu_freq = psutil.cpu_freq()
+        return {
+            'cpu_percent': self._sampler.percpu(),
+            'cpu_count': psutil.cpu_count(),
+            'cpu_freq_current': round(cpu_freq.current, 2) if cpu_freq else None,
+            'cpu_freq_max': round(cpu_freq.max, 2) if cpu_freq else None
+        }
+
+
+class MemoryCollector(Collector):
+    """物理内存和交换分区"""
+
+    def collect(self):
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        return {
+            'memory_total': round(memory.total / (1024**3), 2),  # GB
+            'memory_used': round(memory.used / (1024**3), 2),
+            'memory_percent': memory.percent,
+            'swap_total': round(swap.total / (1024**3), 2),
+            'swap_used': round(swap.used / (1024**3), 2),
+            'swap_percent': swap.percent
+        }
+
+
+class DiskCollector(Collector):
+    """各分区的容量和使用率"""
+
+    def collect(self):
+        disk_partitions = []
+        for partition in psutil.disk_partitions():
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except (PermissionError, OSError):
+                continue
+            disk_partitions.append({
+                'device': partition.device,
+                'mountpoint': partition.mountpoint,
+                'total_size': round(usage.total / (1024**3), 2),  # GB
+                'used': round(usage.used / (1024**3), 2),
+                'free': round(usage.free / (1024**3), 2),
+                'percent': usage.percent
+            })
+        return disk_partitions
+
+
+class NetworkCollector(Collector):
+    """网卡流量和按协议、状态分组的连接数"""
+
+    def collect(self):
+        net_io = psutil.net_io_counters()
+        connections, connection_states = count_connections()
+        return {
+            'bytes_sent': round(net_io.bytes_sent / (1024**2), 2),  # MB
+            'bytes_recv': round(net_io.bytes_recv / (1024**2), 2),
+            'packets_sent': net_io.packets_sent,
+            'packets_recv': net_io.packets_recv,
+            'connections': connections,
+            'connection_states': connection_states
+        }
+
+
+class ProcessCollector(Collector):
+    """CPU 使用率和内存占用各自前 top_n 的进程"""
+    budget = 1.0
+
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        self._tracker = ProcessTracker()
+
+    def collect(self):
+        self._tracker.update()
+        return {
+            'by_cpu': self._tracker.top_cpu(self.top_n),
+            'by_memory': self._tracker.top_memory(self.top_n)
+        }
+
+
+class SensorsCollector(Collector):
+    """温度和风扇传感器（psutil 不支持的平台返回空）"""
+    interval = 30
+
+    def collect(self):
+        result = {'temperatures': {}, 'fans': {}}
+        read_temperatures = getattr(psutil, 'sensors_temperatures', None)
+        for chip, entries in (read_temperatures() if read_temperatures else {}).items():
+            result['temperatures'][chip] = [
+                {'label': e.label, 'current': e.current, 'high': e.high, 'critical': e.critical}
+                for e in entries]
+        read_fans = getattr(psutil, 'sensors_fans', None)
+        for chip, entries in (read_fans() if read_fans else {}).items():
+            result['fans'][chip] = [{'label': e.label, 'rpm': e.current} for e in entries]
+        return result
+
+
+class CgroupCollector(Collector):
+    """cgroup v2 的 CPU、内存和进程数统计（默认为本进程所在的 cgroup）"""
+    interval = 10
+
+    def __init__(self, path=None):
+        self.path = path or self._own_cgroup()
+
+    @staticmethod
+    def _own_cgroup():
+        try:
+            with open('/proc/self/cgroup', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('0::'):
+                        return '/sys/fs/cgroup' + line[3:].strip().rstrip('/')
+        except OSError:
+            pass
+        return '/sys/fs/cgroup'
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.path, name), encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def collect(self):
+        result = {'path': self.path}
+        cpu_stat = self._read('cpu.stat')
+        if cpu_stat:
+            stats = dict(line.split() for line in cpu_stat.splitlines())
+            result['cpu_usage_seconds'] = int(stats.get('usage_usec', 0)) / 1e6
+            result['cpu_throttled_seconds'] = int(stats.get('throttled_usec', 0)) / 1e6
+        for key, name in (('memory_current', 'memory.current'), ('memory_max', 'memory.max'),
+                          ('pids_current', 'pids.current')):
+            value = self._read(name)
+            if value is not None:
+                result[key] = None if value == 'max' else int(value)
+        return result
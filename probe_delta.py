@@ -0,0 +1,77 @@
+"""增量上报协议（v2）
+
+客户端先发送一次完整快照，之后只发送相对上一次的增量::
+
+    {"v": 2, "ip": "...", "seq": 1, "full": {...}}
+    {"v": 2, "ip": "...", "seq": 2, "base": 1, "delta": {...}}
+
+增量中变化的键给出新值，嵌套字典递归比较，列表整体替换，被删除的键列在
+``"-"`` 中。服务端发现 base 与自己记录的序号不一致时要求客户端重新发送完整快照。
+"""
+import threading
+
+PROTOCOL_VERSION = 2
+DELETED_KEY = '-'
+
+
+class ResyncRequired(Exception):
+    """服务端缺少增量的基准状态，需要客户端重新发送完整快照"""
+
+
+def diff_state(old, new):
+    """计算把 old 变为 new 的增量，没有变化时返回空字典"""
+    delta = {}
+    for key, value in new.items():
+        if key not in old:
+            delta[key] = value
+            continue
+        previous = old[key]
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff_state(previous, value)
+            if nested:
+                delta[key] = nested
+        elif value != previous:
+            delta[key] = value
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta[DELETED_KEY] = removed
+    return delta
+
+
+def apply_delta(base, delta):
+    """把增量应用到 base，返回新字典（未变化的部分与 base 共享，不修改 base）"""
+    state = dict(base)
+    for key, value in delta.items():
+        if key == DELETED_KEY:
+            for removed in value:
+                state.pop(removed, None)
+        elif isinstance(value, dict) and isinstance(state.get(key), dict):
+            state[key] = apply_delta(state[key], value)
+        else:
+            state[key] = value
+    return state
+
+
+class DeltaDecoder:
+    """服务端按客户端 IP 维护最近的完整状态并还原增量上报"""
+
+    def __init__(self):
+        self._states = {}
+        self.lock = threading.Lock()
+
+    def decode(self, message):
+        """返回还原后的完整数据，基准不匹配时抛出 ResyncRequired"""
+        if message.get('v') != PROTOCOL_VERSION:
+            raise ValueError(f"不支持的协议版本: {message.get('v')}")
+        ip = message['ip']
+        seq = message['seq']
+        with self.lock:
+            if 'full' in message:
+                data = message['full']
+            else:
+                current = self._states.get(ip)
+                if current is None or current[0] != message.get('base'):
+                    raise ResyncRequired(current[0] if current else None)
+                data = apply_delta(current[1], message['delta'])
+            self._states[ip] = (seq, data)
+        return data
@@ -0,0 +1,86 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class Broadcaster:
+    """Server-Sent Events 广播
+
+    上报线程只登记发生变化的键；后台线程每隔 interval 秒把这段时间内变化的条目
+    通过 build(keys) 汇总成一条事件并序列化一次，放入共享的事件环。所有订阅者
+    从同一个环按事件 ID 读取，落后超过环长度时收到 ``reset`` 事件，需要重新拉取全量。
+    """
+
+    def __init__(self, build, event='clients', interval=1.0, history=256):
+        self.build = build
+        self.event = event
+        self.interval = interval
+        self._dirty = set()
+        self._events = deque(maxlen=history)
+        self._last_id = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self.subscribers = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='broadcaster', daemon=True)
+                self._thread.start()
+
+    def mark(self, key):
+        """登记一个发生变化的键"""
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            self._dirty.add(key)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._cond:
+                keys, self._dirty = self._dirty, set()
+            if not keys:
+                continue
+            try:
+                data = json.dumps(self.build(keys), ensure_ascii=False)
+            except Exception as e:
+                print(f"生成推送事件失败: {str(e)}")
+                continue
+            with self._cond:
+                self._last_id += 1
+                self._events.append((self._last_id,
+                                     f"id: {self._last_id}\nevent: {self.event}\ndata: {data}\n\n"))
+                self._cond.notify_all()
+
+    def stream(self, last_id=None, heartbeat=15):
+        """订阅事件流，生成 SSE 文本；last_id 为浏览器重连时带回的 Last-Event-ID"""
+        with self._cond:
+            reset = last_id is not None and last_id > self._last_id  # 服务端已重启
+            cursor = self._last_id if last_id is None or reset else last_id
+            self.subscribers += 1
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                if reset:
+                    reset = False
+                    yield f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"
+                with self._cond:
+                    if self._last_id <= cursor:
+                        self._cond.wait(heartbeat)
+                    pending = [item for item in self._events if item[0] > cursor]
+                    if pending and pending[0][0] > cursor + 1:
+                        # 落后太多，中间的事件已被覆盖
+                        reset = True
+                        cursor = self._last_id
+                        continue
+                if not pending:
+                    yield ': keepalive\n\n'
+                    continue
+                for event_id, text in pending:
+                    yield text
+                    cursor = event_id
+        finally:
+            with self._cond:
+                self.subscribers -= 1
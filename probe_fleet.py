@@ -0,0 +1,139 @@
+"""全体客户端最新样本的向量化统计
+
+每个客户端占矩阵中的一行，每个指标一列（NumPy 数组，缺失为 NaN），上报时只改写
+对应行；统计时直接在整列上做分位数、top-K 和直方图，不遍历各客户端的字典。
+需要安装 numpy。
+"""
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_METRICS = ('cpu.cpu_percent', 'memory.memory_percent',
+                   'memory.swap_percent', 'disk.max_percent')
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+# 每台主机使用率最高的分区，便于找出磁盘最满的主机
+DISK_MAX_PERCENT = 'disk.max_percent'
+
+
+class FleetMatrix:
+    """按行存放每个客户端最新一次上报的数值指标
+
+    只保存 metrics 中列出的全局指标（每个指标一列），分区、网站等数量不定的
+    指标不进入矩阵，各分区的使用率汇总为 disk.max_percent。
+    """
+
+    def __init__(self, capacity=1024, metrics=DEFAULT_METRICS):
+        if np is None:
+            raise RuntimeError('全局统计需要安装 numpy: pip install numpy')
+        self.lock = threading.Lock()
+        self._capacity = capacity
+        self._rows = {}  # ip -> 行号
+        self._ips = []  # 行号 -> ip
+        self._timestamps = np.full(capacity, np.nan)
+        self._columns = {name: np.full(capacity, np.nan) for name in metrics}
+
+    def __len__(self):
+        return len(self._ips)
+
+    def metric_names(self):
+        return sorted(self._columns)
+
+    def _grow(self):
+        capacity = self._capacity * 2
+        for name, column in self._columns.items():
+            self._columns[name] = self._extend(column, capacity)
+        self._timestamps = self._extend(self._timestamps, capacity)
+        self._capacity = capacity
+
+    @staticmethod
+    def _extend(column, capacity):
+        grown = np.full(capacity, np.nan)
+        grown[:len(column)] = column
+        return grown
+
+    def update(self, ip, values, ts):
+        """用一次上报展开后的指标（见 probe_store.flatten_metrics）覆盖该客户端的行"""
+        if DISK_MAX_PERCENT in self._columns:
+            disk = [v for name, v in values.items()
+                    if name.startswith('disk.') and name.endswith('.percent')]
+            if disk:
+                values = dict(values)
+                values[DISK_MAX_PERCENT] = max(disk)
+
+        with self.lock:
+            row = self._rows.get(ip)
+            if row is None:
+                row = self._rows[ip] = len(self._ips)
+                if row >= self._capacity:
+                    self._grow()
+                self._ips.append(ip)
+            elif ts < self._timestamps[row]:
+                return  # 补传的旧样本
+
+            for name, column in self._columns.items():
+                column[row] = values.get(name, np.nan)
+            self._timestamps[row] = ts
+
+    def summary(self, metrics=DEFAULT_METRICS, percentiles=DEFAULT_PERCENTILES,
+                top=10, bins=10, max_age=None, now=None):
+        """统计各指标在全部客户端上的分布
+
+        Args:
+            metrics: 指标名列表，未在构造时列出的指标返回 count 为 0
+            percentiles: 需要的分位数（0-100）
+            top: 返回数值最大的主机个数
+            bins: 直方图分桶数；百分比指标固定为 0-100 区间
+            max_age: 只统计最近 max_age 秒内上报过的客户端
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            size = len(self._ips)
+            ips = self._ips[:size]
+            fresh = None
+            if max_age is not None:
+                fresh = self._timestamps[:size] >= now - max_age
+            result = {}
+            for name in metrics:
+                column = self._columns.get(name)
+                if column is None:
+                    result[name] = {'count': 0}
+                    continue
+                column = column[:size]
+                valid = ~np.isnan(column)
+                if fresh is not None:
+                    valid &= fresh
+                rows = np.flatnonzero(valid)
+                result[name] = self._describe(name, column[rows], rows, ips,
+                                              percentiles, top, bins)
+        return {'clients': size, 'metrics': result}
+
+    @staticmethod
+    def _describe(name, values, rows, ips, percentiles, top, bins):
+        count = len(values)
+        if not count:
+            return {'count': 0}
+        stats = {
+            'count': count,
+            'mean': float(values.mean()),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'percentiles': {str(p): float(v) for p, v in
+                            zip(percentiles, np.percentile(values, percentiles))},
+        }
+
+        if top > 0:
+            k = min(top, count)
+            # argpartition 选出最大的 k 个，只对这 k 个排序
+            picked = np.argpartition(values, count - k)[count - k:]
+            picked = picked[np.argsort(values[picked])[::-1]]
+            stats['top'] = [{'ip': ips[rows[i]], 'value': float(values[i])} for i in picked]
+
+        if bins > 0:
+            span = (0.0, 100.0) if name.endswith('percent') else None
+            counts, edges = np.histogram(values, bins=bins, range=span)
+            stats['histogram'] = {'edges': edges.tolist(), 'counts': counts.tolist()}
+        return stats
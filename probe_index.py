@@ -0,0 +1,189 @@
+import bisect
+import hashlib
+import heapq
+import threading
+import time
+from collections import defaultdict, deque
+
+SORT_KEYS = ('ip', 'hostname', 'system', 'last_seen')
+
+
+class ClientIndex:
+    """客户端列表索引，在每次上报时增量维护
+
+    - 在线/离线集合，按 last_seen 排序的过期堆用于发现上线→离线的转换
+    - 按主机名排序的列表（前缀查询用二分查找）
+    - 按系统分组的集合
+    - 最近的上线/离线记录（history）
+    ``version`` 在客户端加入、主机名或系统变化以及上线/离线转换时递增，
+    供响应缓存判断是否失效；只刷新 last_seen 的上报不改变版本。
+    """
+
+    def __init__(self, offline_after=180):
+        self.offline_after = offline_after
+        self.lock = threading.Lock()
+        self.version = 0
+        self.online = set()
+        self.offline = set()
+        self.transitions = deque(maxlen=1000)  # (时间戳, ip, '在线'/'离线')
+        self._last_seen = {}
+        self._hostname = {}
+        self._system = {}
+        self._by_hostname = []  # [(hostname, ip)]，保持有序
+        self._by_system = defaultdict(set)
+        self._expiry = []  # [(last_seen, ip)] 小顶堆，过期项惰性删除
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def update(self, ip, hostname, system, ts):
+        """记录一次上报，返回本次由离线（或新加入）转为在线的 IP 列表"""
+        hostname = hostname or ''
+        system = system or ''
+        with self.lock:
+            if ts >= self._last_seen.get(ip, ts):
+                self._last_seen[ip] = ts
+                heapq.heappush(self._expiry, (ts, ip))
+
+            if self._hostname.get(ip) != hostname:
+                old = self._hostname.get(ip)
+                if old is not None:
+                    del self._by_hostname[bisect.bisect_left(self._by_hostname, (old, ip))]
+                bisect.insort(self._by_hostname, (hostname, ip))
+                self._hostname[ip] = hostname
+                self.version += 1
+            if self._system.get(ip) != system:
+                old = self._system.get(ip)
+                if old is not None:
+                    self._by_system[old].discard(ip)
+                self._by_system[system].add(ip)
+                self._system[ip] = system
+                self.version += 1
+
+            if ip in self.online or self._last_seen[ip] < time.time() - self.offline_after:
+                return []
+            self.offline.discard(ip)
+            self.online.add(ip)
+            self.transitions.append((ts, ip, '在线'))
+            self.version += 1
+            return [ip]
+
+    def sweep(self, now=None):
+        """把超过 offline_after 未上报的在线客户端转为离线，返回这些 IP"""
+        now = time.time() if now is None else now
+        cutoff = now - self.offline_after
+        changed = []
+        with self.lock:
+            expiry = self._expiry
+            while expiry and expiry[0][0] < cutoff:
+                ts, ip = heapq.heappop(expiry)
+                if self._last_seen.get(ip) != ts:
+                    continue  # 之后又上报过
+                if ip in self.online or ip not in self.offline:
+                    self.online.discard(ip)
+                    self.offline.add(ip)
+                    self.transitions.append((ts + self.offline_after, ip, '离线'))
+                    changed.append(ip)
+            if changed:
+                self.version += 1
+        return changed
+
+    def is_online(self, ip):
+        return ip in self.online
+
+    def history(self, ip=None, limit=None):
+        """最近的上线/离线记录，按时间倒序返回 [(时间戳, ip, '在线'/'离线')]"""
+        with self.lock:
+            events = [event for event in reversed(self.transitions)
+                      if ip is None or event[1] == ip]
+        return events[:limit] if limit is not None else events
+
+    def query(self, status=None, prefix=None, system=None, sort='ip', reverse=False):
+        """按条件筛选并排序，返回 IP 列表
+
+        Args:
+            status: 'online' / 'offline' / None
+            prefix: 主机名前缀
+            system: 操作系统名称（精确匹配）
+            sort: ip / hostname / system / last_seen
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        with self.lock:
+            if prefix:
+                start = bisect.bisect_left(self._by_hostname, (prefix, ''))
+                ips = []
+                for hostname, ip in self._by_hostname[start:]:
+                    if not hostname.startswith(prefix):
+                        break
+                    ips.append(ip)
+            elif sort == 'hostname':
+                ips = [ip for _, ip in self._by_hostname]
+            else:
+                ips = list(self._last_seen)
+
+            if system is not None:
+                members = self._by_system.get(system, ())
+                ips = [ip for ip in ips if ip in members]
+            if status == 'online':
+                ips = [ip for ip in ips if ip in self.online]
+            elif status == 'offline':
+                ips = [ip for ip in ips if ip not in self.online]
+
+            if sort == 'hostname':
+                # 候选列表取自按主机名有序的列表，无需再排序
+                if reverse:
+                    ips.reverse()
+            elif sort == 'last_seen':
+                ips.sort(key=self._last_seen.__getitem__, reverse=reverse)
+            elif sort == 'system':
+                ips.sort(key=lambda ip: (self._system[ip], ip), reverse=reverse)
+            else:
+                ips.sort(reverse=reverse)
+        return ips
+
+
+class CachedResponse:
+    __slots__ = ('version', 'created', 'body', 'etag', 'total')
+
+    def __init__(self, version, created, body, total):
+        self.version = version
+        self.created = created
+        self.body = body
+        self.etag = hashlib.md5(body).hexdigest()
+        self.total = total
+
+
+class ResponseCache:
+    """按查询参数缓存列表响应
+
+    数据版本（客户端加入、上线/离线等）变化后立即失效；版本不变时最多复用 ttl 秒，
+    列表中的 last_seen 随之刷新，避免高频上报时每次轮询都重新生成整个列表。
+    Flask 多线程处理请求，读写都在锁内进行。
+    """
+
+    def __init__(self, ttl=2.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version and \
+                    time.monotonic() - entry.created < self.ttl:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, key, version, body, total):
+        entry = CachedResponse(version, time.monotonic(), body, total)
+        with self.lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = entry
+        return entry
@@ -0,0 +1,112 @@
+"""基于 asyncio 的高并发上报接入服务
+
+与 probe_server 共用同一份内存存储和日志写入器：异步服务只负责 ``/report``，
+Web 控制台仍由 Flask 提供，在同一进程的后台线程中运行。
+
+    python probe_ingest.py --port 5000 --console-port 5001
+
+需要安装 aiohttp。维持数万个长连接时请同时调大进程的文件描述符上限（ulimit -n）。
+"""
+import argparse
+import asyncio
+import json
+import threading
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+import probe_server
+
+# 单次上报请求体的最大字节数
+MAX_REPORT_SIZE = 4 * 1024 * 1024
+
+
+async def run_blocking(func, *args):
+    """在默认线程池中执行写入存储的函数
+
+    存储、索引和告警都用线程锁保护，Flask 控制台的查询可能长时间持有锁，
+    直接在处理函数中调用会阻塞整个事件循环。
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def handle_report(request):
+    """接收客户端上报的数据"""
+    try:
+        data = json.loads(await request.read())
+        await run_blocking(probe_server.ingest_report, data)
+        return web.json_response({"status": "success"})
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+
+
+async def handle_report_batch(request):
+    """接收客户端批量上报的数据（可 gzip/zstd 压缩）"""
+    try:
+        samples = await run_blocking(probe_server.decode_batch, await request.read(),
+                                     request.headers.get('Content-Encoding'))
+    except (ValueError, OSError, EOFError) as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=400)
+    try:
+        count = await run_blocking(probe_server.ingest_batch, samples)
+        return web.json_response({"status": "success", "accepted": count})
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+
+
+async def handle_report_delta(request):
+    """接收增量协议的上报数据，缺少基准状态时返回 409 要求重发完整快照"""
+    try:
+        message = json.loads(await request.read())
+        body, status = await run_blocking(probe_server.ingest_delta, message)
+        return web.json_response(body, status=status)
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+
+
+def create_app():
+    """创建异步接入服务的 aiohttp 应用"""
+    if web is None:
+        raise RuntimeError('异步接入模式需要安装 aiohttp: pip install aiohttp')
+    # 由 decode_batch 统一处理 Content-Encoding，关闭 aiohttp 的自动解压
+    app = web.Application(client_max_size=MAX_REPORT_SIZE,
+                          handler_args={'auto_decompress': False})
+    app.router.add_post('/report', handle_report)
+    app.router.add_post('/report/batch', handle_report_batch)
+    app.router.add_post('/report/delta', handle_report_delta)
+    return app
+
+
+def start_console(host, port):
+    """在后台线程中运行 Flask Web 控制台"""
+    thread = threading.Thread(
+        target=probe_server.app.run,
+        kwargs={'host': host, 'port': port, 'threaded': True, 'use_reloader': False},
+        name='console',
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='探针服务端（异步接入模式）')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000, help='上报接入端口')
+    parser.add_argument('--console-port', type=int, default=5001,
+                        help='Web控制台端口，0 表示不启动')
+    parser.add_argument('--backlog', type=int, default=4096)
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.console_port:
+        start_console(args.host, args.console_port)
+        print(f"Web控制台: http://{args.host}:{args.console_port}")
+    web.run_app(app, host=args.host, port=args.port, backlog=args.backlog,
+                access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from probe_archive import ArchiveWriter
+
+
+class LogWriter:
+    """后台批量写日志
+
+    上报线程只负责把数据放入有界队列，由后台线程按条数或时间攒批写入
+    ``logs/probe_YYYYMMDD.json``。当天的文件句柄保持打开，跨天时自动切换。
+    队列满时丢弃新数据并计数，不阻塞上报请求。无法序列化的单条数据被跳过并计入
+    ``invalid``，不影响同一批的其他数据。
+
+    ``archive=True`` 时改为写入 ``probe_YYYYMMDD.seg`` 压缩段文件（见 probe_archive），
+    每批数据对应一个压缩块。
+    """
+
+    def __init__(self, log_dir='logs', prefix='probe', max_queue=10000,
+                 batch_size=500, flush_interval=1.0, archive=False):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.archive = archive
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._date_str = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.invalid = 0
+        self.errors = 0
+        self.last_error = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, data):
+        """提交一条数据，队列已满时返回 False"""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((datetime.now(), data))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stats(self):
+        """返回写入、丢弃和积压计数"""
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'pending': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+        }
+
+    def close(self, timeout=5):
+        """停止后台线程并写完队列中剩余的数据"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_file()
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    # 任何异常都只丢弃这一批，后台线程继续运行
+                    self.errors += 1
+                    self.last_error = str(e) or e.__class__.__name__
+                    print(f"写入日志失败: {self.last_error}")
+
+    def _next_batch(self):
+        """攒够 batch_size 条或等待 flush_interval 秒后返回一批数据"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        if self.archive:
+            self._write_archive(batch)
+            return
+        lines = []
+        written = 0
+        for received, data in batch:
+            try:
+                line = json.dumps(data, ensure_ascii=False) + '\n'
+            except (TypeError, ValueError) as e:
+                self._reject(e)
+                continue
+            date_str = received.strftime('%Y%m%d')
+            if date_str != self._date_str:
+                self._flush_lines(lines)
+                lines = []
+                self._open(date_str)
+            lines.append(line)
+            written += 1
+        self._flush_lines(lines)
+        self.written += written
+        self.batches += 1
+
+    def _write_archive(self, batch):
+        written = 0
+        for received, data in batch:
+            date_str = received.strftime('%Y%m%d')
+            if date_str != self._date_str:
+                self._open(date_str)
+            try:
+                self._file.append(data, received.timestamp())
+            except (TypeError, ValueError, AttributeError) as e:
+                # append 在编码成功之前不会修改缓存，跳过这一条即可
+                self._reject(e)
+                continue
+            written += 1
+        self._file.flush()
+        self.written += written
+        self.batches += 1
+
+    def _reject(self, error):
+        """跳过一条无法写入的数据"""
+        self.invalid += 1
+        self.last_error = str(error) or error.__class__.__name__
+        print(f"跳过无法写入的日志数据: {self.last_error}")
+
+    def _flush_lines(self, lines):
+        if lines:
+            self._file.write(''.join(lines))
+            self._file.flush()
+
+    def _open(self, date_str):
+        self._close_file()
+        os.makedirs(self.log_dir, exist_ok=True)
+        if self.archive:
+            filename = os.path.join(self.log_dir, f"{self.prefix}_{date_str}.seg")
+            self._file = ArchiveWriter(filename, block_records=self.batch_size + 1)
+        else:
+            filename = os.path.join(self.log_dir, f"{self.prefix}_{date_str}.json")
+            self._file = open(filename, 'a', encoding='utf-8')
+        self._date_str = date_str
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._date_str = None
@@ -0,0 +1,174 @@
+"""Prometheus 文本格式（0.0.4）输出
+
+每个客户端的数据渲染成各指标族的文本片段并缓存，抓取时只渲染有新上报的客户端，
+再按指标族拼接已序列化好的片段，不会对全部客户端重新格式化。
+"""
+import gzip
+import math
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (分组, 字段, 指标名, 类型, 说明)
+FIELDS = (
+    ('cpu', 'cpu_count', 'probe_cpu_count', 'gauge', 'CPU 核心数'),
+    ('cpu', 'cpu_freq_current', 'probe_cpu_frequency_mhz', 'gauge', '当前 CPU 频率（MHz）'),
+    ('cpu', 'cpu_freq_max', 'probe_cpu_frequency_max_mhz', 'gauge', '最大 CPU 频率（MHz）'),
+    ('memory', 'memory_total', 'probe_memory_total_gigabytes', 'gauge', '物理内存总量（GB）'),
+    ('memory', 'memory_used', 'probe_memory_used_gigabytes', 'gauge', '已用物理内存（GB）'),
+    ('memory', 'memory_percent', 'probe_memory_usage_percent', 'gauge', '内存使用率'),
+    ('memory', 'swap_total', 'probe_swap_total_gigabytes', 'gauge', '交换分区总量（GB）'),
+    ('memory', 'swap_used', 'probe_swap_used_gigabytes', 'gauge', '已用交换分区（GB）'),
+    ('memory', 'swap_percent', 'probe_swap_usage_percent', 'gauge', '交换分区使用率'),
+    ('network', 'bytes_sent', 'probe_network_sent_megabytes_total', 'counter', '累计发送（MB）'),
+    ('network', 'bytes_recv', 'probe_network_received_megabytes_total', 'counter', '累计接收（MB）'),
+    ('network', 'packets_sent', 'probe_network_packets_sent_total', 'counter', '累计发送包数'),
+    ('network', 'packets_recv', 'probe_network_packets_received_total', 'counter', '累计接收包数'),
+    ('network', 'connections', 'probe_network_connections', 'gauge', 'TCP/UDP 连接数'),
+)
+# 分区字段 -> (指标名, 说明)
+DISK_FIELDS = (
+    ('total_size', 'probe_disk_total_gigabytes', '分区总容量（GB）'),
+    ('used', 'probe_disk_used_gigabytes', '分区已用容量（GB）'),
+    ('free', 'probe_disk_free_gigabytes', '分区可用容量（GB）'),
+    ('percent', 'probe_disk_usage_percent', '分区使用率'),
+)
+CPU_USAGE = 'probe_cpu_usage_percent'
+CONNECTION_STATES = 'probe_network_connection_states'
+LAST_SEEN = 'probe_last_seen_timestamp_seconds'
+
+FAMILIES = (
+    ((CPU_USAGE, 'gauge', '各核心 CPU 使用率'),) +
+    tuple((name, kind, help_text) for _, _, name, kind, help_text in FIELDS) +
+    tuple((name, 'gauge', help_text) for _, name, help_text in DISK_FIELDS) +
+    ((CONNECTION_STATES, 'gauge', '按协议和状态统计的连接数'),
+     (LAST_SEEN, 'gauge', '最后一次上报的时间'))
+)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(base, **extra):
+    if not extra:
+        return '{' + base + '}'
+    return '{' + base + ',' + ','.join(f'{key}="{escape_label(value)}"'
+                                       for key, value in extra.items()) + '}'
+
+
+def _number(value):
+    return type(value) in (int, float)
+
+
+def format_value(value):
+    """样本值的文本表示，NaN 和正负无穷按规范写成 NaN、+Inf、-Inf"""
+    if type(value) is float:
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+    return str(value)
+
+
+def render_report(data, ts=None):
+    """把一条上报数据渲染为 {指标族: 文本片段}，每个片段包含该客户端的全部样本行"""
+    base = f'ip="{escape_label(data.get("ip", ""))}",' \
+           f'hostname="{escape_label(data.get("hostname") or "")}"'
+    lines = {}
+
+    def add(family, value, **extra):
+        lines.setdefault(family, []).append(
+            f'{family}{_labels(base, **extra)} {format_value(value)}\n')
+
+    cpu = data.get('cpu') or {}
+    per_core = cpu.get('cpu_percent')
+    if isinstance(per_core, (list, tuple)):
+        for i, value in enumerate(per_core):
+            if _number(value):
+                add(CPU_USAGE, value, cpu=i)
+    elif _number(per_core):
+        add(CPU_USAGE, per_core, cpu='total')
+
+    for section, key, family, _, _ in FIELDS:
+        value = (data.get(section) or {}).get(key)
+        if _number(value):
+            add(family, value)
+
+    for partition in data.get('disk') or ():
+        mountpoint = partition.get('mountpoint')
+        if mountpoint is None:
+            continue
+        for key, family, _ in DISK_FIELDS:
+            value = partition.get(key)
+            if _number(value):
+                add(family, value, mountpoint=mountpoint, device=partition.get('device') or '')
+
+    states = (data.get('network') or {}).get('connection_states') or {}
+    for proto, counts in states.items():
+        for state, count in counts.items():
+            add(CONNECTION_STATES, count, proto=proto, state=state)
+
+    if ts is not None:
+        add(LAST_SEEN, round(ts, 3))
+    return {family: ''.join(text).encode('utf-8') for family, text in lines.items()}
+
+
+def render_families(fragments):
+    """按指标族顺序加上 HELP/TYPE 行拼接输出，fragments 为 {指标族: [片段]}"""
+    parts = []
+    for family, kind, help_text in FAMILIES:
+        chunks = fragments.get(family)
+        if chunks:
+            parts.append(f'# HELP {family} {help_text}\n# TYPE {family} {kind}\n'.encode('utf-8'))
+            parts.extend(chunks)
+    return b''.join(parts)
+
+
+class ExpositionBuffer:
+    """所有客户端最新数据的 Prometheus 文本缓存
+
+    ``update`` 只登记客户端的最新数据；抓取时仅重新渲染上次抓取之后有更新的
+    客户端，其余客户端直接复用已序列化的片段。两次抓取之间没有新上报时
+    直接返回上一次的结果（及其 gzip 压缩版本）。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._fragments = {family: {} for family, _, _ in FAMILIES}
+        self._pending = {}  # ip -> (上报数据, 时间戳)，等待渲染
+        self._last_ts = {}
+        self._cached = None  # (文本, gzip 文本)
+
+    def __len__(self):
+        return len(self._last_ts)
+
+    def update(self, ip, data, ts):
+        with self.lock:
+            if ts < self._last_ts.get(ip, ts):
+                return  # 补传的旧样本
+            self._last_ts[ip] = ts
+            self._pending[ip] = (data, ts)
+
+    def render(self, compress=False):
+        """返回完整的输出文本，compress 为 True 时返回 gzip 压缩后的内容"""
+        with self.lock:
+            pending, self._pending = self._pending, {}
+            for ip, (data, ts) in pending.items():
+                fragments = render_report(data, ts)
+                for family, table in self._fragments.items():
+                    fragment = fragments.get(family)
+                    if fragment is not None:
+                        table[ip] = fragment
+                    else:
+                        table.pop(ip, None)
+
+            if pending or self._cached is None:
+                body = render_families({family: table.values()
+                                        for family, table in self._fragments.items()})
+                self._cached = (body, None)
+            body, compressed = self._cached
+            if compress and compressed is None:
+                compressed = gzip.compress(body, compresslevel=1)
+                self._cached = (body, compressed)
+        return compressed if compress else body
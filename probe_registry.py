@@ -0,0 +1,271 @@
+"""可插拔的指标采集器注册表
+
+每个指标组（cpu、memory、disk ...）是一个采集器插件，注册时只记录
+``'模块:类名'``，启用时才导入，未配置的采集器（及其依赖）不会在启动时加载。
+SystemMonitor 和 ProbeClient 都通过 CollectorSet 采集。
+
+第三方采集器继承 Collector 并注册::
+
+    from probe_registry import Collector, register
+
+    @register('gpu')
+    class GpuCollector(Collector):
+        interval = 10      # 默认刷新间隔（秒）
+        budget = 0.2       # 单次采集的耗时预算（秒）
+
+        def collect(self):
+            return {...}
+
+或在 setup.py 中声明入口点（无需修改本项目）::
+
+    entry_points={'probe.collectors': ['gpu = my_package.gpu:GpuCollector']}
+"""
+import importlib
+import time
+
+# 第三方采集器的入口点分组
+ENTRY_POINT_GROUP = 'probe.collectors'
+# 超出耗时预算时最多跳过的采集轮数（按 1、2、4 ... 递增）
+MAX_BACKOFF = 16
+
+
+class Collector:
+    """采集器基类
+
+    子类实现 collect()，返回可 JSON 序列化的数据。构造参数来自配置中
+    该采集器除 enabled/interval/budget 以外的项。
+    """
+    interval = 0  # 默认刷新间隔（秒），0 表示每次都采集
+    budget = None  # 单次采集的耗时预算（秒），超出时降低采集频率
+
+    def collect(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CollectorRegistry:
+    """名称 -> 采集器类（或 '模块:类名'，首次使用时导入）"""
+
+    def __init__(self):
+        self._entries = {}
+        self._discovered = False
+
+    def register(self, name, collector=None):
+        """注册采集器，可直接调用或作为类装饰器使用"""
+        if collector is None:
+            def decorator(cls):
+                self._entries[name] = cls
+                return cls
+            return decorator
+        self._entries[name] = collector
+        return collector
+
+    def names(self):
+        self.discover()
+        return sorted(self._entries)
+
+    def discover(self):
+        """加载通过入口点声明的第三方采集器（只登记，不导入）"""
+        if self._discovered:
+            return
+        self._discovered = True
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:  # Python 3.8 以前
+            return
+        eps = entry_points()
+        group = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') \
+            else eps.get(ENTRY_POINT_GROUP, ())
+        for ep in group:
+            self._entries.setdefault(ep.name, ep.value)
+
+    def load(self, name):
+        """返回采集器类，按需导入"""
+        entry = self._entries.get(name)
+        if entry is None:
+            self.discover()
+            entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f'未注册的采集器: {name}')
+        if isinstance(entry, str):
+            module, _, attr = entry.partition(':')
+            entry = getattr(importlib.import_module(module), attr)
+            self._entries[name] = entry
+        return entry
+
+
+REGISTRY = CollectorRegistry()
+register = REGISTRY.register
+
+for _name, _spec in (('cpu', 'CpuCollector'), ('memory', 'MemoryCollector'),
+                     ('disk', 'DiskCollector'), ('network', 'NetworkCollector'),
+                     ('top_processes', 'ProcessCollector'), ('sensors', 'SensorsCollector'),
+                     ('cgroup', 'CgroupCollector')):
+    REGISTRY.register(_name, 'probe_collectors:' + _spec)
+
+
+class ScheduledCollector:
+    """按间隔和耗时预算运行一个采集器
+
+    未到刷新时间时返回上一次的结果，刷新时间按固定的时间表推进。单次采集超过预算时跳过之后的 1、2、4 ...
+    轮（最多 MAX_BACKOFF 轮），恢复到预算以内后逐步减半。采集出错时保留上一次
+    的结果并计数，不影响其他采集器。
+    """
+
+    def __init__(self, name, collector, interval, budget):
+        self.name = name
+        self.collector = collector
+        self.interval = interval
+        self.budget = budget
+        self.value = None
+        self.calls = 0
+        self.errors = 0
+        self.over_budget = 0
+        self.total_time = 0.0
+        self.last_duration = None
+        self.last_error = None
+        self.backoff = 1
+        self._skip = 0
+        self._expires = None
+
+    @property
+    def expires(self):
+        """下一次应采集的单调时钟时间，每次都采集的返回 None"""
+        return self._expires if self.interval > 0 else None
+
+    def _advance(self, now):
+        """按时间表推进到下一个采集时间点，落后超过一个周期时跳到 now 之后的时间点"""
+        if self.interval <= 0:
+            return
+        if self._expires is None:
+            self._expires = now
+        self._expires += self.interval
+        if self._expires <= now:
+            self._expires += (int((now - self._expires) // self.interval) + 1) * self.interval
+
+    def get(self, tolerance=0.0):
+        """到期时采集，否则返回上一次的结果
+
+        采集时间点固定为第一次采集时间加整数个周期，不随实际采集时间漂移。
+        距下一个时间点不超过 tolerance 秒（最多半个周期）时提前采集，避免调用方的
+        循环因抖动略早于时间点醒来而拿到过期的结果。
+        """
+        now = time.monotonic()
+        tolerance = min(tolerance, self.interval / 2)
+        if self._expires is not None and now < self._expires - tolerance:
+            return self.value
+        self._advance(now)
+        if self._skip:
+            self._skip -= 1
+            return self.value
+        start = time.perf_counter()
+        try:
+            self.value = self.collector.collect()
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e) or e.__class__.__name__
+        duration = time.perf_counter() - start
+        self.calls += 1
+        self.total_time += duration
+        self.last_duration = duration
+        if self.budget is not None and duration > self.budget:
+            self.over_budget += 1
+            if self.backoff == 1:
+                print(f"采集器 {self.name} 耗时 {duration * 1000:.0f}ms，"
+                      f"超出预算 {self.budget * 1000:.0f}ms，降低采集频率")
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+            self._skip = self.backoff - 1
+        elif self.backoff > 1:
+            self.backoff //= 2
+            self._skip = self.backoff - 1
+        return self.value
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'budget': self.budget,
+            'calls': self.calls,
+            'errors': self.errors,
+            'over_budget': self.over_budget,
+            'backoff': self.backoff,
+            'avg_ms': round(self.total_time / self.calls * 1000, 2) if self.calls else None,
+            'last_ms': round(self.last_duration * 1000, 2) if self.last_duration is not None
+            else None,
+            'last_error': self.last_error,
+        }
+
+
+class CollectorSet:
+    """按配置启用的一组采集器
+
+    Args:
+        defaults: 使用方默认启用的采集器名称
+        config: 采集器配置。可以是名称列表（只启用这些），或
+            {名称: False | True | {'enabled':, 'interval':, 'budget':, 其他构造参数}}，
+            在 defaults 的基础上增减
+        metric_intervals: 旧的刷新间隔配置 {名称: 秒}
+        registry: 采集器注册表
+    """
+
+    def __init__(self, defaults, config=None, metric_intervals=None, registry=REGISTRY):
+        if isinstance(config, (list, tuple, set)):
+            config = {name: True for name in config}
+            defaults = ()
+        config = dict(config or {})
+        names = [name for name in defaults if config.get(name, True) is not False]
+        names += [name for name in config if name not in names and config[name] is not False]
+
+        self.registry = registry
+        # collect() 时距下一个采集时间点不超过该秒数的采集器提前采集，
+        # 由采集循环设为循环周期的一半
+        self.tolerance = 0.0
+        self.collectors = {}
+        self._on_demand = {}
+        for name in names:
+            options = config.get(name)
+            options = dict(options) if isinstance(options, dict) else {}
+            if options.pop('enabled', True) is False:
+                continue
+            cls = registry.load(name)
+            interval = options.pop('interval', None)
+            if interval is None:
+                interval = (metric_intervals or {}).get(name, cls.interval)
+            budget = options.pop('budget', cls.budget)
+            self.collectors[name] = ScheduledCollector(name, cls(**options), interval, budget)
+
+    def __contains__(self, name):
+        return name in self.collectors
+
+    def collect(self):
+        """采集所有启用的指标组，返回 {名称: 数据}"""
+        return {name: scheduled.get(self.tolerance)
+                for name, scheduled in self.collectors.items()}
+
+    def next_due(self):
+        """最早到期的采集器的采集时间（单调时钟），都是每次采集的返回 None"""
+        deadlines = [scheduled.expires for scheduled in self.collectors.values()
+                     if scheduled.expires is not None]
+        return min(deadlines) if deadlines else None
+
+    def refresh(self):
+        """只运行已到期的定时采集器，结果留到下一次 collect() 返回"""
+        for scheduled in self.collectors.values():
+            if scheduled.expires is not None:
+                scheduled.get()
+
+    def get(self, name):
+        """采集单个指标组；未启用的采集器按默认参数创建，之后复用"""
+        scheduled = self.collectors.get(name) or self._on_demand.get(name)
+        if scheduled is None:
+            cls = self.registry.load(name)
+            scheduled = self._on_demand[name] = ScheduledCollector(name, cls(), 0, None)
+        return scheduled.get()
+
+    def stats(self):
+        return {name: scheduled.stats() for name, scheduled in self.collectors.items()}
+
+    def close(self):
+        for scheduled in list(self.collectors.values()) + list(self._on_demand.values()):
+            scheduled.collector.close()
@@ -0,0 +1,192 @@
+from array import array
+
+# 默认的降采样级别：(粒度秒数, 保留桶数)
+DEFAULT_LEVELS = (
+    (60, 360),     # 1分钟粒度，保留6小时
+    (300, 576),    # 5分钟粒度，保留2天
+    (3600, 336),   # 1小时粒度，保留14天
+)
+
+INF = float('inf')
+
+
+def level_name(step):
+    """把粒度秒数转为 1m/5m/1h 形式的名称"""
+    if step % 3600 == 0:
+        return f"{step // 3600}h"
+    if step % 60 == 0:
+        return f"{step // 60}m"
+    return f"{step}s"
+
+
+class RollupLevel:
+    """单一粒度的增量聚合环
+
+    每个时间桶记录 count/sum/min/max，桶下标由时间戳直接计算，
+    写入时遇到旧桶即就地重置，不需要扫描历史数据。
+    """
+
+    __slots__ = ('step', 'size', 'starts', 'columns', 'first')
+
+    def __init__(self, step, size):
+        self.step = step
+        self.size = size
+        self.starts = array('d', [-INF]) * size
+        self.columns = {}
+        self.first = None  # 写入过的最早时间槽
+
+    def _column(self, name):
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = (
+                array('I', [0]) * self.size,   # count
+                array('d', [0.0]) * self.size,  # sum
+                array('d', [0.0]) * self.size,  # min
+                array('d', [0.0]) * self.size,  # max
+            )
+        return column
+
+    def add(self, ts, values):
+        slot = int(ts // self.step)
+        bucket = slot * self.step
+        idx = slot % self.size
+        start = self.starts[idx]
+        if bucket < start:
+            return  # 迟到的数据所在的桶已被覆盖
+        if bucket > start:
+            self.starts[idx] = bucket
+            for counts, _, _, _ in self.columns.values():
+                counts[idx] = 0
+        if self.first is None or slot < self.first:
+            self.first = slot
+
+        columns = self.columns
+        for name, value in values.items():
+            if value != value:  # NaN
+                continue
+            column = columns.get(name)
+            if column is None:
+                column = self._column(name)
+            counts, sums, mins, maxs = column
+            if counts[idx] == 0:
+                counts[idx] = 1
+                sums[idx] = mins[idx] = maxs[idx] = value
+            else:
+                counts[idx] += 1
+                sums[idx] += value
+                if value < mins[idx]:
+                    mins[idx] = value
+                if value > maxs[idx]:
+                    maxs[idx] = value
+
+    def will_evict(self, ts):
+        """写入时间 ts 的数据是否会覆盖写入过的最早的桶"""
+        return self.first is not None and int(ts // self.step) - self.first >= self.size
+
+    def absorb(self, finer):
+        """合并更细粒度级别中保存的全部桶（粒度须整除本级别），用于按需创建时补齐历史"""
+        for idx in sorted(range(finer.size), key=finer.starts.__getitem__):
+            start = finer.starts[idx]
+            if start == -INF:
+                continue
+            slot = int(start // self.step)
+            bucket = slot * self.step
+            target = slot % self.size
+            if bucket < self.starts[target]:
+                continue
+            if bucket > self.starts[target]:
+                self.starts[target] = bucket
+                for counts, _, _, _ in self.columns.values():
+                    counts[target] = 0
+            if self.first is None or slot < self.first:
+                self.first = slot
+            for name, (counts, sums, mins, maxs) in finer.columns.items():
+                count = counts[idx]
+                if not count:
+                    continue
+                to_counts, to_sums, to_mins, to_maxs = self._column(name)
+                if to_counts[target] == 0:
+                    to_counts[target] = count
+                    to_sums[target] = sums[idx]
+                    to_mins[target] = mins[idx]
+                    to_maxs[target] = maxs[idx]
+                else:
+                    to_counts[target] += count
+                    to_sums[target] += sums[idx]
+                    to_mins[target] = min(to_mins[target], mins[idx])
+                    to_maxs[target] = max(to_maxs[target], maxs[idx])
+
+    def oldest(self):
+        """返回仍保留的最早桶的起始时间"""
+        valid = [s for s in self.starts if s != -INF]
+        return min(valid) if valid else None
+
+    def buckets(self, name, start, end):
+        """按时间升序返回 [(桶起始, count, sum, min, max)]"""
+        column = self.columns.get(name)
+        if column is None:
+            return []
+        counts, sums, mins, maxs = column
+        first = int(start // self.step)
+        last = int(end // self.step)
+        if last - first >= self.size:
+            first = last - self.size + 1
+        result = []
+        for slot in range(first, last + 1):
+            idx = slot % self.size
+            if self.starts[idx] == slot * self.step and counts[idx]:
+                result.append((slot * self.step, counts[idx], sums[idx], mins[idx], maxs[idx]))
+        return result
+
+
+def downsample(buckets, step):
+    """把 (起始, count, sum, min, max) 序列再聚合到 step 秒的桶"""
+    points = []
+    current = None
+    for ts, count, total, low, high in buckets:
+        bucket = (ts // step) * step
+        if current is None or current[0] != bucket:
+            current = [bucket, 0, 0.0, INF, -INF]
+            points.append(current)
+        current[1] += count
+        current[2] += total
+        current[3] = min(current[3], low)
+        current[4] = max(current[4], high)
+    return [{
+        't': ts,
+        'avg': round(total / count, 4),
+        'min': round(low, 4),
+        'max': round(high, 4),
+        'count': count,
+    } for ts, count, total, low, high in points]
+
+
+def query_series(client, name, start, end, step=None):
+    """查询客户端某指标在 [start, end] 的时序数据
+
+    原始环形缓冲区覆盖起始时间且 step 小于最细聚合粒度时直接使用原始数据，
+    否则从聚合级别中选择。聚合级别按需创建，尚未创建的级别所需的数据都还在
+    更细的级别（或原始数据）中。
+    返回 (分辨率名称, 实际步长, 数据点列表)。
+    """
+    raw_covers = client.size < client.capacity or client.oldest() <= start
+    if not client.rollups or (raw_covers and (step is None or step < client.rollups[0].step)):
+        raw = client.series(name, start, end)
+        if step is None:
+            return 'raw', None, [{'t': ts, 'value': value} for ts, value in raw]
+        return 'raw', step, downsample([(ts, 1, v, v, v) for ts, v in raw], step)
+
+    if step is not None:
+        # 不超过 step 的最粗粒度，扫描的桶最少且保留时间最长
+        candidates = [level for level in client.rollups if level.step <= step]
+        chosen = candidates[-1] if candidates else client.rollups[0]
+    else:
+        # 覆盖起始时间的最细粒度，都覆盖不到时用最粗的一级
+        chosen = client.rollups[-1]
+        for level in client.rollups:
+            oldest = level.oldest()
+            if oldest is not None and oldest <= start:
+                chosen = level
+                break
+    step = max(step or chosen.step, chosen.step)
+    return level_name(chosen.step), step, downsample(chosen.buckets(name, start, end), step)
@@ -1,18 +1,76 @@
-from flask import Flask, request, jsonify, session, redirect, url_for
-import json
+from flask import Flask, Response, request, jsonify, session, redirect, url_for
 from datetime import datetime
+import gzip
+import io
+import json
 import os
-from collections import defaultdict
 from functools import wraps
 import hashlib
+import hmac
+from probe_store import MetricStore
+from probe_logger import LogWriter
+from probe_archive import record_timestamp
+from probe_delta import DeltaDecoder, ResyncRequired
+from probe_events import Broadcaster
+from probe_index import ClientIndex, ResponseCache
+from probe_fleet import FleetMatrix, DEFAULT_METRICS, DEFAULT_PERCENTILES, np
+from probe_prometheus import ExpositionBuffer, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from probe_alerts import AlertEngine, AlertDispatcher, PrintNotifier, EmailNotifier, load_rules
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # 请修改为随机的密钥
 
-# 存储所有客户端数据
-clients_data = defaultdict(list)
-# 存储客户端最后上报时间
-clients_last_seen = {}
+# 每个客户端保留的历史样本数
+HISTORY_SIZE = int(os.environ.get('PROBE_HISTORY_SIZE', 100))
+
+# /fleet/summary 可统计的全局指标，全局统计矩阵只为这些指标分配列
+FLEET_METRICS = DEFAULT_METRICS
+# 存储所有客户端数据（按列存放的环形缓冲区），安装了 numpy 时同时维护全局统计矩阵
+clients_data = MetricStore(capacity=HISTORY_SIZE,
+                           fleet=FleetMatrix(metrics=FLEET_METRICS) if np is not None else None)
+# 网站监控（website_monitor.SiteMonitor）的检查结果，与主机分开存放：
+# 不出现在客户端列表中，不参与离线告警和全局统计
+SITE_SYSTEM = 'website'
+sites_data = MetricStore(capacity=HISTORY_SIZE)
+# 增量上报协议中各客户端的最近完整状态
+delta_decoder = DeltaDecoder()
+# 超过多少秒未上报视为离线
+OFFLINE_AFTER = 180
+# 客户端列表索引（在线状态、主机名、系统），随上报增量维护
+client_index = ClientIndex(offline_after=OFFLINE_AFTER)
+# /clients 响应缓存，数据变化后最多复用的秒数
+CLIENTS_CACHE_TTL = 2.0
+clients_cache = ResponseCache(ttl=CLIENTS_CACHE_TTL)
+# 批量上报解压后的最大字节数
+MAX_BATCH_SIZE = 64 * 1024 * 1024
+# 后台批量写入上报日志，PROBE_LOG_FORMAT=archive 时写入压缩段文件
+log_writer = LogWriter(log_dir='logs',
+                       archive=os.environ.get('PROBE_LOG_FORMAT', 'json') == 'archive')
+
+# Prometheus /metrics 输出缓存
+metrics_buffer = ExpositionBuffer()
+# /metrics 的访问令牌，Prometheus 以 Authorization: Bearer <令牌> 抓取；
+# 未设置时只有已登录的管理员可以访问
+METRICS_TOKEN = os.environ.get('PROBE_METRICS_TOKEN')
+# 告警规则（语法见 probe_alerts），PROBE_ALERT_RULES 可指定规则文件（每行一条）
+ALERT_RULES = [
+    'memory.memory_percent > 90 for 5m',
+    'disk.*.percent > 90',
+    'host offline > 3m',
+]
+# 告警邮件配置（字段同 website_monitor.monitor_website 的 email_config），为 None 时只打印
+ALERT_EMAIL_CONFIG = None
+alert_dispatcher = AlertDispatcher(
+    [PrintNotifier()] + ([EmailNotifier(ALERT_EMAIL_CONFIG)] if ALERT_EMAIL_CONFIG else []))
+alert_engine = AlertEngine(
+    load_rules(os.environ['PROBE_ALERT_RULES']) if os.environ.get('PROBE_ALERT_RULES')
+    else ALERT_RULES,
+    alert_dispatcher)
 
 # 管理员配置
 ADMIN_CONFIG = {
@@ -173,59 +231,336 @@ def change_password():
     </html>
     '''
 
+def client_summary(client):
+    """客户端列表中的一项，在线状态取自 client_index"""
+    return {
+        'ip': client.ip,
+        'hostname': client.hostname,
+        'system': client.system,
+        'last_seen': client.last_seen.strftime('%Y-%m-%d %H:%M:%S'),
+        'last_seen_ts': client.last_seen.timestamp(),
+        'status': '在线' if client_index.is_online(client.ip) else '离线'
+    }
+
+def build_client_updates(ips):
+    """汇总一批发生变化的客户端，作为推送事件的内容"""
+    now = datetime.now().timestamp()
+    ips = set(ips)
+    ips.update(client_index.sweep(now))
+    clients = []
+    for ip in ips:
+        client = clients_data.get(ip)
+        if client is not None:
+            clients.append(client_summary(client))
+    return {'server_time': now, 'clients': clients}
+
+# 向所有打开的控制台推送客户端变化
+broadcaster = Broadcaster(build_client_updates)
+
+def ingest_report(data, ts=None):
+    """处理一条上报数据（Flask 与异步接入服务共用）"""
+    if data.get('system') == SITE_SYSTEM:
+        sites_data.add(data, ts)
+        save_to_file(data)
+        return
+    client = clients_data.add(data, ts)
+    last_seen = client.last_seen.timestamp()
+    client_index.update(client.ip, client.hostname, client.system, last_seen)
+    alert_engine.observe(client.ip, client.hostname, client.values, last_seen)
+    metrics_buffer.update(client.ip, data, last_seen)
+    save_to_file(data)
+    broadcaster.mark(client.ip)
+
+def decode_batch(body, encoding=None):
+    """按 Content-Encoding（gzip/zstd/identity）解压批量上报数据，返回样本列表"""
+    encoding = (encoding or 'identity').lower()
+    if encoding == 'gzip':
+        reader = gzip.GzipFile(fileobj=io.BytesIO(body))
+    elif encoding == 'zstd':
+        if zstandard is None:
+            raise ValueError('服务端未安装 zstandard，无法解压 zstd 数据')
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+    elif encoding == 'identity':
+        reader = io.BytesIO(body)
+    else:
+        raise ValueError(f"不支持的压缩方式: {encoding}")
+
+    raw = reader.read(MAX_BATCH_SIZE + 1)
+    if len(raw) > MAX_BATCH_SIZE:
+        raise ValueError('批量数据过大')
+    samples = json.loads(raw)
+    if not isinstance(samples, list):
+        raise ValueError('批量数据必须是数组')
+    return samples
+
+def ingest_batch(samples):
+    """按样本自身的采集时间写入一批上报数据，返回条数"""
+    now = datetime.now().timestamp()
+    for data in samples:
+        ingest_report(data, record_timestamp(data, default=now))
+    return len(samples)
+
+def ingest_delta(message):
+    """处理一条增量协议上报，返回 (响应内容, HTTP状态码)"""
+    try:
+        data = delta_decoder.decode(message)
+    except ResyncRequired:
+        return {"status": "resync"}, 409
+    ingest_report(data)
+    return {"status": "success", "seq": message['seq']}, 200
+
 @app.route('/report', methods=['POST'])
 def report():
     """接收客户端上报的数据"""
     try:
         data = request.get_json()
-        client_ip = data['ip']
-        
-        clients_data[client_ip].append(data)
-        if len(clients_data[client_ip]) > 100:
-            clients_data[client_ip].pop(0)
-            
-        clients_last_seen[client_ip] = datetime.now()
-        
-        save_to_file(data)
+        ingest_report(data)
         
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/report/batch', methods=['POST'])
+def report_batch():
+    """接收客户端批量上报的数据（可 gzip/zstd 压缩）"""
+    try:
+        samples = decode_batch(request.get_data(), request.headers.get('Content-Encoding'))
+    except (ValueError, OSError, EOFError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        count = ingest_batch(samples)
+        return jsonify({"status": "success", "accepted": count})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/report/delta', methods=['POST'])
+def report_delta():
+    """接收增量协议的上报数据，缺少基准状态时返回 409 要求重发完整快照"""
+    try:
+        body, status = ingest_delta(request.get_json())
+        return jsonify(body), status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """以 Prometheus 文本格式输出所有客户端的最新数据
+
+    Prometheus 使用 METRICS_TOKEN 作为 Bearer 令牌抓取，已登录的管理员也可以直接访问。
+    """
+    if 'logged_in' not in session:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if not METRICS_TOKEN or scheme.lower() != 'bearer' or \
+                not hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode()):
+            return Response('unauthorized\n', status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer realm="probe"'})
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = Response(metrics_buffer.render(compress=compress), mimetype=None,
+                        content_type=METRICS_CONTENT_TYPE)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 @app.route('/clients', methods=['GET'])
 @login_required
 def get_clients():
-    """获取所有客户端列表"""
-    clients = []
-    for ip, last_seen in clients_last_seen.items():
-        latest_data = clients_data[ip][-1] if clients_data[ip] else None
-        if latest_data:
-            clients.append({
-                'ip': ip,
-                'hostname': latest_data['hostname'],
-                'system': latest_data['system'],
-                'last_seen': last_seen.strftime('%Y-%m-%d %H:%M:%S'),
-                'status': '在线' if (datetime.now() - last_seen).seconds < 180 else '离线'
-            })
-    return jsonify(clients)
+    """获取客户端列表
+
+    参数：status（online/offline）、hostname（主机名前缀）、system、
+    sort（ip/hostname/system/last_seen，前缀 - 表示倒序）、page 与 per_page（可选分页）。
+    总数在 X-Total-Count 响应头中；支持 If-None-Match 条件请求。
+    """
+    args = request.args
+    status = args.get('status')
+    sort = args.get('sort', 'ip')
+    page = args.get('page', 1, type=int)
+    per_page = args.get('per_page', type=int)
+    if status not in (None, 'online', 'offline'):
+        return jsonify({"error": "status must be online or offline"}), 400
+    if page < 1 or (per_page is not None and per_page < 1):
+        return jsonify({"error": "page and per_page must be positive"}), 400
+
+    key = request.query_string
+    client_index.sweep()
+    entry = clients_cache.get(key, client_index.version)
+    if entry is None:
+        version = client_index.version
+        try:
+            ips = client_index.query(status=status, prefix=args.get('hostname'),
+                                     system=args.get('system'), sort=sort.lstrip('-'),
+                                     reverse=sort.startswith('-'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        total = len(ips)
+        if per_page is not None:
+            ips = ips[(page - 1) * per_page:page * per_page]
+        clients = []
+        for ip in ips:
+            client = clients_data.get(ip)
+            if client is not None:
+                clients.append(client_summary(client))
+        body = json.dumps(clients, ensure_ascii=False).encode('utf-8')
+        entry = clients_cache.put(key, version, body, total)
+
+    headers = {'ETag': f'"{entry.etag}"', 'X-Total-Count': str(entry.total),
+               'Cache-Control': f'private, max-age={int(CLIENTS_CACHE_TTL)}'}
+    if entry.etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(entry.body, mimetype='application/json', headers=headers)
+
+@app.route('/clients/history', methods=['GET'])
+@login_required
+def clients_history():
+    """最近的上线/离线记录（按时间倒序），参数：ip、limit"""
+    limit = request.args.get('limit', type=int)
+    client_index.sweep()
+    return jsonify([
+        {'time': datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'),
+         'ts': ts, 'ip': ip, 'status': status}
+        for ts, ip, status in client_index.history(request.args.get('ip'), limit)
+    ])
+
+@app.route('/fleet/summary', methods=['GET'])
+@login_required
+def fleet_summary():
+    """全体客户端最新样本的统计
+
+    参数：metric（可重复，取值见 FLEET_METRICS，默认 CPU/内存/交换分区/最满磁盘分区使用率）、
+    percentiles（逗号分隔）、top（top-K 主机数）、bins（直方图分桶数）、
+    max_age（只统计最近多少秒内上报过的客户端）
+    """
+    fleet = clients_data.fleet
+    if fleet is None:
+        return jsonify({"error": "fleet summary requires numpy"}), 501
+    args = request.args
+    try:
+        percentiles = [float(p) for p in args.get('percentiles', '').split(',') if p] \
+            or DEFAULT_PERCENTILES
+        top = args.get('top', 10, type=int)
+        bins = args.get('bins', 10, type=int)
+        max_age = args.get('max_age', type=float)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not all(0 <= p <= 100 for p in percentiles):
+        return jsonify({"error": "percentiles must be between 0 and 100"}), 400
+    if top < 0 or bins < 0 or top > 1000 or bins > 1000:
+        return jsonify({"error": "top and bins must be between 0 and 1000"}), 400
+
+    result = fleet.summary(args.getlist('metric') or DEFAULT_METRICS, percentiles,
+                           top=top, bins=bins, max_age=max_age)
+    return jsonify(result)
+
+@app.route('/alerts', methods=['GET'])
+@login_required
+def get_alerts():
+    """获取当前处于告警状态的规则"""
+    return jsonify([
+        {'rule': rule, 'ip': ip, 'metric': metric, 'since': since}
+        for rule, ip, metric, since in alert_engine.active()
+    ])
+
+@app.route('/events', methods=['GET'])
+@login_required
+def events():
+    """以 Server-Sent Events 推送客户端变化"""
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(broadcaster.stream(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/client/<ip>', methods=['GET'])
 @login_required
 def get_client_data(ip):
     """获取指定客户端的详细数据"""
-    if ip in clients_data:
-        return jsonify(clients_data[ip][-1])
+    client = clients_data.get(ip)
+    if client is not None:
+        return jsonify(client.latest)
     return jsonify({"error": "Client not found"}), 404
 
+def parse_time_arg(value, default):
+    """解析时间参数，支持时间戳或 YYYY-mm-dd HH:MM:SS 格式"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp()
+
+def series_response(store, ip):
+    """按请求参数查询 store 中某个客户端（或网站）的指标历史，返回 Flask 响应"""
+    metric = request.args.get('metric')
+    if not metric:
+        return jsonify({"error": "metric is required"}), 400
+    try:
+        end = parse_time_arg(request.args.get('to'), datetime.now().timestamp())
+        start = parse_time_arg(request.args.get('from'), end - 3600)
+        step = request.args.get('step', type=int)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if step is not None and step <= 0:
+        return jsonify({"error": "step must be positive"}), 400
+
+    result = store.query(ip, metric, start, end, step)
+    if result is None:
+        return jsonify({"error": "Client not found"}), 404
+    resolution, step, points = result
+    return jsonify({
+        'ip': ip,
+        'metric': metric,
+        'from': start,
+        'to': end,
+        'resolution': resolution,
+        'step': step,
+        'points': points
+    })
+
+@app.route('/client/<ip>/series', methods=['GET'])
+@login_required
+def get_client_series(ip):
+    """获取指定客户端某个指标的历史数据
+
+    参数：metric（如 cpu.cpu_percent）、from/to（时间戳或日期时间，默认最近1小时）、
+    step（聚合步长秒数，可选）
+    """
+    return series_response(clients_data, ip)
+
+@app.route('/sites', methods=['GET'])
+@login_required
+def get_sites():
+    """获取网站监控目标的最新检查结果"""
+    sites = []
+    for site in sorted(sites_data.clients(), key=lambda site: site.ip):
+        sites.append({
+            'key': site.ip,
+            'name': site.hostname,
+            'last_seen': site.last_seen.strftime('%Y-%m-%d %H:%M:%S'),
+            'last_seen_ts': site.last_seen.timestamp(),
+            'http': site.latest.get('http') or {}
+        })
+    return jsonify(sites)
+
+@app.route('/site/<key>/series', methods=['GET'])
+@login_required
+def get_site_series(key):
+    """获取指定网站某个指标的历史数据（如 http.total_ms），参数同 /client/<ip>/series"""
+    return series_response(sites_data, key)
+
 def save_to_file(data):
-    """保存数据到文件"""
-    date_str = datetime.now().strftime('%Y%m%d')
-    filename = f"logs/probe_{date_str}.json"
-    
-    os.makedirs('logs', exist_ok=True)
-    
-    with open(filename, 'a', encoding='utf-8') as f:
-        f.write(json.dumps(data, ensure_ascii=False) + '\n')
+    """保存数据到文件（交给后台线程批量写入）"""
+    log_writer.submit(data)
+
+@app.route('/stats', methods=['GET'])
+@login_required
+def get_stats():
+    """获取服务端内部状态"""
+    return jsonify({
+        'clients': len(clients_data),
+        'sites': len(sites_data),
+        'online': len(client_index.online),
+        'clients_cache': {'hits': clients_cache.hits, 'misses': clients_cache.misses},
+        'event_subscribers': broadcaster.subscribers,
+        'log_writer': log_writer.stats(),
+        'alerts': alert_dispatcher.stats()
+    })
 
 @app.route('/')
 @login_required
@@ -263,25 +598,74 @@ def index():
                 }
             </style>
             <script>
+                const OFFLINE_AFTER = ''' + str(OFFLINE_AFTER) + ''';
+                // ip -> {client, nodes}，只更新变化的客户端节点
+                const rows = new Map();
+                let clockOffset = 0;
+                
+                function createRow(ip) {
+                    const div = document.createElement('div');
+                    div.className = 'client';
+                    div.innerHTML = `
+                        <h3><span class="hostname"></span> (<span class="ip"></span>)</h3>
+                        <p>系统: <span class="system"></span></p>
+                        <p>最后上报: <span class="last-seen"></span></p>
+                        <p>状态: <span class="status"></span></p>
+                        <button>查看详情</button>
+                    `;
+                    div.querySelector('button').addEventListener('click', () => showDetails(ip));
+                    const nodes = {};
+                    ['hostname', 'ip', 'system', 'last-seen', 'status'].forEach(name => {
+                        nodes[name] = div.querySelector('.' + name);
+                    });
+                    document.getElementById('clients').appendChild(div);
+                    const row = {client: null, nodes: nodes};
+                    rows.set(ip, row);
+                    return row;
+                }
+                
+                function setText(node, text) {
+                    if (node.textContent !== text) {
+                        node.textContent = text;
+                    }
+                }
+                
+                function renderStatus(row) {
+                    const age = Date.now() / 1000 + clockOffset - row.client.last_seen_ts;
+                    const online = age < OFFLINE_AFTER;
+                    setText(row.nodes.status, online ? '在线' : '离线');
+                    row.nodes.status.className = 'status ' + (online ? 'online' : 'offline');
+                }
+                
+                function applyClient(client) {
+                    const row = rows.get(client.ip) || createRow(client.ip);
+                    row.client = client;
+                    setText(row.nodes.hostname, client.hostname || '');
+                    setText(row.nodes.ip, client.ip);
+                    setText(row.nodes.system, client.system || '');
+                    setText(row.nodes['last-seen'], client.last_seen);
+                    renderStatus(row);
+                }
+                
                 function updateClients() {
-                    fetch('/clients')
+                    return fetch('/clients')
                         .then(response => response.json())
-                        .then(clients => {
-                            const container = document.getElementById('clients');
-                            container.innerHTML = '';
-                            clients.forEach(client => {
-                                const div = document.createElement('div');
-                                div.className = 'client';
-                                div.innerHTML = `
-                                    <h3>${client.hostname} (${client.ip})</h3>
-                                    <p>系统: ${client.system}</p>
-                                    <p>最后上报: ${client.last_seen}</p>
-                                    <p>状态: <span class="${client.status === '在线' ? 'online' : 'offline'}">${client.status}</span></p>
-                                    <button onclick="showDetails('${client.ip}')">查看详情</button>
-                                `;
-                                container.appendChild(div);
-                            });
-                        });
+                        .then(clients => clients.forEach(applyClient));
+                }
+                
+                function connectEvents() {
+                    const source = new EventSource('/events');
+                    source.addEventListener('clients', event => {
+                        const update = JSON.parse(event.data);
+                        clockOffset = update.server_time - Date.now() / 1000;
+                        update.clients.forEach(applyClient);
+                    });
+                    source.addEventListener('reset', updateClients);
+                }
+                
+                // 状态在本地按最后上报时间刷新，不需要轮询服务端
+                function refreshStatus() {
+                    rows.forEach(row => renderStatus(row));
                 }
                 
                 function showDetails(ip) {
@@ -292,8 +676,10 @@ def index():
                         });
                 }
                 
-                setInterval(updateClients, 30000);
-                document.addEventListener('DOMContentLoaded', updateClients);
+                setInterval(refreshStatus, 10000);
+                document.addEventListener('DOMContentLoaded', () => {
+                    updateClients().then(connectEvents);
+                });
             </script>
         </head>
         <body>
@@ -0,0 +1,232 @@
+import math
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from probe_rollup import DEFAULT_LEVELS, RollupLevel, query_series
+
+NAN = float('nan')
+
+# 按分组展开的数值指标（disk 为分区列表，单独处理；http 为网站监控结果）
+METRIC_SECTIONS = ('cpu', 'memory', 'network', 'http')
+
+
+def flatten_metrics(data):
+    """将上报数据展开为 {指标名: 数值}
+
+    指标名形如 ``memory.memory_percent``、``cpu.cpu_percent.0``、
+    ``disk./home.percent``。列表型指标（如每核CPU）额外给出平均值，
+    非数值字段（主机名、设备名等）会被忽略。
+    """
+    values = {}
+    for section in METRIC_SECTIONS:
+        group = data.get(section)
+        if not isinstance(group, dict):
+            continue
+        for key, value in group.items():
+            name = f"{section}.{key}"
+            if isinstance(value, (list, tuple)):
+                numbers = [v for v in value if _is_number(v)]
+                for i, v in enumerate(value):
+                    if _is_number(v):
+                        values[f"{name}.{i}"] = float(v)
+                if numbers:
+                    values[name] = sum(numbers) / len(numbers)
+            elif _is_number(value):
+                values[name] = float(value)
+
+    for partition in data.get('disk') or ():
+        mountpoint = partition.get('mountpoint')
+        if mountpoint is None:
+            continue
+        for key, value in partition.items():
+            if _is_number(value):
+                values[f"disk.{mountpoint}.{key}"] = float(value)
+    return values
+
+
+# 基本不变的数值（容量、核心数等），只保留原始数据，不做降采样
+STATIC_METRICS = frozenset(('cpu_count', 'cpu_freq_max', 'memory_total', 'swap_total',
+                            'total_size'))
+
+
+def _is_rollup_metric(name):
+    """列表元素（如单核CPU）和 STATIC_METRICS 只保留原始数据，不做降采样"""
+    key = name.rpartition('.')[2]
+    return not (key.isdigit() or key in STATIC_METRICS)
+
+
+def _is_number(value):
+    # type() 精确匹配，顺带排除 bool
+    return type(value) in (int, float)
+
+
+class ClientSeries:
+    """单个客户端的定长环形缓冲区
+
+    数值指标按列存放在预分配的 ``array('d')`` 中，缺失值为 NaN；
+    主机名、系统等字符串只保留一份，``latest`` 保存最近一次原始上报，
+    ``values`` 为其展开后的数值指标。
+    ``rollups`` 为按粒度从细到粗排列的增量聚合（见 probe_rollup）。聚合级别按需
+    创建：原始数据即将被覆盖时才创建最细的一级，某一级即将覆盖最早的桶时才创建
+    下一级，创建时从上一级补齐，在线时间短的客户端不占用粗粒度级别的内存。
+    """
+
+    __slots__ = ('ip', 'hostname', 'system', 'latest', 'values', 'last_seen',
+                 'capacity', 'head', 'size', 'timestamps', 'columns', 'rollups',
+                 'rollup_levels')
+
+    def __init__(self, ip, capacity, rollup_levels=DEFAULT_LEVELS):
+        self.ip = ip
+        self.hostname = None
+        self.system = None
+        self.latest = None
+        self.values = None
+        self.last_seen = None
+        self.capacity = capacity
+        self.head = 0  # 下一次写入的位置
+        self.size = 0
+        self.timestamps = array('d', [NAN]) * capacity
+        self.columns = {}
+        self.rollup_levels = tuple(rollup_levels)
+        self.rollups = []
+
+    def __len__(self):
+        return self.size
+
+    def append(self, data, ts=None):
+        """写入一条上报数据，缓冲区满时覆盖最旧的一条，返回展开后的指标"""
+        ts = time.time() if ts is None else ts
+        head = self.head
+        values = flatten_metrics(data)
+        if len(self.rollups) < len(self.rollup_levels):
+            self._extend_rollups(ts)
+
+        self.timestamps[head] = ts
+        columns = self.columns
+        for name, column in columns.items():
+            column[head] = values.get(name, NAN)
+        for name, value in values.items():
+            if name not in columns:
+                column = columns[name] = array('d', [NAN]) * self.capacity
+                column[head] = value
+
+        if self.rollups:
+            rollup_values = {name: value for name, value in values.items()
+                             if _is_rollup_metric(name)}
+            for level in self.rollups:
+                level.add(ts, rollup_values)
+
+        self.head = (head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+        self.hostname = data.get('hostname', self.hostname)
+        self.system = data.get('system', self.system)
+        self.latest = data
+        self.values = values
+        self.last_seen = datetime.fromtimestamp(ts)
+        return values
+
+    def _extend_rollups(self, ts):
+        """在数据被覆盖之前创建下一级聚合，并用上一级（或原始数据）补齐"""
+        while len(self.rollups) < len(self.rollup_levels):
+            if self.rollups:
+                finer = self.rollups[-1]
+                if not finer.will_evict(ts):
+                    return
+                level = RollupLevel(*self.rollup_levels[len(self.rollups)])
+                level.absorb(finer)
+            else:
+                if self.size < self.capacity:
+                    return
+                level = RollupLevel(*self.rollup_levels[0])
+                names = [name for name in self.columns if _is_rollup_metric(name)]
+                for i in self._indices():
+                    level.add(self.timestamps[i],
+                              {name: self.columns[name][i] for name in names})
+            self.rollups.append(level)
+
+    def _indices(self):
+        """按时间先后顺序返回有效数据的下标"""
+        start = (self.head - self.size) % self.capacity
+        for i in range(self.size):
+            yield (start + i) % self.capacity
+
+    def oldest(self):
+        """返回缓冲区中最早一条数据的时间戳"""
+        if not self.size:
+            return None
+        return self.timestamps[(self.head - self.size) % self.capacity]
+
+    def metric_names(self):
+        return sorted(self.columns)
+
+    def series(self, name, start=None, end=None):
+        """返回指标 name 的 [(时间戳, 数值)] 列表，按时间升序，跳过缺失值"""
+        column = self.columns.get(name)
+        if column is None:
+            return []
+        points = []
+        for i in self._indices():
+            ts = self.timestamps[i]
+            if start is not None and ts < start:
+                continue
+            if end is not None and ts > end:
+                continue
+            value = column[i]
+            if not math.isnan(value):
+                points.append((ts, value))
+        return points
+
+
+class MetricStore:
+    """所有客户端的时序数据存储，按 IP 索引 ``ClientSeries``
+
+    传入 ``fleet``（probe_fleet.FleetMatrix）时同时维护全体客户端最新样本的矩阵。
+    """
+
+    def __init__(self, capacity=100, rollup_levels=DEFAULT_LEVELS, fleet=None):
+        if capacity < 1:
+            raise ValueError('capacity 必须大于 0')
+        self.capacity = capacity
+        self.rollup_levels = tuple(sorted(rollup_levels))
+        self.fleet = fleet
+        self.lock = threading.Lock()
+        self._clients = {}
+
+    def add(self, data, ts=None):
+        """写入一条上报数据，返回对应的 ClientSeries"""
+        ip = data['ip']
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            client = self._clients.get(ip)
+            if client is None:
+                client = self._clients[ip] = ClientSeries(ip, self.capacity, self.rollup_levels)
+            values = client.append(data, ts)
+        if self.fleet is not None:
+            self.fleet.update(ip, values, ts)
+        return client
+
+    def get(self, ip):
+        return self._clients.get(ip)
+
+    def query(self, ip, name, start, end, step=None):
+        """查询时序数据，客户端不存在时返回 None，参见 probe_rollup.query_series"""
+        with self.lock:
+            client = self._clients.get(ip)
+            if client is None:
+                return None
+            return query_series(client, name, start, end, step)
+
+    def clients(self):
+        """返回当前所有客户端的快照列表"""
+        with self.lock:
+            return list(self._clients.values())
+
+    def __contains__(self, ip):
+        return ip in self._clients
+
+    def __len__(self):
+        return len(self._clients)
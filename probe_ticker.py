@@ -0,0 +1,40 @@
+"""采集循环使用的定时器
+
+不依赖 psutil，linux_monitor 和 probe_client 启动时导入它不会加载任何采集器。
+"""
+import math
+import time
+
+
+class Ticker:
+    """基于单调时钟的无漂移定时器
+
+    第 n 次触发的时间固定为 ``start + n * interval``，采集耗时不会累积成漂移；
+    某次执行超过一个周期时跳过错过的时间点并计入 ``missed``。
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.missed = 0
+        self._next = time.monotonic()
+
+    def wait(self, collectors=None):
+        """睡眠到下一个触发时间点
+
+        传入 CollectorSet 时，期间有采集器到期就醒来运行它们（refresh），
+        间隔比循环周期短或不是其整数倍的采集器也能按自己的时间表采集。
+        """
+        self._next += self.interval
+        now = time.monotonic()
+        if now > self._next:
+            behind = math.ceil((now - self._next) / self.interval)
+            self.missed += behind
+            self._next += behind * self.interval
+        if collectors is not None:
+            while True:
+                due = collectors.next_due()
+                if due is None or due >= self._next:
+                    break
+                time.sleep(max(0.0, due - time.monotonic()))
+                collectors.refresh()
+        time.sleep(max(0.0, self._next - time.monotonic()))
@@ -1,20 +1,382 @@
+import argparse
+import heapq
+import os
+import sqlite3
+import threading
 import time
-from plyer import notification
-
-def set_reminder(title, message, minutes):
-    """设置定时提醒"""
-    seconds = minutes * 60
-    time.sleep(seconds)
-    
-    notification.notify(
-        title=title,
-        message=message,
-        timeout=10
-    )
-
-# 使用示例
-set_reminder(
-    "休息提醒", 
-    "该休息一下眼睛了！",
-    30  # 30分钟后提醒
-) 
\ No newline at end of file
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+try:
+    from plyer import notification
+except ImportError:
+    notification = None
+
+# 默认的提醒数据库
+DEFAULT_DB = os.path.join(os.path.expanduser('~'), '.reminders.db')
+# 检查其他进程（如命令行 add）是否修改了数据库的间隔（秒）
+POLL_INTERVAL = 5.0
+# 统计错过次数时最多逐个计算的 cron 触发时间数
+MAX_MISSED_COUNT = 10000
+
+_CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+}
+# (最小值, 最大值)：分 时 日 月 星期（0 和 7 都表示星期日）
+_CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step <= 0:
+                raise ValueError(f'无效的步长: {field}')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f'超出范围 {low}-{high}: {field}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpr:
+    """五段式 cron 表达式（分 时 日 月 星期），支持 * , - / 和 @daily 等别名
+
+    与 cron 相同，日和星期都被限定时满足其一即可。
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+        fields = _CRON_ALIASES.get(expr.strip(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f'cron 表达式需要 5 段: {expr!r}')
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, _CRON_RANGES))
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, dt):
+        """dt 之后（不含）的下一个触发时间"""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 8)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            hour = min((h for h in self.hours if h >= dt.hour), default=None)
+            if hour is None:
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != dt.hour:
+                dt = dt.replace(hour=hour, minute=0)
+            minute = min((m for m in self.minutes if m >= dt.minute), default=None)
+            if minute is None:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            return dt.replace(minute=minute)
+        raise ValueError(f'cron 表达式永远不会触发: {self.expr!r}')
+
+
+class Reminder:
+    __slots__ = ('id', 'title', 'message', 'due', 'cron', 'interval')
+
+    def __init__(self, id, title, message, due, cron=None, interval=None):
+        self.id = id
+        self.title = title
+        self.message = message
+        self.due = due
+        self.cron = cron
+        self.interval = interval
+
+    def next_due(self, now):
+        """重复提醒在 now 之后的下一次触发时间，一次性提醒返回 None"""
+        if self.cron:
+            return CronExpr(self.cron).next_after(datetime.fromtimestamp(now)).timestamp()
+        if self.interval:
+            missed = int((now - self.due) // self.interval) + 1
+            return self.due + max(missed, 1) * self.interval
+        return None
+
+    def occurrences(self, now):
+        """due 到 now 之间（含两端）应当触发的次数，一次性提醒为 1"""
+        if self.interval:
+            return max(int((now - self.due) // self.interval) + 1, 1)
+        if not self.cron:
+            return 1
+        cron = CronExpr(self.cron)
+        end = datetime.fromtimestamp(now)
+        dt = datetime.fromtimestamp(self.due)
+        count = 1
+        while count < MAX_MISSED_COUNT:
+            dt = cron.next_after(dt)
+            if dt > end:
+                break
+            count += 1
+        return count
+
+
+def notify(title, message):
+    """发送桌面通知，没有安装 plyer 时打印到终端"""
+    if notification is None:
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {title}: {message}")
+        return
+    notification.notify(title=title, message=message, timeout=10)
+
+
+class ReminderScheduler:
+    """持久化的提醒调度器
+
+    提醒保存在 SQLite 中，内存里按触发时间放在最小堆里，调度线程只在最近的
+    一个提醒到期时醒来（取消、修改采用惰性删除：出堆时与最新的触发时间比对）。
+    通知在线程池中发送，某个通知后端很慢也不会推迟其他提醒。
+
+    启动时，停机期间错过的一次性提醒会立即补发；重复提醒只补发一次（注明错过的
+    次数），然后从当前时间继续排期。超过 missed_grace 秒的错过提醒不再补发。
+    其他进程写入数据库的提醒（如命令行 add）会在 POLL_INTERVAL 秒内被加载。
+    """
+
+    def __init__(self, db_path=DEFAULT_DB, notifier=notify, workers=4, missed_grace=None):
+        self.db_path = db_path
+        self.notifier = notifier
+        self.missed_grace = missed_grace
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS reminders ('
+                          'id INTEGER PRIMARY KEY, title TEXT, message TEXT, due REAL, '
+                          'cron TEXT, interval REAL, created REAL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS reminders_due ON reminders (due)')
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.reminders = {}
+        self.heap = []
+        self.delivered = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='notify')
+        self._thread = None
+        self._running = False
+        self._data_version = None
+        self._load()
+
+    def _load(self):
+        """从数据库重新加载全部提醒"""
+        rows = self.conn.execute(
+            'SELECT id, title, message, due, cron, interval FROM reminders').fetchall()
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        self.reminders = {row[0]: Reminder(*row) for row in rows}
+        self.heap = [(r.due, r.id) for r in self.reminders.values()]
+        heapq.heapify(self.heap)
+
+    def add(self, title, message, at=None, minutes=None, cron=None, every=None):
+        """添加提醒，返回编号
+
+        Args:
+            at: 触发时间（datetime 或时间戳）
+            minutes: 多少分钟后触发
+            cron: cron 表达式，按表达式重复触发
+            every: 重复间隔（秒），从 at/minutes 指定的时间（默认为现在起一个间隔后）开始
+        """
+        now = time.time()
+        if cron:
+            due = CronExpr(cron).next_after(datetime.fromtimestamp(now)).timestamp()
+        elif at is not None:
+            due = at.timestamp() if isinstance(at, datetime) else float(at)
+        elif minutes is not None:
+            due = now + minutes * 60
+        elif every:
+            due = now + every
+        else:
+            raise ValueError('需要指定 at、minutes、cron 或 every')
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT INTO reminders (title, message, due, cron, interval, created) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (title, message, due, cron, every, now))
+            self.conn.commit()
+            reminder = Reminder(cursor.lastrowid, title, message, due, cron, every)
+            self.reminders[reminder.id] = reminder
+            self._push(reminder)
+        return reminder.id
+
+    def _push(self, reminder):
+        """入堆，新提醒比当前最早的还早时唤醒调度线程"""
+        heapq.heappush(self.heap, (reminder.due, reminder.id))
+        if self.heap[0][1] == reminder.id:
+            self.wakeup.notify()
+
+    def cancel(self, reminder_id):
+        with self.lock:
+            self.conn.execute('DELETE FROM reminders WHERE id = ?', (reminder_id,))
+            self.conn.commit()
+            return self.reminders.pop(reminder_id, None) is not None
+
+    def pending(self):
+        """按触发时间排序的全部提醒"""
+        with self.lock:
+            return sorted(self.reminders.values(), key=lambda r: r.due)
+
+    def _dispatch(self, reminder, missed=0):
+        message = reminder.message
+        if missed > 1:
+            message = f'{message}（错过 {missed} 次）'
+        future = self.executor.submit(self.notifier, reminder.title, message)
+        future.add_done_callback(self._dispatched)
+
+    def _dispatched(self, future):
+        error = future.exception()
+        if error is not None:
+            print(f'发送提醒失败: {error}')
+        else:
+            self.delivered += 1
+
+    def _fire_due(self, now):
+        """发送所有到期的提醒并更新数据库，返回下一个提醒的触发时间"""
+        updates = []
+        deletes = []
+        while self.heap and self.heap[0][0] <= now:
+            due, reminder_id = heapq.heappop(self.heap)
+            reminder = self.reminders.get(reminder_id)
+            if reminder is None or reminder.due != due:
+                continue  # 已取消或已改期
+            late = now - due
+            missed = reminder.occurrences(now) if late > 0 else 1
+            if self.missed_grace is None or late <= self.missed_grace:
+                self._dispatch(reminder, missed)
+            next_due = reminder.next_due(now)
+            if next_due is None:
+                del self.reminders[reminder_id]
+                deletes.append((reminder_id,))
+            else:
+                reminder.due = next_due
+                heapq.heappush(self.heap, (next_due, reminder_id))
+                updates.append((next_due, reminder_id))
+        if updates or deletes:
+            self.conn.executemany('UPDATE reminders SET due = ? WHERE id = ?', updates)
+            self.conn.executemany('DELETE FROM reminders WHERE id = ?', deletes)
+            self.conn.commit()
+            self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        return self.heap[0][0] if self.heap else None
+
+    def _changed_elsewhere(self):
+        version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        return version != self._data_version
+
+    def run(self, until=None):
+        """调度循环，直到 stop()；指定 until 时该编号的提醒发送（或被取消）后返回"""
+        with self.lock:
+            self._running = True
+            while self._running:
+                now = time.time()
+                if self._changed_elsewhere():
+                    self._load()
+                next_due = self._fire_due(now)
+                if until is not None and until not in self.reminders:
+                    break
+                timeout = POLL_INTERVAL
+                if next_due is not None:
+                    timeout = min(timeout, max(0.0, next_due - time.time()))
+                self.wakeup.wait(timeout)
+
+    def start(self):
+        """在后台线程中运行调度循环"""
+        self._thread = threading.Thread(target=self.run, name='reminder-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            self._running = False
+            self.wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.executor.shutdown(wait=True)
+        self.conn.close()
+
+
+def set_reminder(title, message, minutes, db_path=None, wait=True):
+    """设置定时提醒，返回提醒编号
+
+    wait=True（默认）时与以前一样阻塞到提醒发送后才返回：提醒只保存在内存中
+    （指定 db_path 时保存到该数据库，期间其中到期的其他提醒也会发送）。
+    wait=False 时保存到数据库（默认 DEFAULT_DB）后立即返回，由调度器
+    （reminder.py run）到时发送。
+    """
+    if wait:
+        scheduler = ReminderScheduler(db_path or ':memory:')
+    else:
+        scheduler = ReminderScheduler(db_path or DEFAULT_DB)
+    try:
+        reminder_id = scheduler.add(title, message, minutes=minutes)
+        if wait:
+            scheduler.run(until=reminder_id)
+        return reminder_id
+    finally:
+        scheduler.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='定时提醒')
+    parser.add_argument('--db', default=DEFAULT_DB, help='提醒数据库路径')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='运行调度器')
+    run.add_argument('--grace', type=float, help='超过这么多秒的错过提醒不再补发')
+    add = commands.add_parser('add', help='添加提醒')
+    add.add_argument('title')
+    add.add_argument('message')
+    when = add.add_mutually_exclusive_group(required=True)
+    when.add_argument('--in', dest='minutes', type=float, help='多少分钟后提醒')
+    when.add_argument('--at', help="提醒时间，如 '2024-05-01 09:30'")
+    when.add_argument('--cron', help="cron 表达式，如 '0 9 * * 1-5'")
+    add.add_argument('--every', type=float, help='重复间隔（分钟）')
+    commands.add_parser('list', help='列出提醒')
+    cancel = commands.add_parser('cancel', help='取消提醒')
+    cancel.add_argument('id', type=int)
+    args = parser.parse_args()
+
+    scheduler = ReminderScheduler(args.db, missed_grace=getattr(args, 'grace', None))
+    if args.command == 'run':
+        print(f'已加载 {len(scheduler.reminders)} 个提醒，等待触发...')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'add':
+        at = datetime.fromisoformat(args.at) if args.at else None
+        every = args.every * 60 if args.every else None
+        reminder_id = scheduler.add(args.title, args.message, at=at, minutes=args.minutes,
+                                    cron=args.cron, every=every)
+        print(f'已添加提醒 {reminder_id}')
+    elif args.command == 'list':
+        for reminder in scheduler.pending():
+            repeat = reminder.cron or (f'每 {reminder.interval / 60:g} 分钟' if reminder.interval else '')
+            print(f"{reminder.id:>6}  {datetime.fromtimestamp(reminder.due):%Y-%m-%d %H:%M:%S}  "
+                  f"{reminder.title}: {reminder.message}  {repeat}")
+    elif args.command == 'cancel':
+        print('已取消' if scheduler.cancel(args.id) else '没有这个提醒')
+    scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -27,6 +27,11 @@ setup(
         "PyPDF2>=2.0.0",
         "plyer>=2.0.0"
     ],
+    extras_require={
+        'archive': ['msgpack>=1.0.0', 'zstandard>=0.15.0'],
+        'async': ['aiohttp>=3.8.0'],
+        'fleet': ['numpy>=1.17.0'],
+    },
     entry_points={
         'console_scripts': [
             'probe-server=probe.server:main',
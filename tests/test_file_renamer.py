@@ -0,0 +1,103 @@
+import os
+
+from file_renamer import RenamePlan, apply_plan, plan_renames, undo_renames
+
+
+def make_files(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+
+
+def listing(root):
+    """{相对路径: 内容}，内容为创建时的原路径"""
+    result = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            with open(path, encoding='utf-8') as f:
+                result[os.path.relpath(path, root)] = f.read()
+    return result
+
+
+def test_template_numbers_in_natural_order(tmp_path):
+    root = tmp_path / 'files'
+    make_files(root, ['img10.jpg', 'img2.jpg', 'img1.jpg', 'notes.txt'])
+
+    plan = plan_renames(str(root), r'\.jpg$', template='photo_{n:02d}{ext}')
+    assert not plan.conflicts
+    assert apply_plan(plan, str(tmp_path / 'journal.jsonl')) == 3
+    assert listing(root) == {'photo_01.jpg': 'img1.jpg', 'photo_02.jpg': 'img2.jpg',
+                             'photo_03.jpg': 'img10.jpg', 'notes.txt': 'notes.txt'}
+
+
+def test_conflicts_are_reported_and_skipped(tmp_path):
+    root = tmp_path / 'files'
+    make_files(root, ['a_1.txt', 'a-1.txt', 'b_1.txt', 'b1.txt', 'c_1.txt'])
+
+    plan = plan_renames(str(root), '[_-]', replacement='')
+    reasons = {os.path.basename(path): reason for path, reason in plan.conflicts}
+    assert set(reasons) == {'a_1.txt', 'a-1.txt', 'b_1.txt'}
+    assert '目标已存在' in reasons['b_1.txt']
+    assert list(plan) == [(str(root / 'c_1.txt'), str(root / 'c1.txt'))]
+
+
+def test_chain_uses_temporary_names(tmp_path):
+    root = tmp_path / 'files'
+    make_files(root, ['1.txt', '2.txt', '3.txt'])
+
+    # 1 -> 2 -> 3 -> 4：前两个目标名正被另一个条目占用
+    plan = plan_renames(str(root), r'\.txt$', template='{n}.txt', start=2)
+    assert not plan.conflicts and plan.chained == 2 and plan.cycles == 0
+    apply_plan(plan, str(tmp_path / 'journal.jsonl'))
+    assert listing(root) == {'2.txt': '1.txt', '3.txt': '2.txt', '4.txt': '3.txt'}
+
+
+def test_cycle_and_undo(tmp_path):
+    root = tmp_path / 'files'
+    make_files(root, ['a', 'b', 'c'])
+    plan = RenamePlan(str(root))
+    plan.ops[str(root)] = [('a', 'b'), ('b', 'c'), ('c', 'a')]
+    journal = str(tmp_path / 'journal.jsonl')
+
+    assert apply_plan(plan, journal) == 3
+    assert listing(root) == {'b': 'a', 'c': 'b', 'a': 'c'}
+    assert undo_renames(journal) == 3
+    assert listing(root) == {'a': 'a', 'b': 'b', 'c': 'c'}
+
+
+def test_recursive_directories_and_undo(tmp_path):
+    root = tmp_path / 'files'
+    make_files(root, ['old_dir/old_a.txt', 'old_dir/old_sub/old_b.txt', 'old_c.txt'])
+    journal = str(tmp_path / 'journal.jsonl')
+
+    plan = plan_renames(str(root), '^old_', replacement='new_', recursive=True,
+                        include_dirs=True)
+    assert len(plan) == 5
+    assert apply_plan(plan, journal) == 5
+    assert listing(root) == {
+        'new_dir/new_a.txt': 'old_dir/old_a.txt',
+        'new_dir/new_sub/new_b.txt': 'old_dir/old_sub/old_b.txt',
+        'new_c.txt': 'old_c.txt',
+    }
+    assert undo_renames(journal) == 5
+    assert listing(root) == {name: name for name in
+                             ('old_dir/old_a.txt', 'old_dir/old_sub/old_b.txt', 'old_c.txt')}
+
+
+def test_undo_after_interrupted_run(tmp_path):
+    root = tmp_path / 'files'
+    make_files(root, ['x1', 'x2', 'y1'])
+    journal = str(tmp_path / 'journal.jsonl')
+    plan = plan_renames(str(root), '^x', replacement='z')
+    apply_plan(plan, journal)
+    # 模拟中断：日志中没有完成记录，且其中一个条目已被手工改回
+    with open(journal, encoding='utf-8') as f:
+        lines = [line for line in f if '"done"' not in line]
+    with open(journal, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    os.rename(root / 'z2', root / 'x2')
+
+    assert undo_renames(journal) == 1
+    assert listing(root) == {'x1': 'x1', 'x2': 'x2', 'y1': 'y1'}
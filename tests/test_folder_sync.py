@@ -0,0 +1,122 @@
+import os
+import random
+
+import pytest
+
+from folder_sync import block_signature, delta_copy, delta_plan, sync_folders
+
+
+def run(source, target, tmp_path, **kwargs):
+    logs = tmp_path / 'logs'
+    logs.mkdir(exist_ok=True)
+    return sync_folders(str(source), str(target), state_db=str(tmp_path / 'state.db'),
+                        log_dir=str(logs), workers=2, **kwargs)
+
+
+def test_directory_symlink_is_recreated_not_copied(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'real').mkdir(parents=True)
+    (source / 'real' / 'a.txt').write_text('a')
+    os.symlink('real', source / 'link')
+    os.symlink('missing', source / 'dangling')
+    target = tmp_path / 'target'
+
+    stats = run(source, target, tmp_path, dry_run=True)
+    assert stats['errors'] == 0
+    assert stats['copied'] == 1
+    assert stats['links'] == 2
+
+    stats = run(source, target, tmp_path)
+    assert stats['errors'] == 0
+    assert stats['copied'] == 1
+    assert stats['links'] == 2
+    assert os.readlink(target / 'link') == 'real'
+    assert os.readlink(target / 'dangling') == 'missing'
+    assert (target / 'link' / 'a.txt').read_text() == 'a'
+
+    stats = run(source, target, tmp_path)
+    assert stats['errors'] == 0
+    assert stats['links'] == 0
+    assert stats['unchanged'] == 3
+
+
+def test_symlink_target_is_replaced_without_writing_through(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    (source / 'link').write_text('new')
+    os.symlink('other', source / 'retarget')
+    (source / 'other').mkdir()
+    target = tmp_path / 'target'
+    target.mkdir()
+    (target / 'outside.txt').write_text('keep')
+    os.symlink('outside.txt', target / 'link')
+    os.symlink('elsewhere', target / 'retarget')
+
+    stats = run(source, target, tmp_path)
+    assert stats['errors'] == 0
+    assert not os.path.islink(target / 'link')
+    assert (target / 'link').read_text() == 'new'
+    assert (target / 'outside.txt').read_text() == 'keep'
+    assert os.readlink(target / 'retarget') == 'other'
+
+
+BLOCK = 1024
+
+
+def make_pair(tmp_path, basis, source):
+    target = tmp_path / 'target.bin'
+    src = tmp_path / 'source.bin'
+    target.write_bytes(basis)
+    src.write_bytes(source)
+    return str(src), str(target)
+
+
+def edits(rng, basis):
+    middle = len(basis) // 2
+    modified = bytearray(basis)
+    modified[5000:5100] = rng.randbytes(100)
+    return {
+        'modify': bytes(modified),
+        'insert': basis[:middle] + rng.randbytes(777) + basis[middle:],
+        'delete': basis[:middle] + basis[middle + 3000:],
+        'append': basis + rng.randbytes(5000),
+        'truncate': basis[:len(basis) - 4321],
+        'prepend': rng.randbytes(10) + basis,
+    }
+
+
+@pytest.mark.parametrize('inplace', [False, True])
+@pytest.mark.parametrize('kind', ['modify', 'insert', 'delete', 'append', 'truncate', 'prepend'])
+def test_delta_copy_reproduces_source(tmp_path, kind, inplace):
+    rng = random.Random(kind)
+    basis = rng.randbytes(64 * BLOCK + 123)
+    source = edits(rng, basis)[kind]
+    src, target = make_pair(tmp_path, basis, source)
+
+    written, reused = delta_copy(src, target, block_size=BLOCK, inplace=inplace)
+
+    with open(target, 'rb') as f:
+        assert f.read() == source
+    assert written + reused == len(source)
+    if inplace and kind in ('insert', 'prepend'):
+        return  # 原地更新不能把块向后移动，插入点之后的数据只能重写
+    # 只有变化附近的块需要写入，其余的都从旧文件复用
+    assert written < 8 * BLOCK
+
+
+def test_rolling_checksum_finds_shifted_blocks(tmp_path):
+    rng = random.Random(7)
+    basis = rng.randbytes(16 * BLOCK)
+    source = basis[:3 * BLOCK] + b'x' * 5 + basis[3 * BLOCK:]
+    src, target = make_pair(tmp_path, basis, source)
+
+    ops = delta_plan(src, block_signature(target, BLOCK), BLOCK)
+    assert ops == [('copy', 0, 3 * BLOCK), ('data', 3 * BLOCK, 5),
+                   ('copy', 3 * BLOCK, 13 * BLOCK)]
+
+
+def test_delta_plan_gives_up_on_unrelated_data(tmp_path):
+    rng = random.Random(3)
+    src, target = make_pair(tmp_path, rng.randbytes(32 * BLOCK), rng.randbytes(32 * BLOCK))
+    assert delta_plan(src, block_signature(target, BLOCK), BLOCK,
+                      max_literal=8 * BLOCK) is None
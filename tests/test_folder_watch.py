@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from folder_watch import IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, MOVE_PAIR_TIMEOUT, \
+    FolderWatcher
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    (tmp_path / 'src').mkdir()
+    return FolderWatcher(str(tmp_path / 'src'), str(tmp_path / 'dst'), mirror=True,
+                         debounce=0.5, full_sync_interval=0, log_dir=str(tmp_path))
+
+
+def test_debounce_waits_for_quiet_period(watcher):
+    for now in (0.0, 0.3, 0.6):
+        watcher._on_event(IN_CLOSE_WRITE, 0, 'big.bin', now)
+    watcher._on_event(IN_CLOSE_WRITE, 0, 'docs/a.txt', 0.35)
+    watcher._on_event(IN_CLOSE_WRITE, 0, 'docs', 0.4)
+    assert watcher._ready_paths(0.8) == []
+    assert watcher._timeout(0.8) == pytest.approx(0.05)
+    # 子路径并入父目录一起处理
+    assert watcher._ready_paths(0.95) == ['docs']
+    assert watcher._ready_paths(1.0) == []
+    assert watcher._ready_paths(1.1) == ['big.bin']
+    assert watcher._timeout(1.1) is None
+
+
+def test_move_halves_pair_across_batches(watcher):
+    watcher._on_event(IN_MOVED_FROM, 7, 'old.txt', 0.0)
+    # 移入事件还没到，移出的路径暂不同步
+    assert watcher._ready_paths(0.6) == []
+    assert watcher._timeout(0.6) == pytest.approx(MOVE_PAIR_TIMEOUT - 0.6)
+    watcher._on_event(IN_MOVED_TO, 7, 'new.txt', 0.7)
+    watcher._expire_moves(1.3)
+    assert watcher.renames == [('old.txt', 'new.txt')]
+    assert watcher._ready_paths(1.3) == ['new.txt', 'old.txt']
+
+
+def test_unpaired_move_times_out(watcher):
+    watcher._on_event(IN_MOVED_FROM, 9, 'gone.txt', 0.0)
+    watcher._expire_moves(MOVE_PAIR_TIMEOUT - 0.1)
+    assert watcher._ready_paths(MOVE_PAIR_TIMEOUT - 0.1) == []
+    watcher._expire_moves(MOVE_PAIR_TIMEOUT)
+    assert watcher.moves == {}
+    assert watcher._ready_paths(MOVE_PAIR_TIMEOUT) == ['gone.txt']
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='需要 inotify')
+def test_run_syncs_and_renames_without_leaking_fds(tmp_path):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    src.mkdir()
+    fds = len(os.listdir('/proc/self/fd'))
+    watcher = FolderWatcher(str(src), str(dst), mirror=True, debounce=0.05,
+                            full_sync_interval=0, log_dir=str(tmp_path))
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    try:
+        assert wait_for(lambda: watcher.batches >= 1)  # 启动时的完整同步
+        (src / 'a.txt').write_text('hello')
+        assert wait_for(lambda: (dst / 'a.txt').exists())
+        copied = watcher.totals['copied']
+        os.rename(src / 'a.txt', src / 'b.txt')
+        assert wait_for(lambda: (dst / 'b.txt').exists() and not (dst / 'a.txt').exists())
+        assert (dst / 'b.txt').read_text() == 'hello'
+        assert watcher.totals['copied'] == copied  # 直接改名，没有重新复制
+    finally:
+        watcher.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert len(os.listdir('/proc/self/fd')) == fds
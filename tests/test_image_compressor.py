@@ -0,0 +1,69 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from image_compressor import MANIFEST_NAME, compress_images
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_images(directory, count):
+    os.makedirs(os.path.join(directory, 'sub'), exist_ok=True)
+    for i in range(count):
+        folder = directory if i % 2 else os.path.join(directory, 'sub')
+        Image.new('RGB', (64, 64), (i * 20 % 256, 80, 160)).save(
+            os.path.join(folder, f'img{i}.png'))
+
+
+def test_rerun_skips_unchanged(tmp_path):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    make_images(src, 4)
+    assert compress_images(src, dst, workers=1)['processed'] == 4
+    stats = compress_images(src, dst, workers=1)
+    assert (stats['processed'], stats['skipped']) == (0, 4)
+
+
+def test_resume_after_kill(tmp_path):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    make_images(src, 12)
+    # 写出第 6 条清单记录时直接退出进程（不执行 finally、不刷新缓冲区），模拟被杀
+    script = textwrap.dedent(f'''
+        import json, os, sys
+        sys.path.insert(0, {REPO!r})
+        import image_compressor
+
+        class DyingJson:
+            loads = staticmethod(json.loads)
+            written = 0
+
+            def dumps(self, obj, **kwargs):
+                if isinstance(obj, dict) and 'output_size' in obj:
+                    DyingJson.written += 1
+                    if DyingJson.written > 5:
+                        os._exit(1)
+                return json.dumps(obj, **kwargs)
+
+        image_compressor.json = DyingJson()
+        image_compressor.compress_images({src!r}, {dst!r}, workers=1)
+    ''')
+    # 单独的进程组：主进程退出后残留的进程池工作进程一并清理
+    process = subprocess.Popen([sys.executable, '-c', script], start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        assert process.wait(timeout=60) == 1
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    with open(os.path.join(dst, MANIFEST_NAME), encoding='utf-8') as f:
+        assert len(f.readlines()) == 5
+    stats = compress_images(src, dst, workers=1)
+    assert (stats['skipped'], stats['processed'], stats['failed']) == (5, 7, 0)
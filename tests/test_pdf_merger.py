@@ -0,0 +1,44 @@
+import pytest
+
+PyPDF2 = pytest.importorskip('PyPDF2')
+
+from pdf_merger import merge_pdfs  # noqa: E402
+
+
+def make_pdf(path, pages, dest_name):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(200, 200)
+    chapter = writer.add_outline_item('Chapter 1', 0)
+    writer.add_outline_item('Section 1.1', 1, parent=chapter)
+    writer.add_outline_item('Chapter 2', pages - 1)
+    writer.add_named_destination(dest_name, 1)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+def flatten(reader, outline, depth=0):
+    for item in outline:
+        if isinstance(item, list):
+            yield from flatten(reader, item, depth + 1)
+        else:
+            yield depth, item.title, reader.get_destination_page_number(item)
+
+
+def test_outlines_and_named_destinations_are_remapped(tmp_path):
+    source = tmp_path / 'in'
+    source.mkdir()
+    make_pdf(source / 'a1.pdf', 3, 'alpha')
+    make_pdf(source / 'a2.pdf', 4, 'beta')
+    output = tmp_path / 'out.pdf'
+
+    assert merge_pdfs(str(source), str(output), workers=1) == 7
+
+    reader = PyPDF2.PdfReader(str(output))
+    assert list(flatten(reader, reader.outline)) == [
+        (0, 'Chapter 1', 0), (1, 'Section 1.1', 1), (0, 'Chapter 2', 2),
+        (0, 'Chapter 1', 3), (1, 'Section 1.1', 4), (0, 'Chapter 2', 6),
+    ]
+    dests = reader.named_destinations
+    assert {name: reader.get_destination_page_number(dest) for name, dest in dests.items()} \
+        == {'alpha': 1, 'beta': 4}
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from probe_alerts import FIRING, RESOLVED, AlertDispatcher, AlertEngine, RollingWindow, Rule
+
+
+class Collector:
+    """代替 AlertDispatcher，记录提交的事件"""
+
+    def __init__(self):
+        self.events = []
+
+    def submit(self, event):
+        self.events.append(event)
+
+    def statuses(self):
+        return [(event['status'], event['metric'], event['time']) for event in self.events]
+
+
+def test_rule_parsing():
+    rule = Rule('memory.memory_percent > 90 for 5m')
+    assert (rule.metric, rule.op, rule.threshold, rule.duration) == \
+        ('memory.memory_percent', '>', 90.0, 300)
+    rule = Rule('avg(cpu.cpu_percent) >= 80 over 10m')
+    assert (rule.func, rule.window) == ('avg', 600)
+    rule = Rule('host offline > 3m')
+    assert rule.offline and rule.threshold == 180
+    assert Rule('disk.*.percent > 90').metrics(
+        {'disk./.percent': 1, 'disk./home.percent': 2, 'disk./.total': 3}) == \
+        ['disk./.percent', 'disk./home.percent']
+    for expr in ('cpu >', 'avg(cpu) > 1', 'cpu > 1 over 5m'):
+        with pytest.raises(ValueError):
+            Rule(expr)
+
+
+def test_pending_firing_resolved():
+    sink = Collector()
+    engine = AlertEngine(['mem > 90 for 60'], sink)
+    for ts, value in ((0, 95), (30, 95), (45, 50), (60, 95), (100, 95), (130, 95), (140, 10)):
+        engine.observe('10.0.0.1', 'web1', {'mem': value}, ts)
+        if ts == 130:
+            assert engine.active() == [('mem > 90 for 60', '10.0.0.1', 'mem', 60)]
+    # 45 秒时回落重置了待定状态，60 秒起重新计时
+    assert sink.statuses() == [(FIRING, 'mem', 130), (RESOLVED, 'mem', 140)]
+    assert sink.events[0]['since'] == 60 and sink.events[0]['hostname'] == 'web1'
+    assert engine.active() == []
+
+
+def test_each_matching_metric_has_its_own_state():
+    sink = Collector()
+    engine = AlertEngine(['disk.*.percent > 90'], sink)
+    engine.observe('h', 'h', {'disk./.percent': 95, 'disk./data.percent': 10}, 0)
+    engine.observe('h', 'h', {'disk./.percent': 96, 'disk./data.percent': 99}, 10)
+    engine.observe('h', 'h', {'disk./.percent': 10, 'disk./data.percent': 99}, 20)
+    assert sink.statuses() == [(FIRING, 'disk./.percent', 0),
+                               (FIRING, 'disk./data.percent', 10),
+                               (RESOLVED, 'disk./.percent', 20)]
+
+
+def test_window_rule_waits_for_full_window():
+    sink = Collector()
+    engine = AlertEngine(['avg(cpu) > 50 over 60'], sink)
+    for ts, value in ((0, 100), (30, 100), (60, 0), (90, 0), (120, 100)):
+        engine.observe('h', 'h', {'cpu': value}, ts)
+    # 60 秒时窗口才完整：(100+100+0)/3 > 50；90 秒时 (100+0+0)/3 恢复
+    assert sink.statuses() == [(FIRING, 'cpu', 60), (RESOLVED, 'cpu', 90)]
+
+
+def test_rolling_window_extremes():
+    window = RollingWindow(10, 'max')
+    for ts, value in ((0, 5), (4, 9), (8, 3), (15, 1)):
+        window.add(ts, value)
+    assert window.value() == 3  # 9 在 15 秒时已经滑出窗口
+    window = RollingWindow(10, 'min')
+    for ts, value in ((0, 5), (4, 2), (8, 7)):
+        window.add(ts, value)
+    assert window.value() == 2
+
+
+def test_host_offline_and_back():
+    sink = Collector()
+    engine = AlertEngine(['host offline > 60'], sink, check_interval=3600)
+    # ClientIndex 按当前时间判断上报是否过期，时间戳需以当前时间为基准
+    start = time.time() - 200
+    engine.observe('h', 'web1', {}, start)
+    assert engine.check_offline(start + 30) == []
+    assert [event['status'] for event in engine.check_offline(start + 100)] == [FIRING]
+    assert engine.check_offline(start + 150) == []
+    engine.observe('h', 'web1', {}, time.time())
+    assert [event['status'] for event in sink.events] == [FIRING, RESOLVED]
+    assert engine.active() == []
+
+
+def test_dispatcher_suppresses_flapping():
+    batches = []
+    notifier = type('Notifier', (), {'notify': lambda self, events: batches.append(events)})()
+    dispatcher = AlertDispatcher([notifier])
+    dispatcher._thread = object()  # 不启动后台线程，手动 flush
+    event = {'rule': 'r', 'ip': 'h', 'metric': 'm', 'time': 0}
+    dispatcher.submit(dict(event, status=FIRING))
+    dispatcher.submit(dict(event, status=RESOLVED))
+    dispatcher.flush()
+    assert batches == [] and dispatcher.suppressed == 1
+
+    dispatcher.submit(dict(event, status=FIRING))
+    dispatcher.flush()
+    dispatcher.submit(dict(event, status=FIRING, time=5))
+    dispatcher.flush()
+    assert [[e['status'] for e in batch] for batch in batches] == [[FIRING]]
+    assert dispatcher.stats()['sent'] == 1
@@ -0,0 +1,111 @@
+import json
+import os
+
+import pytest
+
+from probe_archive import ArchiveReader, ArchiveWriter, check_index
+
+
+def write_blocks(path, blocks, per_block=3):
+    with ArchiveWriter(path, block_records=per_block) as writer:
+        for b in range(blocks):
+            for i in range(per_block):
+                writer.append({'ip': f'10.0.0.{i}', 'n': b * per_block + i},
+                              ts=1000.0 + b * per_block + i)
+
+
+def numbers(path, **kwargs):
+    return [record['n'] for _, record in ArchiveReader(path).query(**kwargs)]
+
+
+@pytest.fixture
+def segment(tmp_path):
+    path = str(tmp_path / 'probe.seg')
+    write_blocks(path, 3)
+    return path
+
+
+def index_lines(path):
+    with open(path + '.idx', encoding='utf-8') as f:
+        return f.readlines()
+
+
+def test_query_by_ip_and_time(segment):
+    assert numbers(segment) == list(range(9))
+    assert numbers(segment, ip='10.0.0.1') == [1, 4, 7]
+    assert numbers(segment, start=1002.0, end=1004.0) == [2, 3, 4]
+    blocks, end, dirty = check_index(segment)
+    assert len(blocks) == 3 and end == os.path.getsize(segment) and not dirty
+
+
+def test_block_without_index_line_is_reindexed(segment):
+    lines = index_lines(segment)
+    with open(segment + '.idx', 'w', encoding='utf-8') as f:
+        f.writelines(lines[:-1])
+
+    assert numbers(segment, ip='10.0.0.2') == [2, 5, 8]
+    with ArchiveWriter(segment, block_records=3) as writer:
+        writer.append({'ip': '10.0.0.9', 'n': 9}, ts=2000.0)
+    assert len(index_lines(segment)) == 4
+    assert json.loads(index_lines(segment)[2])['ips']['10.0.0.2'] == [1008.0, 1008.0]
+    assert numbers(segment) == list(range(10))
+
+
+def test_partial_block_is_truncated_on_append(segment):
+    size = os.path.getsize(segment)
+    with open(segment, 'ab') as f:
+        f.write(b'PBLK\x01\x00partial')
+
+    assert numbers(segment) == list(range(9))
+    with ArchiveWriter(segment) as writer:
+        writer.append({'ip': '10.0.0.9', 'n': 9}, ts=2000.0)
+    assert json.loads(index_lines(segment)[-1])['offset'] == size
+    assert numbers(segment) == list(range(10))
+
+
+def test_partial_index_line_is_dropped(segment):
+    with open(segment + '.idx', 'a', encoding='utf-8') as f:
+        f.write('{"offset": 99')
+
+    blocks, _, dirty = check_index(segment)
+    assert len(blocks) == 3 and dirty
+    ArchiveWriter(segment).close()
+    assert len(index_lines(segment)) == 3
+    assert numbers(segment) == list(range(9))
+
+
+def test_missing_index_is_rebuilt(segment):
+    os.remove(segment + '.idx')
+    assert numbers(segment, ip='10.0.0.0') == [0, 3, 6]
+    ArchiveWriter(segment).close()
+    assert [json.loads(line)['count'] for line in index_lines(segment)] == [3, 3, 3]
+
+
+def test_at_decompresses_only_nearby_blocks(tmp_path, monkeypatch):
+    import probe_archive
+
+    path = str(tmp_path / 'day.seg')
+    write_blocks(path, 200)
+    reader = ArchiveReader(path)
+    calls = []
+    decompress = probe_archive._decompress
+    monkeypatch.setattr(probe_archive, '_decompress',
+                        lambda *args: calls.append(1) or decompress(*args))
+
+    # 10.0.0.1 在第 100 块中的时间为 1301，1302 时刻最近的就是这条
+    assert reader.at('10.0.0.1', 1302.5)['n'] == 301
+    assert len(calls) == 1
+    assert reader.at('10.0.0.2', 1000.5) is None
+    assert reader.at('10.0.0.2', 5000)['n'] == 599
+
+
+def test_at_with_out_of_order_blocks(tmp_path):
+    path = str(tmp_path / 'late.seg')
+    with ArchiveWriter(path, block_records=2) as writer:
+        for n, ts in enumerate([10, 20, 30, 40, 15, 25, 50, 60]):
+            writer.append({'ip': 'h', 'n': n}, ts=float(ts))
+    reader = ArchiveReader(path)
+    for ts in (5, 10, 16, 26, 35, 45, 100):
+        expected = max(((t, r['n']) for t, r in reader.query(ip='h', end=ts)), default=None)
+        record = reader.at('h', ts)
+        assert (record['n'] if record else None) == (expected[1] if expected else None)
@@ -0,0 +1,38 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from probe_client import ProbeClient
+
+
+@pytest.fixture
+def gateway():
+    """每个 POST 都返回 502 的服务端，记录收到的请求数"""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            hits.append(self.path)
+            self.send_response(502)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}', hits
+    server.shutdown()
+    server.server_close()
+
+
+def test_post_is_not_retried_after_gateway_error(gateway):
+    url, hits = gateway
+    session = ProbeClient._create_session(None, retries=3)
+    response = session.post(url + '/report', json={'ip': 'h'}, timeout=5)
+    assert response.status_code == 502
+    assert hits == ['/report']
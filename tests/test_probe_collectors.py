@@ -0,0 +1,133 @@
+import contextlib
+from collections import namedtuple
+
+import psutil
+import pytest
+
+import probe_collectors
+from probe_collectors import ProcessTracker
+
+CpuTimes = namedtuple('CpuTimes', 'user system')
+MemoryInfo = namedtuple('MemoryInfo', 'rss')
+
+
+class FakeTable:
+    """虚拟的进程表：pid -> {'name', 'create_time', 'cpu', 'rss'}"""
+
+    def __init__(self):
+        self.procs = {}
+        self.now = 10000.0
+        self.created = 0
+
+    def spawn(self, pid, name, cpu=0.0, rss=0):
+        self.procs[pid] = {'name': name, 'create_time': self.now, 'cpu': cpu, 'rss': rss}
+
+    def lookup(self, pid):
+        proc = self.procs.get(pid)
+        if proc is None:
+            raise psutil.NoSuchProcess(pid)
+        return proc
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+
+    class FakeProcess:
+        def __init__(self, pid):
+            self.pid = pid
+            self._create_time = table.lookup(pid)['create_time']
+            table.created += 1
+
+        def oneshot(self):
+            return contextlib.nullcontext()
+
+        def is_running(self):
+            proc = table.procs.get(self.pid)
+            return proc is not None and proc['create_time'] == self._create_time
+
+        def name(self):
+            return table.lookup(self.pid)['name']
+
+        def create_time(self):
+            return self._create_time
+
+        def cpu_times(self):
+            return CpuTimes(table.lookup(self.pid)['cpu'], 0.0)
+
+        def memory_info(self):
+            return MemoryInfo(table.lookup(self.pid)['rss'])
+
+    monkeypatch.setattr(psutil, 'Process', FakeProcess)
+    monkeypatch.setattr(psutil, 'pids', lambda: sorted(table.procs))
+    monkeypatch.setattr(psutil, 'virtual_memory', lambda: type('Memory', (), {'total': 1 << 30}))
+    monkeypatch.setattr(probe_collectors.time, 'monotonic', lambda: table.now)
+    monkeypatch.setattr(probe_collectors.time, 'time', lambda: table.now)
+    return table
+
+
+def tick(table, tracker, seconds=10, **cpu):
+    table.now += seconds
+    for name, used in cpu.items():
+        for proc in table.procs.values():
+            if proc['name'] == name:
+                proc['cpu'] += used
+    tracker.update()
+
+
+def names(rows):
+    return [row['name'] for row in rows]
+
+
+def test_cpu_delta_and_handle_reuse(table):
+    table.spawn(1, 'init', cpu=500.0, rss=10)
+    table.spawn(2, 'busy', rss=20)
+    table.spawn(3, 'idle', rss=30)
+    tracker = ProcessTracker()
+    tracker.update()
+    assert table.created == 3
+
+    tick(table, tracker, busy=5.0, init=1.0)
+    rows = {row['name']: row for row in tracker.top_cpu(3)}
+    assert rows['busy']['cpu_percent'] == 50.0
+    assert rows['init']['cpu_percent'] == 10.0
+    assert rows['idle']['cpu_percent'] == 0.0
+    assert table.created == 3  # 句柄跨周期复用
+
+
+def test_pid_churn(table):
+    table.spawn(1, 'init')
+    table.spawn(2, 'old', cpu=100.0)
+    tracker = ProcessTracker()
+    tracker.update()
+
+    # 进程退出后同一个 PID 被新进程复用，CPU 时间比旧进程的还大
+    table.now += 5
+    del table.procs[2]
+    table.spawn(2, 'new', cpu=200.0)
+    table.spawn(3, 'child')
+    tick(table, tracker, new=2.0)
+    assert len(tracker) == 3
+    rows = {row['pid']: row for row in tracker.top_cpu(3)}
+    assert rows[2]['name'] == 'new'
+    # 新进程按生命周期平均值估算，而不是与旧进程的 CPU 时间做差
+    assert rows[2]['cpu_percent'] == pytest.approx(202.0 / 10 * 100)
+
+    del table.procs[3]
+    tick(table, tracker)
+    assert sorted(row['pid'] for row in tracker.top_cpu(10)) == [1, 2]
+
+
+def test_top_n_by_cpu_and_memory(table):
+    for pid in range(1, 101):
+        table.spawn(pid, f'p{pid}', rss=pid * 1024 ** 2)
+    tracker = ProcessTracker()
+    tracker.update()
+    for pid, proc in table.procs.items():
+        proc['cpu'] += (pid * 37) % 101 / 10
+    tick(table, tracker)
+
+    expected = sorted(table.procs, key=lambda pid: (pid * 37) % 101, reverse=True)[:5]
+    assert [row['pid'] for row in tracker.top_cpu(5)] == expected
+    assert names(tracker.top_memory(3)) == ['p100', 'p99', 'p98']
+    assert tracker.top_memory(1)[0]['rss'] == 100.0
@@ -0,0 +1,65 @@
+import pytest
+
+from probe_delta import (DELETED_KEY, PROTOCOL_VERSION, DeltaDecoder, ResyncRequired,
+                         apply_delta, diff_state)
+
+OLD = {
+    'ip': '10.0.0.1',
+    'cpu': {'cpu_percent': [1.0, 2.0], 'cpu_count': 2},
+    'memory': {'memory_percent': 40.0, 'swap_percent': 0.0},
+    'disk': [{'mountpoint': '/', 'percent': 50.0}],
+    'gone': 1,
+}
+NEW = {
+    'ip': '10.0.0.1',
+    'cpu': {'cpu_percent': [3.0, 2.0], 'cpu_count': 2},
+    'memory': {'memory_percent': 41.0},
+    'disk': [{'mountpoint': '/', 'percent': 50.0}],
+    'network': {'bytes_sent': 1},
+}
+
+
+def test_diff_only_carries_changes():
+    delta = diff_state(OLD, NEW)
+    assert delta == {
+        'cpu': {'cpu_percent': [3.0, 2.0]},
+        'memory': {'memory_percent': 41.0, DELETED_KEY: ['swap_percent']},
+        'network': {'bytes_sent': 1},
+        DELETED_KEY: ['gone'],
+    }
+    assert diff_state(NEW, NEW) == {}
+
+
+def test_apply_round_trips_without_mutating_base():
+    snapshot = repr(OLD)
+    assert apply_delta(OLD, diff_state(OLD, NEW)) == NEW
+    assert repr(OLD) == snapshot
+    assert apply_delta(NEW, diff_state(NEW, OLD)) == OLD
+
+
+def message(seq, **body):
+    return dict({'v': PROTOCOL_VERSION, 'ip': '10.0.0.1', 'seq': seq}, **body)
+
+
+def test_decoder_follows_the_sequence():
+    decoder = DeltaDecoder()
+    assert decoder.decode(message(1, full=OLD)) == OLD
+    assert decoder.decode(message(2, base=1, delta=diff_state(OLD, NEW))) == NEW
+    assert decoder.decode(message(3, base=2, delta={})) == NEW
+
+
+def test_decoder_requires_resync_on_base_mismatch():
+    decoder = DeltaDecoder()
+    with pytest.raises(ResyncRequired):
+        decoder.decode(message(1, base=0, delta={}))
+    decoder.decode(message(1, full=OLD))
+    with pytest.raises(ResyncRequired):
+        decoder.decode(message(3, base=2, delta={}))
+    # 重新发送完整快照后恢复
+    assert decoder.decode(message(4, full=NEW)) == NEW
+    assert decoder.decode(message(5, base=4, delta={})) == NEW
+
+
+def test_decoder_rejects_other_versions():
+    with pytest.raises(ValueError):
+        DeltaDecoder().decode({'v': 1, 'ip': '10.0.0.1', 'seq': 1, 'full': {}})
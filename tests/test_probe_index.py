@@ -0,0 +1,50 @@
+import time
+
+from probe_index import ClientIndex, ResponseCache
+
+
+def test_version_changes_only_with_membership_and_state():
+    index = ClientIndex(offline_after=60)
+    now = time.time()
+    index.update('10.0.0.1', 'web1', 'Linux', now)
+    version = index.version
+    for i in range(5):
+        index.update('10.0.0.1', 'web1', 'Linux', now + i)
+    assert index.version == version  # 只刷新 last_seen
+
+    index.update('10.0.0.1', 'web1-renamed', 'Linux', now + 5)
+    assert index.version > version
+    version = index.version
+    index.update('10.0.0.2', 'db1', 'Linux', now)
+    assert index.version > version
+
+    version = index.version
+    assert index.sweep(now + 63) == ['10.0.0.2']
+    assert index.version > version
+    version = index.version
+    assert index.sweep(now + 64) == []
+    assert index.version == version
+
+
+def test_history_is_newest_first():
+    index = ClientIndex(offline_after=60)
+    now = time.time()
+    index.update('a', 'a', 'Linux', now - 100)
+    index.update('b', 'b', 'Linux', now)
+    index.sweep(now)
+    index.update('a', 'a', 'Linux', now)
+    assert [(ip, status) for _, ip, status in index.history()] == \
+        [('a', '在线'), ('a', '离线'), ('b', '在线')]
+    assert [status for _, _, status in index.history('a', limit=1)] == ['在线']
+
+
+def test_response_cache_expires_on_version_or_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+    cache = ResponseCache(ttl=2.0)
+    cache.put(b'q', 1, b'[]', 0)
+    assert cache.get(b'q', 1) is not None
+    assert cache.get(b'q', 2) is None
+    clock[0] += 2.5
+    assert cache.get(b'q', 1) is None
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,27 @@
+import json
+import os
+
+import pytest
+
+from probe_archive import ArchiveReader
+from probe_logger import LogWriter
+
+
+@pytest.mark.parametrize('archive', [False, True])
+def test_bad_record_does_not_drop_batch(tmp_path, archive):
+    writer = LogWriter(str(tmp_path), archive=archive, flush_interval=0.05)
+    writer.submit({'ip': 'a', 'n': 1})
+    writer.submit({'ip': 'b', 'n': object()})  # 无法序列化
+    writer.submit({'ip': 'c', 'n': 3})
+    writer.close()
+
+    stats = writer.stats()
+    assert (stats['written'], stats['invalid'], stats['errors']) == (2, 1, 0)
+    [name] = [name for name in os.listdir(tmp_path) if not name.endswith('.idx')]
+    path = os.path.join(tmp_path, name)
+    if archive:
+        records = [record for _, record in ArchiveReader(path).query()]
+    else:
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+    assert [record['n'] for record in records] == [1, 3]
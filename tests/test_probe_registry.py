@@ -0,0 +1,93 @@
+import random
+import time
+
+import pytest
+
+import probe_registry
+import probe_ticker
+from probe_registry import Collector, CollectorRegistry, CollectorSet
+from probe_ticker import Ticker
+
+
+class FakeClock:
+    """代替 time.monotonic/time.sleep 的虚拟时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    for module in (probe_registry, probe_ticker):
+        monkeypatch.setattr(module.time, 'monotonic', clock.monotonic)
+        monkeypatch.setattr(module.time, 'sleep', clock.sleep)
+    return clock
+
+
+def make_set(intervals):
+    registry = CollectorRegistry()
+    collected = {name: [] for name in intervals}
+    for name in intervals:
+        class Counting(Collector):
+            def collect(self, name=name):
+                collected[name].append(time.monotonic())
+                return len(collected[name])
+        registry.register(name, Counting)
+    config = {name: {'interval': interval} for name, interval in intervals.items()}
+    return CollectorSet((), config, registry=registry), collected
+
+
+def run_loop(clock, collectors, interval, ticks, tolerance, jitter):
+    """模拟 run()：每轮醒来后有随机的调度延迟，然后采集并等待下一轮"""
+    rng = random.Random(1)
+    collectors.tolerance = tolerance
+    ticker = Ticker(interval)
+    reported = []
+    for _ in range(ticks):
+        clock.now += rng.uniform(0, jitter)
+        reported.append(collectors.collect())
+        ticker.wait(collectors)
+    return reported
+
+
+@pytest.mark.parametrize('tolerance', [0.0, 2.5])
+def test_jittered_loop_collects_every_period(clock, tolerance):
+    collectors, collected = make_set({'cpu': 5})
+    run_loop(clock, collectors, 5, 720, tolerance, jitter=0.3)
+    # 每个周期恰好采集一次，没有因抖动跳过的周期
+    assert len(collected['cpu']) in (720, 721)
+    gaps = [b - a for a, b in zip(collected['cpu'], collected['cpu'][1:])]
+    assert max(gaps) < 5 + 0.3 + 1e-9
+
+
+def test_tolerance_keeps_reports_fresh(clock):
+    collectors, collected = make_set({'cpu': 5})
+    reported = run_loop(clock, collectors, 5, 100, 2.5, jitter=0.3)
+    # 每次上报的都是本轮新采集的结果
+    assert [report['cpu'] for report in reported] == list(range(1, 101))
+
+
+def test_short_and_long_intervals_follow_their_own_schedule(clock):
+    collectors, collected = make_set({'cpu': 2, 'disk': 300})
+    start = clock.now
+    run_loop(clock, collectors, 5, 120, 2.5, jitter=0.3)
+    elapsed = clock.now - start
+    # 2 秒的采集器不会被 5 秒的循环凑整成 5 秒
+    assert abs(len(collected['cpu']) - elapsed / 2) <= 2
+    assert abs(len(collected['disk']) - elapsed / 300) <= 1
+
+
+def test_overrun_skips_to_next_slot(clock):
+    collectors, collected = make_set({'cpu': 5})
+    collectors.collect()
+    clock.now += 23  # 循环卡住了四个多周期
+    collectors.collect()
+    assert len(collected['cpu']) == 2
+    assert collectors.next_due() == 1000.0 + 25
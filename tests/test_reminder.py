@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+
+from reminder import CronExpr, ReminderScheduler, _parse_field, set_reminder
+
+
+def test_parse_field_syntax():
+    assert _parse_field('*/15', 0, 59) == {0, 15, 30, 45}
+    assert _parse_field('5/20', 0, 59) == {5, 25, 45}
+    assert _parse_field('1-3,10', 0, 23) == {1, 2, 3, 10}
+    assert _parse_field('8-18/5', 0, 23) == {8, 13, 18}
+    for field in ('60', '5-2', '*/0', 'x'):
+        with pytest.raises(ValueError):
+            _parse_field(field, 0, 59)
+
+
+@pytest.mark.parametrize('expr, now, expected', [
+    # 2024-01-01 是星期一
+    ('*/15 * * * *', datetime(2024, 1, 1, 10, 7, 30), datetime(2024, 1, 1, 10, 15)),
+    ('*/15 * * * *', datetime(2024, 1, 1, 10, 15), datetime(2024, 1, 1, 10, 30)),
+    ('30 9 * * 1-5', datetime(2024, 1, 5, 10, 0), datetime(2024, 1, 8, 9, 30)),
+    ('0 0 * * 7', datetime(2024, 1, 1), datetime(2024, 1, 7)),
+    ('@daily', datetime(2024, 2, 28, 23, 59), datetime(2024, 2, 29)),
+    ('0 12 31 * *', datetime(2024, 4, 1), datetime(2024, 5, 31, 12)),
+    ('0 0 29 2 *', datetime(2024, 3, 1), datetime(2028, 2, 29)),
+    ('59 23 31 12 *', datetime(2024, 12, 31, 23, 59), datetime(2025, 12, 31, 23, 59)),
+    # 日和星期都被限定时满足其一即可：1 号或星期五
+    ('0 8 1 * 5', datetime(2024, 1, 2), datetime(2024, 1, 5, 8)),
+    ('0 8 1 * 5', datetime(2024, 1, 26, 9), datetime(2024, 2, 1, 8)),
+])
+def test_next_after(expr, now, expected):
+    assert CronExpr(expr).next_after(now) == expected
+
+
+def test_invalid_expressions():
+    with pytest.raises(ValueError):
+        CronExpr('* * * *')
+    with pytest.raises(ValueError):
+        CronExpr('0 0 31 2 *').next_after(datetime(2024, 1, 1))
+
+
+def test_missed_repeating_reminder_fires_once(tmp_path):
+    sent = []
+    scheduler = ReminderScheduler(str(tmp_path / 'reminders.db'),
+                                  notifier=lambda title, message: sent.append(message))
+    try:
+        scheduler.add('喝水', '起来走走', at=1000.0, every=60)
+        scheduler.add('一次性', '开会', at=1030.0)
+        with scheduler.lock:
+            next_due = scheduler._fire_due(1200.0)
+        scheduler.executor.shutdown(wait=True)
+        assert sorted(sent) == ['开会', '起来走走（错过 4 次）']
+        assert next_due == 1240.0
+        assert [(r.title, r.due) for r in scheduler.pending()] == [('喝水', 1240.0)]
+    finally:
+        scheduler.conn.close()
+
+
+def test_missed_cron_reminder_counts_every_run(tmp_path):
+    sent = []
+    scheduler = ReminderScheduler(str(tmp_path / 'reminders.db'),
+                                  notifier=lambda title, message: sent.append(message))
+    try:
+        scheduler.add('巡检', '检查备份', cron='*/10 * * * *')
+        [reminder] = scheduler.pending()
+        due = reminder.due
+        with scheduler.lock:
+            next_due = scheduler._fire_due(due + 35 * 60)
+        scheduler.executor.shutdown(wait=True)
+        assert sent == ['检查备份（错过 4 次）']
+        assert next_due == due + 40 * 60
+    finally:
+        scheduler.conn.close()
+
+
+def test_set_reminder_waits_until_sent(tmp_path, capsys):
+    set_reminder('休息提醒', '该休息一下眼睛了！', 0.001)
+    assert '休息提醒: 该休息一下眼睛了！' in capsys.readouterr().out
+
+    db_path = str(tmp_path / 'reminders.db')
+    reminder_id = set_reminder('稍后', '不等待', 5, db_path=db_path, wait=False)
+    assert capsys.readouterr().out == ''
+    scheduler = ReminderScheduler(db_path)
+    try:
+        assert [r.id for r in scheduler.pending()] == [reminder_id]
+    finally:
+        scheduler.stop()
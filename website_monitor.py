@@ -3,6 +3,43 @@ import time
 from datetime import datetime
 import smtplib
 from email.mime.text import MIMEText
+import argparse
+import asyncio
+import bisect
+import gzip
+import json
+import random
+import sys
+from collections import deque
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+def send_email(email_config, subject, message):
+    """通过 SMTP 发送一封纯文本邮件，失败时打印错误并返回 False
+    
+    Args:
+        email_config: 邮件配置字典，字段见 monitor_website
+        subject: 邮件主题
+        message: 邮件正文
+    """
+    msg = MIMEText(message)
+    msg['Subject'] = subject
+    msg['From'] = email_config['sender']
+    msg['To'] = email_config['receiver']
+    
+    try:
+        with smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port']) as server:
+            server.starttls()
+            server.login(email_config['sender'], email_config['password'])
+            server.send_message(msg)
+        return True
+    except Exception as e:
+        print(f"发送邮件失败: {str(e)}")
+        return False
 
 def monitor_website(url, check_interval=300, email_config=None):
     """监控网站可用性
@@ -20,19 +57,7 @@ def monitor_website(url, check_interval=300, email_config=None):
     def send_alert(subject, message):
         if not email_config:
             return
-        
-        msg = MIMEText(message)
-        msg['Subject'] = subject
-        msg['From'] = email_config['sender']
-        msg['To'] = email_config['receiver']
-        
-        try:
-            with smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port']) as server:
-                server.starttls()
-                server.login(email_config['sender'], email_config['password'])
-                server.send_message(msg)
-        except Exception as e:
-            print(f"发送邮件失败: {str(e)}")
+        send_email(email_config, subject, message)
     
     previous_status = None
     
@@ -63,13 +88,301 @@ def monitor_website(url, check_interval=300, email_config=None):
         
         time.sleep(check_interval)
 
-# 使用示例
-email_config = {
-    'smtp_server': 'smtp.example.com',
-    'smtp_port': 587,
-    'sender': 'your_email@example.com',
-    'password': 'your_password',
-    'receiver': 'receiver@example.com'
-}
+# 延迟直方图的分桶上界（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# 记录的各个阶段：DNS 解析、建立连接（TCP+TLS）、首字节、总耗时
+PHASES = ('dns', 'connect', 'ttfb', 'total')
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图"""
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+
+    def quantile(self, q):
+        """按分桶估算分位数（返回所在桶的上界）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {
+            'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], self.counts)),
+            'count': self.count,
+            'sum': round(self.sum, 3),
+        }
+
+
+class Target:
+    """一个监控目标
+
+    Args:
+        url: 要监控的网站URL
+        name: 显示名称，默认取URL的主机名和路径
+        interval: 检查间隔（秒）
+        timeout: 单次检查的超时（秒）
+        expect_status: 视为正常的状态码
+        jitter: 每次间隔随机浮动的比例，避免所有目标同时检查
+    """
+
+    def __init__(self, url, name=None, interval=300, timeout=10, expect_status=200, jitter=0.1):
+        self.url = url
+        parts = urlsplit(url)
+        self.name = name or (parts.netloc + parts.path.rstrip('/'))
+        # 写入探针服务端时使用的网站标识
+        self.key = 'site:' + self.name.replace('/', '_')
+        self.interval = interval
+        self.timeout = timeout
+        self.expect_status = expect_status
+        self.jitter = jitter
+        self.up = None
+        self.checks = 0
+        self.failures = 0
+        self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+
+
+def load_targets(path):
+    """读取监控目标配置（JSON）
+
+    格式为目标列表，或 ``{"defaults": {...}, "targets": [...]}``；
+    每个目标可以是URL字符串，或包含 Target 参数的字典。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    defaults = {}
+    if isinstance(config, dict):
+        defaults = config.get('defaults', {})
+        config = config.get('targets', [])
+    targets = []
+    for item in config:
+        options = dict(defaults)
+        options.update({'url': item} if isinstance(item, str) else item)
+        targets.append(Target(**options))
+    return targets
+
+
+def _trace_config():
+    """通过 aiohttp 的请求跟踪记录 DNS 解析和建立连接的时间点"""
+    trace = aiohttp.TraceConfig()
+
+    def mark(name):
+        async def callback(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx[name] = time.perf_counter()
+        return callback
+
+    trace.on_dns_resolvehost_start.append(mark('dns_start'))
+    trace.on_dns_resolvehost_end.append(mark('dns_end'))
+    trace.on_connection_create_start.append(mark('connect_start'))
+    trace.on_connection_create_end.append(mark('connect_end'))
+    return trace
+
+
+async def check_target(session, target):
+    """检查一次目标，返回状态码、错误和各阶段耗时（毫秒，连接复用时无 DNS/连接耗时）"""
+    marks = {}
+    result = {'status': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        async with session.get(target.url, trace_request_ctx=marks,
+                               timeout=aiohttp.ClientTimeout(total=target.timeout)) as response:
+            result['ttfb'] = (time.perf_counter() - start) * 1000
+            result['status'] = response.status
+            # 读完响应体以便连接放回连接池，但不在内存中保留
+            async for _ in response.content.iter_chunked(64 * 1024):
+                pass
+        result['total'] = (time.perf_counter() - start) * 1000
+    except asyncio.TimeoutError:
+        result['error'] = f"超时（{target.timeout}秒）"
+    except aiohttp.ClientError as e:
+        result['error'] = str(e) or e.__class__.__name__
+
+    if 'dns_end' in marks:
+        result['dns'] = (marks['dns_end'] - marks['dns_start']) * 1000
+    if 'connect_end' in marks:
+        result['connect'] = (marks['connect_end'] - marks['connect_start']) * 1000 - \
+            result.get('dns', 0)
+    result['up'] = result['status'] == target.expect_status
+    return result
+
+
+class SiteMonitor:
+    """并发监控多个网站
+
+    所有目标共用一个带连接池的 aiohttp 会话，每个目标按各自的间隔（加随机抖动）
+    调度，并发检查数不超过 concurrency。状态变化时打印并发送邮件；设置 server_url
+    时把检查结果批量上报到探针服务端（/report/batch），服务端按 system 为 'website'
+    单独存放（/sites），不计入主机列表和离线告警。
+    """
+
+    def __init__(self, targets, concurrency=100, server_url=None, report_interval=10,
+                 email_config=None, max_pending=10000):
+        if aiohttp is None:
+            raise RuntimeError('多目标监控需要安装 aiohttp: pip install aiohttp')
+        self.targets = list(targets)
+        keys = [target.key for target in self.targets]
+        if len(set(keys)) != len(keys):
+            raise ValueError('监控目标的名称不能重复')
+        self.concurrency = concurrency
+        self.server_url = server_url
+        self.report_interval = report_interval
+        self.email_config = email_config
+        self._pending = deque(maxlen=max_pending)
+        self._semaphore = None
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector,
+                                         trace_configs=[_trace_config()]) as session:
+            tasks = [self._schedule(session, target) for target in self.targets]
+            if self.server_url:
+                tasks.append(self._report_loop(session))
+            await asyncio.gather(*tasks)
+
+    async def _schedule(self, session, target):
+        loop = asyncio.get_running_loop()
+        # 首次检查在一个间隔内随机打散
+        next_at = loop.time() + random.uniform(0, target.interval)
+        while True:
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            # 信号量与连接池大小一致，耗时不包含排队等待连接的时间
+            async with self._semaphore:
+                result = await check_target(session, target)
+            self._record(target, result)
+            next_at += target.interval * random.uniform(1 - target.jitter, 1 + target.jitter)
+
+    def _record(self, target, result):
+        target.checks += 1
+        if not result['up']:
+            target.failures += 1
+        for phase in PHASES:
+            if phase in result:
+                target.histograms[phase].observe(result[phase])
+
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if target.up is not None and target.up != result['up']:
+            if result['up']:
+                message = f"网站 {target.url} 已恢复正常！\n时间：{timestamp}"
+                self._alert("网站恢复通知", message)
+            else:
+                reason = result['error'] or f"状态码 {result['status']}"
+                message = f"网站 {target.url} 无法访问：{reason}\n时间：{timestamp}"
+                self._alert("网站异常通知", message)
+        target.up = result['up']
+
+        if self.server_url:
+            http = {'up': int(result['up'])}
+            if result['status'] is not None:
+                http['status_code'] = result['status']
+            for phase in PHASES:
+                if phase in result:
+                    http[f'{phase}_ms'] = round(result[phase], 2)
+            self._pending.append({
+                'timestamp': timestamp,
+                'ip': target.key,
+                'hostname': target.name,
+                'system': 'website',
+                'http': http,
+            })
+
+    def _alert(self, subject, message):
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+        if self.email_config:
+            # SMTP 是阻塞调用，放到线程池中执行
+            asyncio.get_running_loop().run_in_executor(
+                None, send_email, self.email_config, subject, message)
+
+    async def _report_loop(self, session):
+        url = f"{self.server_url}/report/batch"
+        while True:
+            await asyncio.sleep(self.report_interval)
+            if not self._pending:
+                continue
+            samples = list(self._pending)
+            body = gzip.compress(json.dumps(samples).encode('utf-8'))
+            try:
+                async with session.post(url, data=body, headers={
+                        'Content-Type': 'application/json', 'Content-Encoding': 'gzip'},
+                        timeout=aiohttp.ClientTimeout(total=30)) as response:
+                    if response.status != 200:
+                        print(f"上报检查结果失败: {response.status}")
+                        continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"上报检查结果失败: {str(e)}")
+                continue
+            # 发送期间新产生的结果留在队列中
+            for _ in range(min(len(samples), len(self._pending))):
+                self._pending.popleft()
+
+    def summary(self):
+        """各目标的可用率和延迟分位数"""
+        rows = []
+        for target in self.targets:
+            total = target.histograms['total']
+            rows.append({
+                'name': target.name,
+                'url': target.url,
+                'up': target.up,
+                'checks': target.checks,
+                'failures': target.failures,
+                'p50_ms': total.quantile(0.5),
+                'p95_ms': total.quantile(0.95),
+                'histograms': {phase: h.to_dict() for phase, h in target.histograms.items()},
+            })
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发监控多个网站的可用性和延迟')
+    parser.add_argument('config', help='监控目标配置文件（JSON）')
+    parser.add_argument('--concurrency', type=int, default=100, help='最大并发检查数')
+    parser.add_argument('--server', help='探针服务端地址，设置后把结果写入服务端')
+    parser.add_argument('--report-interval', type=float, default=10,
+                        help='向服务端批量上报的间隔（秒）')
+    args = parser.parse_args()
+
+    monitor = SiteMonitor(load_targets(args.config), concurrency=args.concurrency,
+                          server_url=args.server, report_interval=args.report_interval)
+    print(f"开始监控 {len(monitor.targets)} 个网站")
+    try:
+        asyncio.run(monitor.run())
+    except KeyboardInterrupt:
+        for row in monitor.summary():
+            print(f"{row['name']}: 检查 {row['checks']} 次，失败 {row['failures']} 次，"
+                  f"p50 {row['p50_ms']}ms，p95 {row['p95_ms']}ms")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # 多目标模式：python website_monitor.py targets.json --server http://localhost:5000
+        main()
+        sys.exit()
+
+    # 使用示例
+    email_config = {
+        'smtp_server': 'smtp.example.com',
+        'smtp_port': 587,
+        'sender': 'your_email@example.com',
+        'password': 'your_password',
+        'receiver': 'receiver@example.com'
+    }
 
-monitor_website('https://www.example.com', check_interval=300, email_config=email_config) 
\ No newline at end of file
+    monitor_website('https://www.example.com', check_interval=300, email_config=email_config)
+ 
\ No newline at end of file